@@ -6,9 +6,25 @@ from frappe import _
 from ortools.sat.python import cp_model
 from datetime import datetime
 import re
-import copy
-from .optimizer_core import run_1d_optimizer
+import time
+from .checkpoints import JOB_STATE_DOCTYPE, IncumbentWriter, config_fingerprint, load_incumbent_hints
+from .optimizer_core import configure_solver_threads, run_1d_optimizer
+from .pattern_cache import configure_pattern_cache
+from .pattern_library import PATTERN_HINT_LIMIT, hints_from_library, library_entries
 from .pdf_generator_1d import OneDCuttingPDFGenerator
+from .preview import run_preview, summarize_preview
+from .progress import JobProgress
+from .remnants import DEFAULT_MIN_REMNANT_LENGTH_MM, RemnantIndex, usable_offcuts
+from .solver_pool import SolverPoolBusy, SolverPoolTimeout, SolverPoolUnavailable, ping, render_pdf_in_pool, solve_in_pool
+from .scheduler import (
+    FALLBACK_QUEUE, JOB_TIMEOUT_SECONDS, OPTIMIZER_QUEUE, WAIT_TIME_SAMPLES,
+    is_interactive, job_size, summarize_wait_times, thread_budget
+)
+
+WAIT_TIMES_CACHE_KEY = "cutting_optimizer:wait_times"
+ITEM_PROFILE_CACHE_KEY = "cutting_optimizer:item_profile"
+# The UOM whose conversion factor is the length of one stock bar in meters.
+PIECE_UOM = "ks"
 
 # ==============================================================================
 # 1. ENQUEUEING METHOD (WHITELISTED)
@@ -58,29 +74,196 @@ def enqueue_full_optimization(sales_order_name, config):
     if isinstance(config, str):
         config = json.loads(config)
 
+    # Small jobs are the ones users wait for; they go to the front of the queue.
+    size = job_size(config)
     job = frappe.enqueue(
         "example_app.erpnextcutting_optimizer.api.run_full_optimization_job",
-        queue='long',
-        timeout=1500,
+        queue=_optimizer_queue(),
+        timeout=JOB_TIMEOUT_SECONDS,
+        at_front=is_interactive(size, frappe.conf.get("cutting_optimizer_scheduler")),
         sales_order_name=sales_order_name,
         config=config,
-        user=frappe.session.user
+        user=frappe.session.user,
+        enqueued_at=time.time()
     )
     return {"job_id": job.id}
 
+@frappe.whitelist()
+def resume_optimization_job(job_state):
+    """
+    Re-enqueues an interrupted job from its job-state record; profiles and
+    steps already checkpointed are not redone.
+    """
+    state = frappe.get_doc(JOB_STATE_DOCTYPE, job_state)
+    state.check_permission("write")
+    if state.status == "Completed":
+        return {"error": _("This optimization job has already completed.")}
+
+    config = json.loads(state.config)
+    job = frappe.enqueue(
+        "example_app.erpnextcutting_optimizer.api.run_full_optimization_job",
+        queue=_optimizer_queue(),
+        timeout=JOB_TIMEOUT_SECONDS,
+        at_front=is_interactive(job_size(config), frappe.conf.get("cutting_optimizer_scheduler")),
+        sales_order_name=state.sales_order,
+        config=config,
+        user=frappe.session.user,
+        enqueued_at=time.time(),
+        job_state=state.name
+    )
+    return {"job_id": job.id}
+
+@frappe.whitelist()
+def get_optimizer_queue_metrics():
+    """Queue depth, running jobs, current thread budget and recent queue wait times."""
+    from frappe.utils.background_jobs import get_queue
+
+    queue_name = _optimizer_queue()
+    queue = get_queue(queue_name)
+    running = queue.started_job_registry.count
+    wait_times = [float(value) for value in frappe.cache().lrange(WAIT_TIMES_CACHE_KEY, 0, -1)]
+    return {
+        "queue": queue_name,
+        "queued": queue.count,
+        "running": running,
+        "thread_budget": thread_budget(max(1, running), settings=frappe.conf.get("cutting_optimizer_scheduler")),
+        "wait_seconds": summarize_wait_times(wait_times),
+        "solver_pool": _solver_pool_status()
+    }
+
+
+def _solver_pool_status():
+    """
+    Health of the warm solver pool, None when not configured: "up" with what
+    one of its workers reports, "busy" when every worker is solving, or "down"
+    when the supervisor cannot be reached or a worker does not answer.
+    """
+    pool = frappe.conf.get("cutting_optimizer_solver_pool")
+    if not pool:
+        return None
+    try:
+        return {"available": True, "state": "up", **ping(dict(pool, accept_timeout_seconds=2, request_timeout_seconds=5))}
+    except SolverPoolBusy as e:
+        return {"available": True, "state": "busy", "error": str(e)}
+    except (SolverPoolUnavailable, SolverPoolTimeout) as e:
+        return {"available": False, "state": "down", "error": str(e)}
+
+def _optimizer_queue():
+    """
+    The dedicated optimizer queue once a worker is configured for it in
+    `workers` of common_site_config.json, the shared `long` queue otherwise.
+    """
+    from frappe.utils.background_jobs import get_queues_timeout
+
+    return OPTIMIZER_QUEUE if OPTIMIZER_QUEUE in get_queues_timeout() else FALLBACK_QUEUE
+
+@frappe.whitelist()
+def preview_profile_optimization(profile, settings=None):
+    """
+    Solves a single profile inline, within a fraction of a second, and
+    returns the compact pattern summary the parts dialog draws (see
+    preview.py). Remnants and the pattern library are left to the full job.
+    """
+    if isinstance(profile, str):
+        profile = json.loads(profile)
+    if isinstance(settings, str):
+        settings = json.loads(settings)
+    settings = settings or {}
+
+    parts_data = [
+        {"length": float(part["length"]), "demand": int(part["demand"])}
+        for part in profile.get("parts") or []
+        if float(part.get("length") or 0) > 0 and int(part.get("demand") or 0) > 0
+    ]
+    if not parts_data or not profile.get("stock_length_mm"):
+        return {"error": _("Enter a stock length and at least one part.")}
+
+    stock_data = _profile_stock_data(profile.get("item_code") or "stock", profile)
+    solution = run_preview(
+        stock_data, parts_data, settings.get("saw_kerf", 1),
+        allow_overproduction=settings.get("allow_overproduction", False),
+        objective=settings.get("objective", "auto")
+    )
+    if not solution:
+        return {"error": _("No cutting plan found. Check that every part fits the stock length.")}
+    return summarize_preview(solution, stock_data)
+
+@frappe.whitelist()
+def get_item_profile_attributes(item_codes):
+    """
+    Returns {item_code: {item_group, valuation_rate, weight_per_unit,
+    length_in_meters}} for many items at once, for building the optimizer
+    dialog's profiles. Cached per item until the Item is updated; misses are
+    read with one query on Item and one on its UOM conversions.
+    """
+    frappe.has_permission("Item", "read", throw=True)
+    if isinstance(item_codes, str):
+        item_codes = json.loads(item_codes)
+    item_codes = list(dict.fromkeys(code for code in item_codes or [] if code))
+
+    cache = frappe.cache()
+    attributes, missing = {}, []
+    for item_code in item_codes:
+        cached = cache.hget(ITEM_PROFILE_CACHE_KEY, item_code)
+        if cached is None:
+            missing.append(item_code)
+        else:
+            attributes[item_code] = cached
+
+    if missing:
+        lengths = {
+            row.parent: row.conversion_factor
+            for row in frappe.get_all(
+                "UOM Conversion Detail",
+                filters={"parenttype": "Item", "parent": ["in", missing], "uom": PIECE_UOM},
+                fields=["parent", "conversion_factor"]
+            )
+        }
+        for row in frappe.get_all(
+            "Item",
+            filters={"name": ["in", missing]},
+            fields=["name", "item_group", "valuation_rate", "weight_per_unit"]
+        ):
+            attributes[row.name] = {
+                "item_group": row.item_group,
+                "valuation_rate": row.valuation_rate or 0,
+                "weight_per_unit": row.weight_per_unit or 0,
+                "length_in_meters": lengths.get(row.name) or 0
+            }
+            cache.hset(ITEM_PROFILE_CACHE_KEY, row.name, attributes[row.name])
+    return attributes
+
+def invalidate_item_profile_cache(doc, method=None):
+    """Item doc event: drops the item's cached profile attributes."""
+    frappe.cache().hdel(ITEM_PROFILE_CACHE_KEY, doc.name)
+
 # ==============================================================================
 # 2. BACKGROUND JOB
 # ==============================================================================
 
-def run_full_optimization_job(sales_order_name, config, user):
+def run_full_optimization_job(sales_order_name, config, user, enqueued_at=None, job_state=None):
     """
     This function runs in the background. It iterates through each profile,
     runs optimization, and generates a SEPARATE PDF report for each.
     Finally, it updates the Sales Order quantities.
+
+    Progress is checkpointed per profile and step in a job-state record (see
+    checkpoints.py). `job_state` names a record to resume; without it, an
+    unfinished record of the same Sales Order and configuration is resumed.
+
+    Pattern generation, model construction and PDF pages are reported as
+    "update_job_status" events within each profile's share of the progress
+    bar, at most about once a second (see progress.py).
     """
     try:
         job_id = frappe.local.job.name
         frappe.publish_realtime("update_job_status", {"job_id": job_id, "status": "running", "progress": 10, "message": "Starting job..."})
+        progress = JobProgress(lambda percent, message: frappe.publish_realtime(
+            "update_job_status", {"job_id": job_id, "status": "running", "progress": percent, "message": message}
+        ))
+        _configure_pattern_cache()
+        _record_wait_time(enqueued_at)
+        job_state, checkpoints = _open_job_state(sales_order_name, config, job_id, job_state)
 
         has_errors = False
         profiles_to_run = config.get("profiles", {})
@@ -91,33 +274,101 @@ def run_full_optimization_job(sales_order_name, config, user):
         # --- Main Loop: Optimize and Generate PDF for each profile ---
         for i, item_code in enumerate(profiles_to_run):
             profile_config = profiles_to_run[item_code]
-            progress = 20 + int((i / total_profiles) * 70)
-            frappe.publish_realtime("update_job_status", {"job_id": job_id, "status": "running", "progress": progress, "message": f"Optimizing {item_code}"})
+            progress.begin(
+                20 + int((i / total_profiles) * 70), 20 + int(((i + 1) / total_profiles) * 70), f"Optimizing {item_code}"
+            )
 
-            stock_data = {item_code: {"length": profile_config["stock_length_mm"]}}
             parts_data = profile_config["parts"]
             saw_kerf = config.get("settings", {}).get("saw_kerf", 1)
             allow_overproduction = config.get("settings", {}).get("allow_overproduction", False)
-
-            solution = run_1d_optimizer(stock_data, parts_data, saw_kerf, allow_overproduction=allow_overproduction)
+            engine = config.get("settings", {}).get("engine", "auto")
+            use_pattern_library = config.get("settings", {}).get("use_pattern_library", True)
+            use_remnants = config.get("settings", {}).get("use_remnants", True) and bool(parts_data)
+            remnant_index = None
+
+            checkpoint = checkpoints.get(item_code)
+            if checkpoint:
+                # Solved by an earlier attempt of this job; only pending steps run.
+                solution, stock_data = checkpoint["solution"], checkpoint["stock_data"]
+            else:
+                solver_threads = _apply_thread_budget()
+                stock_data = _profile_stock_data(item_code, profile_config)
+
+                # Offcuts on the shelf are offered as extra, limited stock entries.
+                if use_remnants:
+                    remnant_index = _load_remnant_index(sales_order_name, item_code)
+                    stock_data.update(remnant_index.as_stock_data(
+                        item_code,
+                        min_length=min(p["length"] for p in parts_data),
+                        max_length=max(info["length"] for info in stock_data.values()),
+                        weight_per_mm=profile_config.get("weight_per_piece", 0) / profile_config["stock_length_mm"]
+                    ))
+
+                # The best plan of an interrupted earlier attempt seeds this one.
+                incumbent = IncumbentWriter(_incumbent_path(job_state, item_code), stock_data, saw_kerf)
+                pattern_hints = load_incumbent_hints(incumbent.path)
+                if use_pattern_library:
+                    pattern_hints += _load_pattern_hints(item_code, saw_kerf)
+
+                try:
+                    solution = _run_optimizer(
+                        stock_data, parts_data, saw_kerf, solver_threads,
+                        allow_overproduction=allow_overproduction,
+                        engine=engine,
+                        generation_limits=frappe.conf.get("cutting_optimizer_generation_limits"),
+                        length_resolution=config.get("settings", {}).get("length_resolution_mm"),
+                        objective=config.get("settings", {}).get("objective", "auto"),
+                        minimize_setups=config.get("settings", {}).get("minimize_setups", False),
+                        pattern_hints=pattern_hints or None,
+                        on_incumbent=incumbent,
+                        on_progress=progress
+                    )
+                finally:
+                    # Keeps the last incumbent of a solve that failed or was cut off.
+                    incumbent.flush()
+                if solution:
+                    checkpoint = {"solution": solution, "stock_data": stock_data, "steps": []}
+                    _save_checkpoint(job_state, checkpoints, item_code, checkpoint)
+                    incumbent.discard()
 
             if solution:
-                _generate_and_attach_profile_pdf(sales_order_name, item_code, profile_config, solution, saw_kerf)
+                steps = checkpoint["steps"]
+                _log_engine_selection(sales_order_name, item_code, solution)
+                _warn_if_generation_capped(item_code, solution)
+                if "pdf" not in steps:
+                    _generate_and_attach_profile_pdf(
+                        sales_order_name, item_code, profile_config, solution, saw_kerf, stock_data, on_progress=progress
+                    )
+                    steps.append("pdf")
+                    _save_checkpoint(job_state, checkpoints, item_code, checkpoint)
+                if use_pattern_library and "pattern_library" not in steps:
+                    _update_pattern_library(item_code, solution, stock_data, saw_kerf)
+                    steps.append("pattern_library")
+                    _save_checkpoint(job_state, checkpoints, item_code, checkpoint)
+                if use_remnants and "remnants" not in steps:
+                    # Reloading releases whatever a cut-off attempt already recorded.
+                    remnant_index = remnant_index or _load_remnant_index(sales_order_name, item_code)
+                    checkpoint["new_stock_bars"] = _update_remnant_inventory(
+                        sales_order_name, item_code, remnant_index, solution, stock_data, saw_kerf,
+                        config.get("settings", {}).get("min_remnant_length_mm", DEFAULT_MIN_REMNANT_LENGTH_MM)
+                    )
+                    steps.append("remnants")
+                    _save_checkpoint(job_state, checkpoints, item_code, checkpoint)
 
                 # Store the solution back into the config object for this profile
                 profile_config['solution'] = solution
                 
-                # Sum up the total number of cuts from the current solution
-                profile_cuts = 0
-                for pattern in solution.get("patterns", []):
-                    profile_cuts += pattern.get('num_cuts_in_pattern', 0) * pattern.get('usage_count', 1)
-                total_cuts += profile_cuts
+                total_cuts += solution["stats"]["total_number_of_cuts"]
                 
-                # Calculate total length in meters and store for SO update
-                stock_length_mm = profile_config.get("stock_length_mm", 0)
-                qty_needed_in_pieces = solution.get("total_stock_items_used", {}).get(item_code, 0)
-                total_length_in_meters = (qty_needed_in_pieces * stock_length_mm) / 1000.0
-                updated_quantities[item_code] = total_length_in_meters
+                # Calculate total length in meters of fresh stock and store for SO update
+                total_length_in_mm = sum(
+                    bars * stock_data[stock_id]["length"]
+                    for stock_id, bars in solution.get("total_stock_items_used", {}).items()
+                    if not stock_data[stock_id].get("remnant")
+                )
+                # Bars planned on remnants that another job took first.
+                total_length_in_mm += checkpoint.get("new_stock_bars", 0) * profile_config["stock_length_mm"]
+                updated_quantities[item_code] = total_length_in_mm / 1000.0
                 
             else:
                 has_errors = True
@@ -130,9 +381,12 @@ def run_full_optimization_job(sales_order_name, config, user):
         frappe.publish_realtime("update_job_status", {"job_id": job_id, "status": "running", "progress": 90, "message": "Updating Sales Order..."})
         if updated_quantities or total_cuts > 0:
             _update_sales_order_items(sales_order_name, updated_quantities, config, total_cuts=total_cuts)
+        _set_job_state_status(job_state, "Completed")
 
     except Exception as e:
         frappe.log_error(frappe.get_traceback(), "Full Optimization Job Failed")
+        if job_state:
+            _set_job_state_status(job_state, "Failed")
         frappe.publish_realtime("update_job_status", {"job_id": job_id, "status": "failed", "error": str(e)})
         return
 
@@ -140,6 +394,173 @@ def run_full_optimization_job(sales_order_name, config, user):
     frappe.publish_realtime("update_job_status", {"job_id": job_id, "status": "complete", "result": result})
 
 
+def _open_job_state(sales_order_name, config, job_id, job_state=None):
+    """
+    Returns the job-state record to checkpoint into and its checkpoints: the
+    named one, else the latest unfinished record of this Sales Order and
+    configuration, else a new one. A Running record whose job is still queued
+    or running belongs to that job and is not resumed.
+    """
+    fingerprint = config_fingerprint(config)
+    if not job_state:
+        unfinished = frappe.get_all(
+            JOB_STATE_DOCTYPE,
+            filters={"sales_order": sales_order_name, "config_fingerprint": fingerprint, "status": ["in", ["Running", "Failed"]]},
+            fields=["name", "status", "job_id"],
+            order_by="creation desc"
+        )
+        job_state = next((
+            record.name for record in unfinished
+            if record.status == "Failed" or record.job_id == job_id or not _job_is_active(record.job_id)
+        ), None)
+
+    if job_state:
+        checkpoints = json.loads(frappe.db.get_value(JOB_STATE_DOCTYPE, job_state, "checkpoints") or "{}")
+        frappe.db.set_value(JOB_STATE_DOCTYPE, job_state, {"status": "Running", "job_id": job_id, "resumed": 1})
+    else:
+        checkpoints = {}
+        job_state = frappe.get_doc({
+            "doctype": JOB_STATE_DOCTYPE,
+            "sales_order": sales_order_name,
+            "status": "Running",
+            "job_id": job_id,
+            "config_fingerprint": fingerprint,
+            "config": json.dumps(config, default=str),
+            "checkpoints": "{}"
+        }).insert(ignore_permissions=True).name
+    frappe.db.commit()
+    return job_state, checkpoints
+
+
+def _job_is_active(job_id):
+    """Whether an RQ job is still queued or running; finished jobs expire from RQ."""
+    if not job_id:
+        return False
+    try:
+        return frappe.get_doc("RQ Job", job_id).status in ("queued", "started")
+    except frappe.DoesNotExistError:
+        return False
+
+
+def _save_checkpoint(job_state, checkpoints, item_code, checkpoint):
+    """Records a profile's checkpoint and commits, so it survives the worker."""
+    checkpoints[item_code] = checkpoint
+    frappe.db.set_value(JOB_STATE_DOCTYPE, job_state, "checkpoints", json.dumps(checkpoints, default=str))
+    frappe.db.commit()
+
+
+def _set_job_state_status(job_state, status):
+    frappe.db.set_value(JOB_STATE_DOCTYPE, job_state, "status", status)
+    frappe.db.commit()
+
+
+def _incumbent_path(job_state, item_code):
+    safe_item_code = re.sub(r"[^A-Za-z0-9_.-]", "_", item_code)
+    return frappe.get_site_path("private", "optimizer_checkpoints", f"{job_state}-{safe_item_code}.json")
+
+
+def _configure_pattern_cache():
+    """
+    Applies the `cutting_optimizer_pattern_cache` site config to the worker's
+    pattern cache. Already cached pattern sets are kept across jobs.
+    """
+    cache_conf = frappe.conf.get("cutting_optimizer_pattern_cache") or {}
+    configure_pattern_cache(
+        max_total_patterns=cache_conf.get("max_total_patterns"),
+        spill_dir=cache_conf.get("spill_dir"),
+        max_spilled_patterns=cache_conf.get("max_spilled_patterns")
+    )
+
+
+def _record_wait_time(enqueued_at):
+    """Keeps how long this job waited in the queue, for the queue metrics."""
+    if not enqueued_at:
+        return
+    cache = frappe.cache()
+    cache.lpush(WAIT_TIMES_CACHE_KEY, round(time.time() - enqueued_at, 3))
+    cache.ltrim(WAIT_TIMES_CACHE_KEY, 0, WAIT_TIME_SAMPLES - 1)
+
+
+def _apply_thread_budget():
+    """Gives CP-SAT this job's share of the cores, given the jobs running now, and returns it."""
+    from frappe.utils.background_jobs import get_queue
+
+    running = get_queue(_optimizer_queue()).started_job_registry.count
+    budget = thread_budget(max(1, running), settings=frappe.conf.get("cutting_optimizer_scheduler"))
+    configure_solver_threads(budget)
+    return budget
+
+
+def _run_optimizer(stock_data, parts_data, saw_kerf, solver_threads=None, on_progress=None, **options):
+    """
+    Runs `run_1d_optimizer` in the warm solver pool when one is configured
+    (`cutting_optimizer_solver_pool`, see solver_pool.py), and in this process
+    when it is not or cannot take the problem. A busy pool is waited for, and
+    a pool worker that took the problem and timed out fails the job, as it
+    may still be solving; neither is retried in-process.
+    With a JobProgress as `on_progress`, the solve runs in a helper thread so
+    that this one keeps publishing its progress.
+    """
+    run = on_progress.run if on_progress else _call
+    pool = frappe.conf.get("cutting_optimizer_solver_pool")
+    if pool:
+        try:
+            return run(
+                solve_in_pool, pool, stock_data, parts_data, saw_kerf, num_workers=solver_threads,
+                pattern_cache=frappe.conf.get("cutting_optimizer_pattern_cache"), on_progress=on_progress, **options
+            )
+        except SolverPoolUnavailable as e:
+            frappe.logger("cutting_optimizer").info(f"Solving in-process: {e}")
+    return run(run_1d_optimizer, stock_data, parts_data, saw_kerf, on_progress=on_progress, **options)
+
+
+def _render_pdf(generator_kwargs, on_progress=None):
+    """PDF bytes of a report, rendered in the warm solver pool when possible."""
+    run = on_progress.run if on_progress else _call
+    pool = frappe.conf.get("cutting_optimizer_solver_pool")
+    if pool:
+        try:
+            return run(render_pdf_in_pool, pool, generator_kwargs, on_progress)
+        except SolverPoolUnavailable as e:
+            frappe.logger("cutting_optimizer").info(f"Rendering in-process: {e}")
+    return run(lambda: OneDCuttingPDFGenerator(**generator_kwargs, on_progress=on_progress).generate_pdf().getvalue())
+
+
+def _call(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+def _log_engine_selection(sales_order_name, item_code, solution):
+    """
+    Records which engine solved a profile, with the estimate it was chosen on
+    and, in portfolio mode, which solver won the race, so the selection
+    thresholds can be tuned from production data.
+    """
+    selection = solution.get("engine_selection") or {}
+    frappe.logger("cutting_optimizer").info(json.dumps({
+        "sales_order": sales_order_name,
+        "item_code": item_code,
+        "engine": solution.get("engine"),
+        "features": selection.get("features"),
+        "portfolio": solution.get("portfolio"),
+        "pattern_hints": solution.get("pattern_hints"),
+        "bars_used": sum(solution.get("total_stock_items_used", {}).values())
+    }, default=str))
+
+
+def _warn_if_generation_capped(item_code, solution):
+    """Flags profiles solved over a truncated pattern set, whose plan may not be optimal."""
+    capped = {
+        stock_id: report for stock_id, report in (solution.get("generation") or {}).items()
+        if report.get("cap_hit")
+    }
+    if capped:
+        frappe.log_error(
+            f"Pattern generation for {item_code} hit its limits, the plan may not be optimal: {json.dumps(capped)}",
+            "Optimizer Job Warning"
+        )
+
+
 def _update_sales_order_items(doc_name, quantities_map, final_config=None, total_cuts=0):
     """Updates the quantities of specified items in a Sales Order."""
     so_doc = frappe.get_doc("Sales Order", doc_name)
@@ -182,109 +603,191 @@ def _update_sales_order_items(doc_name, quantities_map, final_config=None, total
         frappe.db.commit()
 
 
-def _generate_and_attach_profile_pdf(doc_name, item_code, profile_config, solution, saw_kerf):
+def _profile_stock_data(item_code, profile_config):
+    """
+    Fresh stock entries of a profile: the main stock length under the item
+    code, plus one entry per `alternative_stock_lengths_mm`. Cost and weight
+    of the alternatives scale with length from the main bar.
+    """
+    stock_length = profile_config["stock_length_mm"]
+    cost_per_mm = profile_config.get("cost_per_piece", 0) / stock_length
+    weight_per_mm = profile_config.get("weight_per_piece", 0) / stock_length
+
+    stock_data = {item_code: {
+        "length": stock_length,
+        "cost": profile_config.get("cost_per_piece", 0),
+        "weight": profile_config.get("weight_per_piece", 0)
+    }}
+    for length in profile_config.get("alternative_stock_lengths_mm") or []:
+        length = float(length)
+        if length > 0 and length != stock_length:
+            stock_data[f"{item_code}-{length:g}"] = {
+                "length": length,
+                "cost": length * cost_per_mm,
+                "weight": length * weight_per_mm
+            }
+    return stock_data
+
+
+def _load_pattern_hints(item_code, saw_kerf):
+    """The item's most used library patterns for this kerf, as pattern hints."""
+    rows = frappe.get_all(
+        "Cutting Pattern",
+        filters={"item_code": item_code, "saw_kerf_mm": saw_kerf},
+        fields=["stock_length_mm", "pieces", "times_used"],
+        order_by="times_used desc",
+        limit_page_length=PATTERN_HINT_LIMIT
+    )
+    return hints_from_library(rows)
+
+
+def _update_pattern_library(item_code, solution, stock_data, saw_kerf):
+    """Adds the solution's patterns to the item's library, counting how often each is cut."""
+    now = frappe.utils.now_datetime()
+    for entry in library_entries(solution, stock_data, saw_kerf):
+        name = frappe.db.get_value("Cutting Pattern", {"item_code": item_code, "pattern_key": entry["pattern_key"]})
+        if name:
+            times_used, solutions = frappe.db.get_value("Cutting Pattern", name, ["times_used", "solutions"])
+            frappe.db.set_value("Cutting Pattern", name, {
+                "times_used": (times_used or 0) + entry["bars"],
+                "solutions": (solutions or 0) + 1,
+                "last_used": now
+            })
+        else:
+            frappe.get_doc({
+                "doctype": "Cutting Pattern",
+                "item_code": item_code,
+                "stock_length_mm": entry["stock_length"],
+                "saw_kerf_mm": saw_kerf,
+                "pattern_key": entry["pattern_key"],
+                "pieces": json.dumps(entry["pieces"]),
+                "times_used": entry["bars"],
+                "solutions": 1,
+                "last_used": now
+            }).insert(ignore_permissions=True)
+    frappe.db.commit()
+
+
+def _load_remnant_index(sales_order_name, item_code):
+    """
+    Loads the item's available remnants into a sorted length index. Remnants
+    this Sales Order consumed or produced on an earlier run are released
+    first, so re-running the optimizer does not count them twice.
+    """
+    for name in frappe.get_all("Cutting Remnant", pluck="name", filters={
+        "item_code": item_code, "status": "Available", "source_sales_order": sales_order_name
+    }):
+        frappe.delete_doc("Cutting Remnant", name, ignore_permissions=True, force=True)
+    for name in frappe.get_all("Cutting Remnant", pluck="name", filters={
+        "item_code": item_code, "status": "Consumed", "consumed_by_sales_order": sales_order_name
+    }):
+        frappe.db.set_value("Cutting Remnant", name, {"status": "Available", "consumed_by_sales_order": None})
+
+    rows = frappe.get_all(
+        "Cutting Remnant",
+        filters={"item_code": item_code, "status": "Available"},
+        fields=["name", "length_mm"],
+        order_by="length_mm asc",
+        as_list=True
+    )
+    return RemnantIndex(rows)
+
+
+def _update_remnant_inventory(sales_order_name, item_code, remnant_index, solution, stock_data, saw_kerf, min_length):
+    """
+    Marks the remnants the solution cuts as consumed and registers its usable
+    offcuts. The index was loaded before the solve, so a concurrent job may
+    have consumed a remnant since; its bar is cut from another remnant that
+    fits, or from new stock. Returns the number of bars cut from new stock.
+
+    Remnants are offered in length buckets (see RemnantIndex.as_stock_data),
+    so offcuts are measured from the length of the bar actually cut.
+    """
+    fresh_length = max(info["length"] for info in stock_data.values() if not info.get("remnant"))
+    new_stock_bars = 0
+    bar_lengths = {}
+    for name, length, stock_id in remnant_index.allocate(solution, stock_data):
+        while not _consume_remnant(name, sales_order_name):
+            replacement = remnant_index.take_best_fit(stock_data[stock_id]["length"])
+            if replacement is None:
+                new_stock_bars += 1
+                length = fresh_length
+                break
+            name, length = replacement
+        bar_lengths.setdefault(stock_id, []).append(length)
+    for length in usable_offcuts(solution, saw_kerf, min_length, bar_lengths):
+        frappe.get_doc({
+            "doctype": "Cutting Remnant",
+            "item_code": item_code,
+            "length_mm": length,
+            "status": "Available",
+            "source_sales_order": sales_order_name
+        }).insert(ignore_permissions=True)
+    frappe.db.commit()
+    if new_stock_bars:
+        frappe.log_error(
+            f"{new_stock_bars} bar(s) of {item_code} planned on remnants that another job consumed are cut from new stock.",
+            "Optimizer Job Warning"
+        )
+    return new_stock_bars
+
+
+def _consume_remnant(name, sales_order_name):
+    """Marks a remnant consumed if it is still available, under a row lock; False if it is not."""
+    if frappe.db.get_value("Cutting Remnant", name, "status", for_update=True) != "Available":
+        return False
+    frappe.db.set_value("Cutting Remnant", name, {
+        "status": "Consumed", "consumed_by_sales_order": sales_order_name
+    })
+    return True
+
+
+def _generate_and_attach_profile_pdf(doc_name, item_code, profile_config, solution, saw_kerf, stock_data, on_progress=None):
     """
     Generates and attaches a PDF report for a single profile's optimization solution.
     """
-    prepared_data = _prepare_single_profile_for_pdf(solution, profile_config, item_code)
+    prepared_data = _prepare_single_profile_for_pdf(solution, profile_config, item_code, stock_data)
 
-    pdf_gen = OneDCuttingPDFGenerator(
+    pdf_content = _render_pdf(dict(
         stock_data=prepared_data["stock_data"],
         parts_data=prepared_data["parts_data"],
         all_patterns_dict=prepared_data["patterns"],
         solution_details_list=[prepared_data["solution_details"]],
         parts_production_summary_list=prepared_data["production_summary"],
-        saw_kerf=saw_kerf
-    )
-    
-    pdf_buffer = pdf_gen.generate_pdf()
-    pdf_buffer.seek(0)
+        saw_kerf=saw_kerf,
+        **(frappe.conf.get("cutting_optimizer_pdf") or {})
+    ), on_progress)
     
     file_name = f"Optimizer_Report_{item_code}.pdf"
-    _attach_pdf_to_document(pdf_buffer, doc_name, file_name)
+    _attach_pdf_to_document(pdf_content, doc_name, file_name)
 
 
-def _prepare_single_profile_for_pdf(solution, profile_config, item_code):
+def _prepare_single_profile_for_pdf(solution, profile_config, item_code, stock_data):
     """
-    Takes the solution for a single profile and calculates the rich, 
-    detailed statistics required by the PDF generator.
+    Shapes a single profile's solution for the PDF generator. All totals come
+    from `solution['stats']`, computed once by the optimizer core; patterns are
+    passed through as they are, since the generator does not modify them.
     """
-    saw_kerf = profile_config.get("saw_kerf_mm", 1)
-    
-    # Use a deepcopy to prevent modifying the original solution object,
-    # which could cause issues in subsequent loops.
-    patterns_for_pdf = copy.deepcopy(solution.get("patterns", []))
+    stats = solution.get("stats", {})
 
     # The PDF generator needs a 'name' for each part. We'll create one from the length.
     parts_data_1d = [
         {'name': f"part_{p['length']}_{item_code[:4]}", 'length': p['length'], 'demand': p['demand']}
         for p in profile_config.get("parts", [])
     ]
-    parts_map_len_to_name = {f"{p['length']}": p['name'] for p in parts_data_1d}
-    parts_map_name_to_info = {p['name']: p for p in parts_data_1d}
-
-    # Remap layout_pieces to use the generated part name for PDF rendering
-    for pattern in patterns_for_pdf:
-        for piece in pattern.get("layout_pieces", []):
-            piece["part_id"] = parts_map_len_to_name.get(str(piece["part_id"]), "?")
-
-    stock_data_1d = {
-        item_code: {
-            "length": profile_config.get("stock_length_mm", 6000),
-            "cost": profile_config.get("cost_per_piece", 0),
-            "weight": profile_config.get("weight_per_piece", 0)
-        }
-    }
-    
-    stock_info = stock_data_1d[item_code]
-    stock_weight_per_mm = (stock_info.get('weight', 0) / stock_info['length']) if stock_info.get('length', 0) > 0 else 0
-    
-    total_stock_items_used = solution.get('total_stock_items_used', {}).get(item_code, 0)
-    
-    stats = {
-        'profile_id': item_code,
-        'total_length_all_parts_produced_mm': 0, 'total_length_all_stock_used_mm': 0,
-        'total_kerf_length_mm': 0, 'total_waste_length_mm': 0,
-        'total_number_of_cuts': 0, 'total_weight_all_stock_used_kg': 0,
-        'total_weight_all_parts_produced_kg': 0, 'total_weight_kerf_kg': 0,
-        'weight_produced_per_part_kg': {p['name']: 0 for p in parts_data_1d}
-    }
-
-    used_patterns_from_solution = patterns_for_pdf
-    for pattern in used_patterns_from_solution:
-        usage_count = pattern.get('usage_count', 1)
-        stats['total_length_all_stock_used_mm'] += stock_info['length'] * usage_count
-        stats['total_weight_all_stock_used_kg'] += stock_info.get('weight', 0) * usage_count
-        stats['total_kerf_length_mm'] += pattern.get('total_kerf_length_in_pattern', 0) * usage_count
-        stats['total_waste_length_mm'] += pattern.get('waste_length_in_pattern', 0) * usage_count
-        stats['total_number_of_cuts'] += pattern.get('num_cuts_in_pattern', 0) * usage_count
-        stats['total_length_all_parts_produced_mm'] += pattern.get('total_parts_length_in_pattern', 0) * usage_count
-        
-        stats['total_weight_kerf_kg'] += pattern.get('total_kerf_length_in_pattern', 0) * stock_weight_per_mm * usage_count
-        
-        for part_name, part_info in parts_map_name_to_info.items():
-            yield_count = pattern.get('yield', {}).get(f"{part_info['length']}", 0)
-            if yield_count > 0:
-                part_weight = part_info['length'] * stock_weight_per_mm
-                stats['weight_produced_per_part_kg'][part_name] += part_weight * yield_count * usage_count
-                stats['total_weight_all_parts_produced_kg'] += part_weight * yield_count * usage_count
-
-    stats['total_weight_waste_kg'] = stats['total_weight_all_stock_used_kg'] - stats['total_weight_all_parts_produced_kg'] - stats['total_weight_kerf_kg']
-    
-    if stats['total_length_all_stock_used_mm'] > 0:
-        stats['yield_percentage'] = (stats['total_length_all_parts_produced_mm'] / stats['total_length_all_stock_used_mm']) * 100
-    else:
-        stats['yield_percentage'] = 0
+    weight_by_part_id = stats.get('weight_produced_per_part_kg', {})
+    weight_by_name = {p['name']: weight_by_part_id.get(f"{p['length']}", 0) for p in parts_data_1d}
 
     solution_details_for_pdf = {
+        'profile_id': item_code,
         'total_stock_items_used': solution.get('total_stock_items_used'),
         'total_parts_produced': solution.get('total_parts_produced'),
-        'pattern_usage': {p['pattern_id']: p['usage_count'] for p in used_patterns_from_solution},
-        'total_stock_cost': total_stock_items_used * stock_info.get('cost', 0),
-        **stats
+        'setup_minimization': solution.get('setup_minimization'),
+        **stats,
+        'weight_produced_per_part_kg': weight_by_name,
     }
 
-    all_patterns_dict_1d = {p['pattern_id']: p for p in used_patterns_from_solution}
+    all_patterns_dict_1d = {p['pattern_id']: p for p in solution.get("patterns", [])}
 
     # --- Create Parts Production Summary for this profile ---
     parts_production_summary = []
@@ -293,34 +796,32 @@ def _prepare_single_profile_for_pdf(solution, profile_config, item_code):
         part_name = part_info['name']
         demand = part_info['demand']
         produced = total_parts_produced_map.get(f"{part_info['length']}", 0)
-        delta = produced - demand
-        part_total_weight = stats['weight_produced_per_part_kg'].get(part_name, 0)
-        
         parts_production_summary.append({
+            'Profile': item_code,
             'Part ID': part_name,
             'Length (mm)': part_info['length'],
             'Demand': demand,
             'Produced': produced,
-            'Delta (+/-)': delta,
-            'Total Wt (kg)': part_total_weight
+            'Delta (+/-)': produced - demand,
+            'Total Wt (kg)': weight_by_name[part_name]
         })
-    
+
     return {
         "solution_details": solution_details_for_pdf,
         "patterns": all_patterns_dict_1d,
-        "stock_data": stock_data_1d,
+        "stock_data": stock_data,
         "parts_data": parts_data_1d,
         "production_summary": parts_production_summary
     }
 
 
-def _attach_pdf_to_document(pdf_buffer, doc_name, file_name):
-    """Attaches a PDF from a buffer to a Frappe document."""
+def _attach_pdf_to_document(pdf_content, doc_name, file_name):
+    """Attaches PDF bytes to a Frappe document."""
     file_doc = frappe.new_doc("File")
     file_doc.file_name = file_name
     file_doc.attached_to_doctype = "Sales Order"
     file_doc.attached_to_name = doc_name
-    file_doc.content = pdf_buffer.getvalue()
+    file_doc.content = pdf_content
     file_doc.is_private = 1
     file_doc.insert(ignore_permissions=True)
 
@@ -0,0 +1,121 @@
+#
+# 1D Cutting Optimizer - Job Checkpoints
+#
+# A job records each profile as soon as it is solved, and every later step
+# (PDF, pattern library, remnants) as it completes, in a "Cutting Optimizer
+# Job" record. A rerun of the same configuration, or an explicit resume, picks
+# the record up and continues where it stopped. A CP-SAT solve that is cut off
+# is not lost either: its best plan so far is written to a file from the
+# solver thread and offered as pattern hints to the next attempt.
+#
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .pattern_library import library_entries
+
+JOB_STATE_DOCTYPE = "Cutting Optimizer Job"
+# Steps done after a profile is solved, in order.
+CHECKPOINT_STEPS = ("pdf", "pattern_library", "remnants")
+INCUMBENT_SAVE_INTERVAL_SECONDS = 10
+# Incumbent patterns rank above any library pattern as hints.
+INCUMBENT_HINT_FREQUENCY = 1_000_000
+
+
+def config_fingerprint(config):
+	"""A hash of what determines the job's result: settings, stock and parts per profile."""
+	profiles = {
+		item_code: {
+			key: profile.get(key)
+			for key in (
+				"stock_length_mm",
+				"alternative_stock_lengths_mm",
+				"cost_per_piece",
+				"weight_per_piece",
+				"parts",
+			)
+		}
+		for item_code, profile in config.get("profiles", {}).items()
+	}
+	payload = json.dumps(
+		{"settings": config.get("settings", {}), "profiles": profiles}, sort_keys=True, default=str
+	)
+	return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class IncumbentWriter:
+	"""
+	An `on_incumbent` listener that keeps the best plan of a running solve in
+	a JSON file, as pattern hints. Writes are atomic and at most every
+	`min_interval` seconds; the first incumbent is written at once, and one
+	arriving sooner is written when the interval has passed, unless a better
+	one replaces it first. Call `flush` when the solve ends or is cut off.
+	"""
+
+	def __init__(self, path, stock_data, saw_kerf, min_interval=INCUMBENT_SAVE_INTERVAL_SECONDS):
+		self.path = path
+		self._stock_data = stock_data
+		self._saw_kerf = saw_kerf
+		self._min_interval = min_interval
+		self._last_write = None
+		self._pending = None
+		self._timer = None
+		self._lock = threading.Lock()
+
+	def __call__(self, solution):
+		with self._lock:
+			self._pending = solution
+			wait = 0 if self._last_write is None else self._last_write + self._min_interval - time.monotonic()
+			if wait <= 0:
+				self._write_pending()
+			elif self._timer is None:
+				# Improvements come in bursts; the last of a burst is written later.
+				self._timer = threading.Timer(wait, self.flush)
+				self._timer.daemon = True
+				self._timer.start()
+
+	def flush(self):
+		"""Writes the latest incumbent if it has not been written yet."""
+		with self._lock:
+			self._write_pending()
+
+	def discard(self):
+		"""Removes the file once the solve has finished."""
+		with self._lock:
+			self._cancel_timer()
+			self._pending = None
+			if os.path.exists(self.path):
+				os.remove(self.path)
+
+	def _write_pending(self):
+		self._cancel_timer()
+		if self._pending is None:
+			return
+		solution, self._pending = self._pending, None
+		self._last_write = time.monotonic()
+		hints = [
+			{"stock_length": entry["stock_length"], "pieces": entry["pieces"], "frequency": entry["bars"]}
+			for entry in library_entries(solution, self._stock_data, self._saw_kerf)
+		]
+		os.makedirs(os.path.dirname(self.path), exist_ok=True)
+		temporary_path = f"{self.path}.tmp"
+		with open(temporary_path, "w") as f:
+			json.dump({"bars": sum(solution["total_stock_items_used"].values()), "hints": hints}, f)
+		os.replace(temporary_path, self.path)
+
+	def _cancel_timer(self):
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+
+
+def load_incumbent_hints(path):
+	"""The pattern hints of an interrupted solve's best plan, or [] if there is none."""
+	try:
+		with open(path) as f:
+			hints = json.load(f)["hints"]
+	except (OSError, ValueError, KeyError):
+		return []
+	return [dict(hint, frequency=INCUMBENT_HINT_FREQUENCY + hint["frequency"]) for hint in hints]
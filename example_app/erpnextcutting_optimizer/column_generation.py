@@ -0,0 +1,266 @@
+#
+# 1D Cutting Optimizer - Column Generation Engine
+#
+# Instead of enumerating every pattern up front, the LP relaxation of the
+# cutting model is solved over a small set of patterns, and the knapsack
+# pricing problem adds only the patterns that can improve it. The integer
+# solution is then found by CP-SAT over the generated patterns.
+#
+import math
+
+from ortools.linear_solver import pywraplp
+
+from .engine_selection import demand_caps, total_demand_by_length
+from .heuristics import run_first_fit_decreasing
+from .optimizer_core import (
+	_build_pattern,
+	_solve_cutting_problem,
+	_stock_objective_weights,
+	_trim_and_minimize_setups,
+)
+
+MAX_ITERATIONS = 200
+PRICING_NODE_LIMIT = 200_000
+REDUCED_COST_TOLERANCE = 1e-6
+# Lengths arrive as floats; keep pricing from rounding a pattern past the bar end.
+LENGTH_TOLERANCE = 1e-9
+
+
+def run_column_generation(
+	stock_data,
+	parts_data,
+	saw_kerf,
+	allow_overproduction=False,
+	hint_patterns=None,
+	on_incumbent=None,
+	setup_time_limit=None,
+):
+	relaxation = lp_relaxation(stock_data, parts_data, saw_kerf, hint_patterns)
+	if relaxation is None:
+		return None
+	lengths, columns, usage, converged = relaxation
+	weights = _stock_objective_weights(stock_data)
+	lp_bound = (
+		sum(x * weights[stock_id] for x, (stock_id, _) in zip(usage, columns, strict=True))
+		if converged
+		else None
+	)
+	seen = {(stock_id, tuple(counts)) for stock_id, counts in columns}
+
+	# The LP columns rarely round to an integer optimum on their own; the
+	# First-Fit-Decreasing patterns guarantee a solution at least that good.
+	# CP-SAT also starts from that plan, so it never ends up worse.
+	heuristic_solution = run_first_fit_decreasing(stock_data, parts_data, saw_kerf)
+	if heuristic_solution:
+		for pattern in heuristic_solution["patterns"]:
+			counts = [pattern["yield"].get(f"{length}", 0) for length in lengths]
+			_add_column(columns, seen, pattern["stock_id_used"], counts)
+		hint_patterns = [
+			dict(pattern, frequency=pattern["usage_count"]) for pattern in heuristic_solution["patterns"]
+		] + list(hint_patterns or [])
+
+	all_patterns = column_patterns(columns, lengths, stock_data, saw_kerf)
+	solution = _solve_cutting_problem(
+		all_patterns,
+		stock_data,
+		parts_data,
+		allow_overproduction=True,
+		hint_patterns=hint_patterns,
+		on_incumbent=on_incumbent,
+		setup_time_limit=setup_time_limit if allow_overproduction else None,
+	)
+	if solution and not allow_overproduction:
+		solution = _trim_and_minimize_setups(
+			all_patterns, solution, stock_data, parts_data, saw_kerf, setup_time_limit
+		)
+	if solution:
+		# Only the generated columns were searched, so optimality is proven
+		# against the rounded-up LP bound instead (the weights are integers).
+		solution["proven_optimal"] = lp_bound is not None and _weighted_bars(solution, weights) <= math.ceil(
+			lp_bound - REDUCED_COST_TOLERANCE
+		)
+	return solution
+
+
+def _weighted_bars(solution, weights):
+	return sum(count * weights[stock_id] for stock_id, count in solution["total_stock_items_used"].items())
+
+
+def lp_relaxation(stock_data, parts_data, saw_kerf, start_patterns=None):
+	"""
+	Solves the LP relaxation of the cutting model by column generation.
+	Returns the part lengths (longest first), the generated columns as
+	(stock_id, counts per length), their LP usage and whether the LP is
+	proven optimal over all patterns (so its value is a lower bound), or None
+	if infeasible. `start_patterns` join the initial columns.
+	"""
+	total_demand = total_demand_by_length(parts_data)
+	lengths = sorted(total_demand, reverse=True)
+	caps_by_stock = {
+		stock_id: demand_caps(total_demand, stock_info["length"], saw_kerf)
+		for stock_id, stock_info in stock_data.items()
+	}
+
+	# A part that fits no stock makes the instance infeasible.
+	for length in lengths:
+		if total_demand[length] > 0 and not any(caps[length] for caps in caps_by_stock.values()):
+			return None
+
+	# Start from one homogeneous pattern per part and stock.
+	columns, seen = [], set()
+	for stock_id, caps in caps_by_stock.items():
+		for j, length in enumerate(lengths):
+			if caps[length]:
+				counts = [0] * len(lengths)
+				counts[j] = caps[length]
+				_add_column(columns, seen, stock_id, counts)
+	# Library patterns start in the master too, so pricing only adds what they lack.
+	for pattern in start_patterns or []:
+		_add_column(
+			columns,
+			seen,
+			pattern["stock_id_used"],
+			[pattern["yield"].get(f"{length}", 0) for length in lengths],
+		)
+
+	weights = _stock_objective_weights(stock_data)
+	converged = False
+	for _ in range(MAX_ITERATIONS):
+		lp = _solve_master_lp(columns, stock_data, lengths, total_demand, weights)
+		if lp is None:
+			return None
+		part_duals, stock_duals, usage = lp
+
+		added, exact = False, True
+		for stock_id, stock_info in stock_data.items():
+			value, counts, complete = _price_pattern(
+				lengths, caps_by_stock[stock_id], part_duals, stock_info["length"] + saw_kerf, saw_kerf
+			)
+			exact &= complete
+			# Reduced cost of a pattern: weight - sum(dual_i * a_i) - dual of the stock limit.
+			if counts and value > weights[stock_id] - stock_duals.get(stock_id, 0) + REDUCED_COST_TOLERANCE:
+				added |= _add_column(columns, seen, stock_id, counts)
+		if not added:
+			converged = exact
+			break
+	else:
+		# Columns were added after the last solve; their usage is still to come.
+		usage += [0.0] * (len(columns) - len(usage))
+	return lengths, columns, usage, converged
+
+
+def column_patterns(columns, lengths, stock_data, saw_kerf):
+	"""The columns as pattern dicts, pieces laid out longest first."""
+	all_patterns = []
+	for stock_id, counts in columns:
+		pattern_yield = {f"{length}": count for length, count in zip(lengths, counts, strict=True) if count}
+		layout = [
+			{"part_id": f"{length}", "length": length}
+			for length, count in zip(lengths, counts, strict=True)
+			for _ in range(count)
+		]
+		pattern = _build_pattern(
+			f"pat_{len(all_patterns)}",
+			stock_id,
+			stock_data[stock_id]["length"],
+			saw_kerf,
+			pattern_yield,
+			layout,
+		)
+		if pattern is not None:
+			all_patterns.append(pattern)
+	return all_patterns
+
+
+def _add_column(columns, seen, stock_id, counts):
+	key = (stock_id, tuple(counts))
+	if key in seen:
+		return False
+	seen.add(key)
+	columns.append((stock_id, list(counts)))
+	return True
+
+
+def _solve_master_lp(columns, stock_data, lengths, total_demand, weights):
+	"""
+	Solves the LP relaxation over the current columns and returns the duals of
+	the demand rows and of the stock availability rows, and the usage of each
+	column, or None if infeasible.
+	"""
+	solver = pywraplp.Solver.CreateSolver("GLOP")
+	usage = [solver.NumVar(0, solver.infinity(), f"x_{k}") for k in range(len(columns))]
+
+	demand_rows = []
+	for j, length in enumerate(lengths):
+		demand_rows.append(
+			solver.Add(
+				sum(usage[k] * counts[j] for k, (_, counts) in enumerate(columns) if counts[j])
+				>= total_demand[length]
+			)
+		)
+
+	stock_rows = {}
+	for stock_id, stock_info in stock_data.items():
+		if "available" in stock_info:
+			stock_rows[stock_id] = solver.Add(
+				sum(usage[k] for k, (sid, _) in enumerate(columns) if sid == stock_id)
+				<= stock_info["available"]
+			)
+
+	solver.Minimize(sum(usage[k] * weights[stock_id] for k, (stock_id, _) in enumerate(columns)))
+	if solver.Solve() != pywraplp.Solver.OPTIMAL:
+		return None
+
+	part_duals = [row.dual_value() for row in demand_rows]
+	stock_duals = {stock_id: row.dual_value() for stock_id, row in stock_rows.items()}
+	return part_duals, stock_duals, [variable.solution_value() for variable in usage]
+
+
+def _price_pattern(lengths, caps, part_duals, capacity, saw_kerf):
+	"""
+	Bounded knapsack: the pattern of greatest total dual value that fits in
+	`capacity` (stock length + one kerf, since every piece carries a kerf but
+	the last). Branch and bound on the fractional relaxation, capped at
+	PRICING_NODE_LIMIT nodes, in which case the best pattern found is returned.
+	The third value says whether the search was complete.
+	"""
+	items = []
+	for j, length in enumerate(lengths):
+		weight = length + saw_kerf
+		if (
+			part_duals[j] > REDUCED_COST_TOLERANCE
+			and caps[length]
+			and 0 < weight <= capacity + LENGTH_TOLERANCE
+		):
+			items.append((part_duals[j], weight, caps[length], j))
+	items.sort(key=lambda item: item[0] / item[1], reverse=True)
+
+	best = {"value": 0.0, "counts": None}
+	counts = [0] * len(lengths)
+	nodes = [0]
+
+	def upper_bound(k, room, value):
+		for item_value, weight, cap, _ in items[k:]:
+			take = min(cap, room / weight)
+			value += take * item_value
+			room -= take * weight
+			if room <= LENGTH_TOLERANCE:
+				break
+		return value
+
+	def search(k, room, value):
+		nodes[0] += 1
+		if value > best["value"] + REDUCED_COST_TOLERANCE:
+			best["value"], best["counts"] = value, list(counts)
+		if k == len(items) or nodes[0] > PRICING_NODE_LIMIT:
+			return
+		if upper_bound(k, room, value) <= best["value"] + REDUCED_COST_TOLERANCE:
+			return
+		item_value, weight, cap, j = items[k]
+		for copies in range(min(cap, int((room + LENGTH_TOLERANCE) // weight)), -1, -1):
+			counts[j] = copies
+			search(k + 1, room - copies * weight, value + copies * item_value)
+		counts[j] = 0
+
+	search(0, capacity, 0.0)
+	return best["value"], best["counts"], nodes[0] <= PRICING_NODE_LIMIT
@@ -0,0 +1,227 @@
+#
+# 1D Cutting Optimizer - Decomposition Engine
+#
+# Orders with hundreds of distinct lengths on one profile are out of reach for
+# a single pattern set and model. They are split into groups of part types,
+# each group spanning the whole length range (long parts need short ones to
+# fill their bars), and the groups are solved in parallel by the regular
+# engines. A repair phase then pools the worst-filled bars of all groups and
+# re-solves their pieces together, keeping the result while it is better.
+#
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .heuristics import run_first_fit_decreasing
+from .optimizer_core import (
+	_solution_from_yields,
+	_stock_objective_weights,
+	solver_thread_share,
+	with_solver_threads,
+)
+from .progress import with_progress_listener
+
+logger = logging.getLogger(__name__)
+
+# Part types per group and per repair subproblem.
+GROUP_PART_TYPES = 40
+REPAIR_MAX_BARS = 40
+REPAIR_ROUNDS = 10
+REPAIR_TIME_LIMIT_SECONDS = 300
+MAX_PARALLEL_GROUPS = 4
+
+
+def run_decomposition(
+	stock_data,
+	parts_data,
+	saw_kerf,
+	allow_overproduction=False,
+	generation_limits=None,
+	group_part_types=GROUP_PART_TYPES,
+):
+	"""
+	Solves the parts in interleaved groups of at most `group_part_types`
+	lengths, merges the group plans and repairs the worst-filled bars.
+	Returns the standard solution with a `decomposition` report.
+	"""
+	groups = partition_parts(parts_data, group_part_types)
+	group_stock = _split_available_stock(stock_data, groups)
+
+	parallel_groups = min(MAX_PARALLEL_GROUPS, len(groups)) or 1
+	# The groups share the job's CP-SAT thread budget.
+	with solver_thread_share(parallel_groups), ThreadPoolExecutor(max_workers=parallel_groups) as executor:
+		group_solutions = list(
+			executor.map(
+				with_solver_threads(
+					with_progress_listener(
+						lambda args: _solve_subproblem(
+							args[0], args[1], saw_kerf, allow_overproduction, generation_limits
+						)
+					)
+				),
+				zip(group_stock, groups, strict=True),
+			)
+		)
+	if any(solution is None for solution in group_solutions):
+		return None
+
+	# Bars are (stock_id, yield) pairs, one per physical bar. First-Fit-
+	# Decreasing over the whole order is cheap and sometimes packs better than
+	# the separate groups; the better start is repaired.
+	weights = _stock_objective_weights(stock_data)
+	bars = _bars([pattern for solution in group_solutions for pattern in solution["patterns"]])
+	start = "groups"
+	whole = run_first_fit_decreasing(stock_data, parts_data, saw_kerf, allow_overproduction)
+	if whole and _objective(whole["patterns"], weights) < sum(weights[stock_id] for stock_id, _ in bars):
+		bars, start = _bars(whole["patterns"]), "heuristic"
+	bars_before_repair = len(bars)
+	bars, rounds = _repair(bars, stock_data, parts_data, saw_kerf, generation_limits)
+
+	solution = _solution_from_yields(
+		[(stock_id, bar_yield, 1) for stock_id, bar_yield in bars], stock_data, parts_data, saw_kerf
+	)
+	solution["proven_optimal"] = False
+	solution["decomposition"] = {
+		"groups": len(groups),
+		"group_engines": [group_solution.get("engine") for group_solution in group_solutions],
+		"start": start,
+		"bars_before_repair": bars_before_repair,
+		"bars_after_repair": len(bars),
+		"repair_rounds": rounds,
+	}
+	return solution
+
+
+def partition_parts(parts_data, group_part_types=GROUP_PART_TYPES):
+	"""
+	Splits the part types into the fewest groups of at most
+	`group_part_types` lengths, dealing them out longest first in turn, so
+	every group holds long and short parts alike.
+	"""
+	ordered = sorted(parts_data, key=lambda part: part["length"], reverse=True)
+	count = max(1, math.ceil(len(ordered) / group_part_types))
+	return [ordered[i::count] for i in range(count)]
+
+
+def _split_available_stock(stock_data, groups):
+	"""
+	Stock entries per group. Limited stock (remnants) is shared out in
+	proportion to each group's material, so the groups cannot overdraw it.
+	"""
+	materials = [sum(part["length"] * part["demand"] for part in group) for group in groups]
+	total = sum(materials) or 1
+	group_stock = [{} for _ in groups]
+	for stock_id, stock_info in stock_data.items():
+		if "available" not in stock_info:
+			for entries in group_stock:
+				entries[stock_id] = stock_info
+			continue
+		shares = [int(stock_info["available"] * material / total) for material in materials]
+		for i in range(stock_info["available"] - sum(shares)):
+			shares[i % len(shares)] += 1
+		for entries, share in zip(group_stock, shares, strict=True):
+			entries[stock_id] = dict(stock_info, available=share)
+	return group_stock
+
+
+def _solve_subproblem(stock_data, parts_data, saw_kerf, allow_overproduction, generation_limits):
+	"""The better of First-Fit-Decreasing and the engine selected for the subproblem."""
+	from .optimizer_core import _run_engine
+
+	candidates = [run_first_fit_decreasing(stock_data, parts_data, saw_kerf, allow_overproduction)]
+	if candidates[0]:
+		candidates[0]["engine"] = "heuristic"
+	try:
+		candidates.append(
+			_run_engine(stock_data, parts_data, saw_kerf, allow_overproduction, "auto", generation_limits)
+		)
+	except Exception:
+		logger.exception("Decomposition subproblem failed; keeping the heuristic plan")
+	candidates = [solution for solution in candidates if solution]
+	if not candidates:
+		return None
+	weights = _stock_objective_weights(stock_data)
+	return min(candidates, key=lambda solution: _objective(solution["patterns"], weights))
+
+
+def _repair(bars, stock_data, parts_data, saw_kerf, generation_limits):
+	"""
+	Re-solves the pieces of the worst-filled bars (at most REPAIR_MAX_BARS and
+	GROUP_PART_TYPES lengths) across all groups, keeping the result when it
+	lowers the objective and moving on to the next worst bars when it does
+	not. Returns the bars and the number of improving rounds.
+	"""
+	length_by_part_id = {f"{part['length']}": part["length"] for part in parts_data}
+	weights = _stock_objective_weights(stock_data)
+
+	def fill(bar):
+		stock_id, bar_yield = bar
+		parts_length = sum(length_by_part_id[part_id] * count for part_id, count in bar_yield.items())
+		return parts_length / stock_data[stock_id]["length"]
+
+	deadline = time.monotonic() + REPAIR_TIME_LIMIT_SECONDS
+	improved, skip = 0, 0
+	for _ in range(REPAIR_ROUNDS):
+		if time.monotonic() > deadline:
+			break
+		order = sorted(range(len(bars)), key=lambda i: fill(bars[i]))[skip:]
+		selected, part_ids = [], set()
+		for i in order:
+			if len(selected) >= REPAIR_MAX_BARS:
+				break
+			if len(part_ids | set(bars[i][1])) > GROUP_PART_TYPES:
+				continue
+			selected.append(i)
+			part_ids |= set(bars[i][1])
+		if len(selected) < 2:
+			break
+
+		demand = {}
+		for i in selected:
+			for part_id, count in bars[i][1].items():
+				demand[part_id] = demand.get(part_id, 0) + count
+		repair_parts = [
+			{"length": length_by_part_id[part_id], "demand": count} for part_id, count in demand.items()
+		]
+		selected_set = set(selected)
+		kept = [bar for i, bar in enumerate(bars) if i not in selected_set]
+
+		# The pieces of the selected bars are exactly their demand; any
+		# overproduction there was already decided by the groups.
+		solution = _solve_subproblem(
+			_remaining_stock(stock_data, kept), repair_parts, saw_kerf, False, generation_limits
+		)
+		if solution and _objective(solution["patterns"], weights) < sum(
+			weights[bars[i][0]] for i in selected
+		):
+			bars = kept + _bars(solution["patterns"])
+			improved, skip = improved + 1, 0
+		else:
+			skip += len(selected) // 2
+	return bars, improved
+
+
+def _bars(patterns):
+	return [
+		(pattern["stock_id_used"], pattern["yield"])
+		for pattern in patterns
+		for _ in range(pattern["usage_count"])
+	]
+
+
+def _remaining_stock(stock_data, bars):
+	"""Stock entries with the limited stock used by `bars` taken off."""
+	used = {}
+	for stock_id, _ in bars:
+		used[stock_id] = used.get(stock_id, 0) + 1
+	return {
+		stock_id: dict(stock_info, available=stock_info["available"] - used.get(stock_id, 0))
+		if "available" in stock_info
+		else stock_info
+		for stock_id, stock_info in stock_data.items()
+	}
+
+
+def _objective(patterns, weights):
+	return sum(pattern["usage_count"] * weights[pattern["stock_id_used"]] for pattern in patterns)
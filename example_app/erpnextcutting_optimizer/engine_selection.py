@@ -0,0 +1,168 @@
+#
+# 1D Cutting Optimizer - Pattern Count Estimation & Engine Selection
+#
+# Full enumeration + CP-SAT is the best engine while the pattern set stays
+# small, and hopeless once it reaches millions. The number of patterns is
+# counted here without materializing them, so the engine can be chosen
+# before `_generate_all_patterns` is ever called.
+#
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Selection thresholds. Decisions are logged with their inputs so these can be
+# tuned from production data.
+ENUMERATION_PATTERN_LIMIT = 20_000
+MAXIMAL_PATTERN_LIMIT = 400_000
+COLUMN_GENERATION_PART_TYPE_LIMIT = 400
+# From this many pieces, CP-SAT usage domains get huge and the high-volume
+# engine takes over.
+HIGH_VOLUME_PIECE_LIMIT = 20_000
+MAX_COUNTING_CAPACITY = 200_000
+
+# "portfolio" races several solvers and is never picked automatically.
+ENGINES = (
+	"enumeration",
+	"maximal",
+	"column_generation",
+	"decomposition",
+	"high_volume",
+	"heuristic",
+	"portfolio",
+)
+
+
+def total_demand_by_length(parts_data):
+	"""Sums the demand per unique part length."""
+	total_demand = {}
+	for part in parts_data:
+		total_demand[part["length"]] = total_demand.get(part["length"], 0) + part["demand"]
+	return total_demand
+
+
+def demand_caps(total_demand, stock_length, saw_kerf):
+	"""
+	The most copies of a length a useful pattern can hold: its total demand,
+	or fewer if fewer fit on the bar. Any pattern above the demand can be
+	replaced by one of its sub-patterns at no cost. Clamping to what fits
+	keeps the cache key identical across orders whose demands differ.
+	"""
+	caps = {}
+	for length, demand in total_demand.items():
+		fits = int((stock_length + saw_kerf) // (length + saw_kerf)) if length + saw_kerf > 0 else demand
+		caps[length] = max(0, min(demand, fits))
+	return caps
+
+
+def estimate_pattern_count(stock_length, caps, saw_kerf):
+	"""
+	Counts the non-empty patterns `_stream_patterns` would produce for one
+	stock length, without generating them.
+
+	A pattern holds c_i pieces of length l_i (0 <= c_i <= cap_i) with
+	sum(c_i * (l_i + kerf)) <= stock_length + kerf. This is a bounded-knapsack
+	counting DP over the used length in whole length units, coarsened when
+	the stock spans more than MAX_COUNTING_CAPACITY units, so the result is
+	an estimate once rounding comes into play.
+	"""
+	capacity = math.floor(stock_length + saw_kerf)
+	if capacity <= 0:
+		return 0
+	# Fine length units would make the DP array huge; coarsen them instead.
+	unit = max(1.0, capacity / MAX_COUNTING_CAPACITY)
+	capacity = int(capacity / unit)
+
+	# float64 keeps huge counts approximate instead of overflowing.
+	counts = np.zeros(capacity + 1, dtype=np.float64)
+	counts[0] = 1.0
+	for length, cap in caps.items():
+		weight = max(1, round((length + saw_kerf) / unit))
+		updated = counts.copy()
+		for copies in range(1, cap + 1):
+			shift = copies * weight
+			if shift > capacity:
+				break
+			updated[shift:] += counts[: capacity + 1 - shift]
+		counts = updated
+	return float(counts.sum()) - 1.0
+
+
+def bars_lower_bound(stock_data, parts_data, saw_kerf):
+	"""
+	Material bound on the bar count: every piece takes its length plus a kerf,
+	and no bar offers more than the longest stock length plus one kerf.
+	"""
+	max_stock_length = max((stock_info["length"] for stock_info in stock_data.values()), default=0)
+	if max_stock_length <= 0:
+		return 0
+	total_parts_length = sum((part["length"] + saw_kerf) * part["demand"] for part in parts_data)
+	return math.ceil(total_parts_length / (max_stock_length + saw_kerf))
+
+
+def instance_features(stock_data, parts_data, saw_kerf):
+	"""Cheap descriptive features of a single optimization instance."""
+	total_demand = total_demand_by_length(parts_data)
+	lengths = list(total_demand)
+	total_pieces = sum(total_demand.values())
+
+	estimated_patterns = 0.0
+	max_stock_length = 0
+	for stock_info in stock_data.values():
+		stock_length = stock_info["length"]
+		max_stock_length = max(max_stock_length, stock_length)
+		caps = demand_caps(total_demand, stock_length, saw_kerf)
+		estimated_patterns += estimate_pattern_count(stock_length, caps, saw_kerf)
+
+	mean_length = (sum(lengths) / len(lengths)) if lengths else 0
+	return {
+		"num_part_types": len(lengths),
+		"num_stock_types": len(stock_data),
+		"total_pieces": total_pieces,
+		"min_part_length": min(lengths) if lengths else 0,
+		"max_part_length": max(lengths) if lengths else 0,
+		"pieces_per_bar": (max_stock_length / mean_length) if mean_length > 0 else 0,
+		"bars_lower_bound": bars_lower_bound(stock_data, parts_data, saw_kerf),
+		"estimated_patterns": estimated_patterns,
+	}
+
+
+def select_engine(stock_data, parts_data, saw_kerf):
+	"""
+	Chooses the engine for an instance from its piece and estimated pattern
+	counts:
+	- high_volume: vectorized Best-Fit-Decreasing and the rounded LP with
+	  a CP-SAT polish of the residual, for tens of thousands of pieces
+	- enumeration: all patterns + CP-SAT, exact, for small pattern sets
+	- maximal: only patterns no further part fits into, exact for bar count
+	- column_generation: LP pricing of the patterns that matter
+	- decomposition: groups of part types solved separately, then repaired,
+	  for more part types than column generation handles
+	- heuristic: First-Fit-Decreasing, never picked here but the fallback
+	  inside decomposition
+	"""
+	features = instance_features(stock_data, parts_data, saw_kerf)
+	estimated_patterns = features["estimated_patterns"]
+
+	if features["total_pieces"] >= HIGH_VOLUME_PIECE_LIMIT:
+		engine = "high_volume"
+	elif estimated_patterns <= ENUMERATION_PATTERN_LIMIT:
+		engine = "enumeration"
+	elif estimated_patterns <= MAXIMAL_PATTERN_LIMIT:
+		engine = "maximal"
+	elif features["num_part_types"] <= COLUMN_GENERATION_PART_TYPE_LIMIT:
+		engine = "column_generation"
+	else:
+		engine = "decomposition"
+
+	logger.info(
+		"Selected engine %s for ~%.0f patterns (%d part types, %d pieces, %d stock types)",
+		engine,
+		estimated_patterns,
+		features["num_part_types"],
+		features["total_pieces"],
+		features["num_stock_types"],
+	)
+	return {"engine": engine, "features": features}
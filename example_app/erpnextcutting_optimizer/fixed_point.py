@@ -0,0 +1,147 @@
+#
+# 1D Cutting Optimizer - Fixed-Point Length Model
+#
+# Part lengths and kerf arrive from the dialog as floats (1234.5 mm, 2.8 mm).
+# The engines work on integer lengths instead: everything is scaled to units
+# of a fixed resolution and reduced by the GCD, so generation and solving are
+# all-integer and cache keys are stable. Values are converted back at the
+# boundary, so callers only ever see the lengths and part ids they passed in.
+#
+import math
+from functools import reduce
+
+from .optimizer_core import _build_pattern, _package_solution
+
+DEFAULT_LENGTH_RESOLUTION = 0.1
+# Resolution is refined, never below this, until distinct lengths stay distinct.
+MIN_LENGTH_RESOLUTION = 1e-6
+# Absorbs float noise such as 1234.5 / 0.1 == 12344.999999999998.
+ROUNDING_TOLERANCE = 1e-6
+# Pattern lengths are recomputed from the original floats and rounded to this.
+LENGTH_DECIMALS = 6
+LENGTH_FIELDS = (
+	"total_used_length_in_pattern",
+	"waste_length_in_pattern",
+	"total_kerf_length_in_pattern",
+	"total_parts_length_in_pattern",
+)
+
+
+class FixedPointProblem:
+	"""
+	An optimization instance scaled to integer length units of `scale` mm.
+
+	Parts and kerf are rounded up and stock lengths down, so any pattern that
+	fits in units also fits in millimetres.
+	"""
+
+	def __init__(self, stock_data, parts_data, saw_kerf, resolution=DEFAULT_LENGTH_RESOLUTION):
+		self.original_stock_data = stock_data
+		self.original_parts_data = parts_data
+		self.original_saw_kerf = saw_kerf
+
+		resolution = _distinct_resolution([part["length"] for part in parts_data], resolution)
+		stock_units = {sid: _floor_units(info["length"], resolution) for sid, info in stock_data.items()}
+		part_units = [_ceil_units(part["length"], resolution) for part in parts_data]
+		kerf_units = _ceil_units(saw_kerf, resolution)
+
+		divisor = reduce(math.gcd, [*stock_units.values(), *part_units, kerf_units], 0) or 1
+		self.scale = resolution * divisor
+
+		self.stock_data = {
+			sid: dict(stock_data[sid], length=units // divisor) for sid, units in stock_units.items()
+		}
+		self.parts_data = [
+			dict(part, length=units // divisor) for part, units in zip(parts_data, part_units, strict=True)
+		]
+		self.saw_kerf = kerf_units // divisor
+
+		# Scaled part id -> original part, for the conversion back.
+		self._original_parts = {
+			f"{scaled['length']}": part for scaled, part in zip(self.parts_data, parts_data, strict=True)
+		}
+		# Original length -> scaled part id, for pattern hints.
+		self._scaled_part_ids = {
+			float(part["length"]): f"{scaled['length']}"
+			for scaled, part in zip(self.parts_data, parts_data, strict=True)
+		}
+
+	def scale_pattern_hints(self, pattern_hints):
+		"""
+		Maps pattern hints in millimetres (`stock_length`, `pieces` as
+		[length, count] pairs, `frequency`) onto the scaled stock entries and
+		part ids. Hints with a length this instance does not have are dropped.
+		"""
+		stock_ids = {}
+		for stock_id, info in self.original_stock_data.items():
+			if not info.get("remnant"):
+				stock_ids.setdefault(float(info["length"]), stock_id)
+
+		scaled = []
+		for hint in pattern_hints or []:
+			stock_id = stock_ids.get(float(hint["stock_length"]))
+			part_ids = [self._scaled_part_ids.get(float(length)) for length, _ in hint["pieces"]]
+			if stock_id is None or None in part_ids or not part_ids:
+				continue
+			hint_yield = {}
+			for part_id, (_, count) in zip(part_ids, hint["pieces"], strict=True):
+				hint_yield[part_id] = hint_yield.get(part_id, 0) + int(count)
+			scaled.append({"stock_id": stock_id, "yield": hint_yield, "frequency": hint.get("frequency", 1)})
+		return scaled
+
+	def to_original(self, solution):
+		"""
+		Converts a solution in integer units back to the original lengths and
+		part ids, recomputing each pattern's lengths from the original values.
+		Keys the engines added (engine, portfolio, ...) are kept as they are.
+		"""
+		if not solution:
+			return solution
+
+		patterns = []
+		for pattern in solution["patterns"]:
+			stock_id = pattern["stock_id_used"]
+			pattern_yield = {
+				f"{self._original_parts[part_id]['length']}": count
+				for part_id, count in pattern["yield"].items()
+			}
+			layout = []
+			for piece in pattern["layout_pieces"]:
+				length = self._original_parts[piece["part_id"]]["length"]
+				layout.append({"part_id": f"{length}", "length": length})
+			converted = _build_pattern(
+				pattern["pattern_id"],
+				stock_id,
+				self.original_stock_data[stock_id]["length"],
+				self.original_saw_kerf,
+				pattern_yield,
+				layout,
+			)
+			for key in LENGTH_FIELDS:
+				converted[key] = round(converted[key], LENGTH_DECIMALS)
+			converted["usage_count"] = pattern["usage_count"]
+			patterns.append(converted)
+
+		converted_solution = _package_solution(patterns, self.original_stock_data, self.original_parts_data)
+		for key, value in solution.items():
+			converted_solution.setdefault(key, value)
+		converted_solution["length_scale_mm"] = self.scale
+		return converted_solution
+
+
+def _distinct_resolution(lengths, resolution):
+	"""Refines the resolution tenfold until distinct lengths map to distinct units."""
+	distinct = set(lengths)
+	while resolution > MIN_LENGTH_RESOLUTION:
+		if len({_ceil_units(length, resolution) for length in distinct}) == len(distinct):
+			return resolution
+		resolution /= 10
+	return resolution
+
+
+def _ceil_units(value, resolution):
+	return math.ceil(value / resolution - ROUNDING_TOLERANCE)
+
+
+def _floor_units(value, resolution):
+	return math.floor(value / resolution + ROUNDING_TOLERANCE)
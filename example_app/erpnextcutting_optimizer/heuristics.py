@@ -0,0 +1,54 @@
+#
+# 1D Cutting Optimizer - Heuristic Engine
+#
+# First-Fit-Decreasing needs no pattern set at all, so it is the engine of
+# last resort for instances whose pattern count is out of reach.
+#
+from .optimizer_core import _solution_from_yields
+
+
+def run_first_fit_decreasing(stock_data, parts_data, saw_kerf, allow_overproduction=False):
+	"""
+	Places every demanded piece, longest first, on the first open bar with
+	room for it, opening a bar of the longest available stock otherwise
+	(remnants before fresh stock). Produces exactly the demand, so
+	`allow_overproduction` changes nothing.
+	"""
+	pieces = sorted((part["length"] for part in parts_data for _ in range(part["demand"])), reverse=True)
+	remaining_stock = {stock_id: stock_info.get("available") for stock_id, stock_info in stock_data.items()}
+	stock_by_length = sorted(
+		stock_data, key=lambda sid: (not stock_data[sid].get("remnant"), -stock_data[sid]["length"])
+	)
+
+	# Each open bar is [stock_id, remaining_length, yield].
+	bars = []
+	for length in pieces:
+		part_id = f"{length}"
+		for bar in bars:
+			if bar[2] and length + saw_kerf <= bar[1]:
+				bar[1] -= length + saw_kerf
+				break
+		else:
+			bar = _open_bar(stock_by_length, stock_data, remaining_stock, length)
+			if bar is None:
+				return None
+			bars.append(bar)
+			bar[1] -= length
+		bar[2][part_id] = bar[2].get(part_id, 0) + 1
+
+	if not bars:
+		return None
+	return _solution_from_yields(
+		[(stock_id, bar_yield, 1) for stock_id, _, bar_yield in bars], stock_data, parts_data, saw_kerf
+	)
+
+
+def _open_bar(stock_by_length, stock_data, remaining_stock, length):
+	for stock_id in stock_by_length:
+		if stock_data[stock_id]["length"] < length:
+			continue
+		if remaining_stock[stock_id] is None or remaining_stock[stock_id] > 0:
+			if remaining_stock[stock_id] is not None:
+				remaining_stock[stock_id] -= 1
+			return [stock_id, stock_data[stock_id]["length"], {}]
+	return None
@@ -0,0 +1,312 @@
+#
+# 1D Cutting Optimizer - High-Volume Engine
+#
+# Orders of tens of thousands of pieces give CP-SAT usage variables with huge
+# domains, and per-piece heuristics spend their time in Python loops. Here
+# Best-Fit-Decreasing runs on NumPy bin state arrays: all copies of one length
+# are placed in one vectorized step, filling the open bars tightest first,
+# then opening as many new bars as the rest needs. The pattern-level LP
+# relaxation, rounded down, covers most of the order with well-filled
+# patterns; only the residual demand and the worst-filled bars are left to
+# CP-SAT, with small domains. The gap to the material lower bound is reported.
+#
+import logging
+import math
+
+import numpy as np
+
+from .engine_selection import bars_lower_bound, total_demand_by_length
+from .optimizer_core import (
+	_solution_from_yields,
+	_solve_cutting_problem,
+	_stock_objective_weights,
+	_trim_overproduction,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bars of the rounded LP plan, worst-filled first, re-solved with the residual.
+POLISH_BARS = 60
+POLISH_TIME_LIMIT_SECONDS = 2.0
+# Rounding tolerance for LP usage values.
+USAGE_TOLERANCE = 1e-6
+
+
+def run_high_volume(stock_data, parts_data, saw_kerf, allow_overproduction=False):
+	"""
+	The better of Best-Fit-Decreasing and the rounded LP plan with its
+	residual polished by CP-SAT. Produces exactly the demand, so
+	`allow_overproduction` changes nothing. Returns the standard solution
+	with a `high_volume` report, or None when the parts do not fit.
+	"""
+	greedy = run_best_fit_decreasing(stock_data, parts_data, saw_kerf)
+	if greedy is None:
+		return None
+	weights = _stock_objective_weights(stock_data)
+
+	report = {"bars_best_fit": sum(greedy["total_stock_items_used"].values())}
+	try:
+		polished = _round_and_polish(stock_data, parts_data, saw_kerf, greedy, report)
+	except Exception:
+		logger.exception("High-volume LP rounding failed; keeping the Best-Fit-Decreasing plan")
+		polished = None
+	solution = greedy
+	if polished and _objective(polished, weights) < _objective(greedy, weights):
+		solution = polished
+
+	# With one weight for every bar, a converged LP bounds the bar count too,
+	# and the fewest bars is the lowest objective; otherwise neither holds.
+	uniform_weights = len(set(weights.values())) == 1
+	bars = sum(solution["total_stock_items_used"].values())
+	lower_bound = bars_lower_bound(stock_data, parts_data, saw_kerf)
+	if report.get("lp_converged") and uniform_weights:
+		lower_bound = max(lower_bound, math.ceil(report["lp_bars"] - USAGE_TOLERANCE))
+	solution["proven_optimal"] = uniform_weights and bars == lower_bound
+	solution["high_volume"] = dict(
+		report,
+		lp_bars=round(report["lp_bars"], 2) if "lp_bars" in report else None,
+		plan="polished" if solution is polished else "best_fit",
+		bars=bars,
+		bars_lower_bound=lower_bound,
+		gap=round((bars - lower_bound) / lower_bound, 6) if lower_bound else 0.0,
+	)
+	return solution
+
+
+def run_best_fit_decreasing(stock_data, parts_data, saw_kerf, allow_overproduction=False):
+	"""The Best-Fit-Decreasing plan as a standard solution, or None when the parts do not fit."""
+	bins = best_fit_decreasing(stock_data, parts_data, saw_kerf)
+	if bins is None:
+		return None
+	return _solution_from_yields(_bar_groups(bins), stock_data, parts_data, saw_kerf)
+
+
+def _round_and_polish(stock_data, parts_data, saw_kerf, greedy, report):
+	"""
+	Rounds the LP relaxation (started from the greedy patterns) down to
+	whole bars, trims what rounding overproduces, and re-solves the residual
+	demand together with the POLISH_BARS worst-filled rounded bars.
+	"""
+	from .column_generation import column_patterns, lp_relaxation
+
+	relaxation = lp_relaxation(stock_data, parts_data, saw_kerf, greedy["patterns"])
+	if relaxation is None:
+		return None
+	lengths, columns, usage, converged = relaxation
+	part_ids = [f"{length}" for length in lengths]
+	rounded = [
+		(
+			stock_id,
+			{part_id: count for part_id, count in zip(part_ids, counts, strict=True) if count},
+			math.floor(value + USAGE_TOLERANCE),
+		)
+		for (stock_id, counts), value in zip(columns, usage, strict=True)
+	]
+	report["lp_bars"] = sum(usage)
+	report["lp_converged"] = converged
+	rounded = _trim_overproduction(
+		_solution_from_yields(rounded, stock_data, parts_data, saw_kerf), stock_data, parts_data, saw_kerf
+	)
+
+	# The worst-filled bars are released into the residual; a group loses
+	# some of its bars or all of them.
+	length_by_part_id = dict(zip(part_ids, lengths, strict=True))
+
+	def fill(pattern):
+		parts_length = sum(length_by_part_id[part_id] * count for part_id, count in pattern["yield"].items())
+		return parts_length / stock_data[pattern["stock_id_used"]]["length"]
+
+	kept, released = [], 0
+	for pattern in sorted(rounded["patterns"], key=fill):
+		taken = min(POLISH_BARS - released, pattern["usage_count"])
+		released += taken
+		if pattern["usage_count"] > taken:
+			kept.append((pattern["stock_id_used"], pattern["yield"], pattern["usage_count"] - taken))
+
+	produced = {}
+	for _, pattern_yield, bars in kept:
+		for part_id, count in pattern_yield.items():
+			produced[part_id] = produced.get(part_id, 0) + count * bars
+	# Lengths the residual no longer needs stay in with zero demand, since
+	# the LP patterns may still hold them.
+	residual_parts = [
+		{"length": part["length"], "demand": max(0, part["demand"] - produced.get(f"{part['length']}", 0))}
+		for part in _demand_parts(parts_data)
+	]
+	report["residual_pieces"] = sum(part["demand"] for part in residual_parts)
+	if not report["residual_pieces"]:
+		return _solution_from_yields(kept, stock_data, parts_data, saw_kerf)
+
+	used = {}
+	for stock_id, _, bars in kept:
+		used[stock_id] = used.get(stock_id, 0) + bars
+	residual_stock = {
+		stock_id: dict(stock_info, available=stock_info["available"] - used.get(stock_id, 0))
+		if "available" in stock_info
+		else stock_info
+		for stock_id, stock_info in stock_data.items()
+	}
+	residual = _solve_residual(
+		residual_stock, residual_parts, saw_kerf, column_patterns(columns, lengths, stock_data, saw_kerf)
+	)
+	if residual is None:
+		return None
+	return _solution_from_yields(
+		kept + [(p["stock_id_used"], p["yield"], p["usage_count"]) for p in residual["patterns"]],
+		stock_data,
+		parts_data,
+		saw_kerf,
+	)
+
+
+def _solve_residual(stock_data, parts_data, saw_kerf, lp_patterns):
+	"""
+	CP-SAT over the LP patterns and the residual's own Best-Fit-Decreasing
+	patterns, started from the latter: the demand is small, so are the
+	domains. Covers the demand and trims the surplus, as the LP patterns may
+	hold lengths the residual does not need.
+	"""
+	greedy = run_best_fit_decreasing(stock_data, parts_data, saw_kerf)
+	if greedy is None:
+		return None
+	hints = [
+		dict(pattern, pattern_id=f"pat_{len(lp_patterns) + i}", frequency=pattern["usage_count"])
+		for i, pattern in enumerate(greedy["patterns"])
+	]
+	solution = _solve_cutting_problem(
+		lp_patterns + hints,
+		stock_data,
+		parts_data,
+		allow_overproduction=True,
+		time_limit=POLISH_TIME_LIMIT_SECONDS,
+		hint_patterns=hints,
+	)
+	if solution:
+		solution = _trim_overproduction(solution, stock_data, parts_data, saw_kerf)
+	weights = _stock_objective_weights(stock_data)
+	if not solution or _objective(solution, weights) > _objective(greedy, weights):
+		return greedy
+	return solution
+
+
+def _demand_parts(parts_data):
+	return [
+		{"length": length, "demand": demand} for length, demand in total_demand_by_length(parts_data).items()
+	]
+
+
+def _objective(solution, weights):
+	return sum(pattern["usage_count"] * weights[pattern["stock_id_used"]] for pattern in solution["patterns"])
+
+
+def best_fit_decreasing(stock_data, parts_data, saw_kerf):
+	"""
+	Places the pieces longest first, each on the open bar with the least room
+	that still fits it, opening a bar of the longest available stock
+	otherwise (remnants before fresh stock). Copies of one length are placed
+	together: best fit fills the tightest fitting bar until it is full, so
+	the fitting bars are filled in order of their room. Returns the bin
+	state arrays and the placements, or None when a piece does not fit.
+	"""
+	demand = total_demand_by_length(parts_data)
+	lengths = sorted((length for length, count in demand.items() if count > 0), reverse=True)
+	stock_ids = sorted(
+		stock_data, key=lambda sid: (not stock_data[sid].get("remnant"), -stock_data[sid]["length"])
+	)
+	available = {stock_id: stock_data[stock_id].get("available") for stock_id in stock_ids}
+
+	# A bar's room counts one kerf more than its length, since its first
+	# piece needs no cut before it; every piece then takes length + kerf.
+	size = 0
+	remaining = np.empty(1024, dtype=np.float64)
+	capacity = np.empty(1024, dtype=np.float64)
+	stock_index = np.empty(1024, dtype=np.int32)
+	placements = []
+
+	for part_index, length in enumerate(lengths):
+		width = length + saw_kerf
+		count = demand[length]
+
+		candidates = np.flatnonzero(remaining[:size] >= width)
+		if len(candidates):
+			candidates = candidates[np.argsort(remaining[candidates], kind="stable")]
+			takes = (remaining[candidates] // width).astype(np.int64)
+			filled = np.searchsorted(np.cumsum(takes), count)
+			if filled < len(candidates):
+				candidates, takes = candidates[: filled + 1], takes[: filled + 1]
+				takes[-1] -= takes.sum() - count
+			remaining[candidates] -= takes * width
+			placements.append((candidates, part_index, takes))
+			count -= int(takes.sum())
+
+		while count > 0:
+			opened = _open_bars(stock_ids, stock_data, available, length, saw_kerf, count)
+			if opened is None:
+				return None
+			stock_id, per_bar, new_bars = opened
+			if size + new_bars > len(remaining):
+				grown = max(2 * len(remaining), size + new_bars)
+				remaining, capacity, stock_index = (
+					np.resize(array, grown) for array in (remaining, capacity, stock_index)
+				)
+			takes = np.full(new_bars, per_bar, dtype=np.int64)
+			takes[-1] = min(per_bar, count - per_bar * (new_bars - 1))
+			indices = np.arange(size, size + new_bars)
+			capacity[indices] = stock_data[stock_id]["length"] + saw_kerf
+			remaining[indices] = capacity[indices] - takes * width
+			stock_index[indices] = stock_ids.index(stock_id)
+			placements.append((indices, part_index, takes))
+			size += new_bars
+			count -= int(takes.sum())
+
+	if not size:
+		return None
+	return {
+		"stock_ids": stock_ids,
+		"part_ids": [f"{length}" for length in lengths],
+		"remaining": remaining[:size],
+		"capacity": capacity[:size],
+		"stock_index": stock_index[:size],
+		"placements": placements,
+	}
+
+
+def _open_bars(stock_ids, stock_data, available, length, saw_kerf, count):
+	"""The stock to open for `count` pieces, the pieces per bar and how many bars to open now."""
+	for stock_id in stock_ids:
+		if stock_data[stock_id]["length"] < length or available[stock_id] == 0:
+			continue
+		per_bar = int((stock_data[stock_id]["length"] + saw_kerf) // (length + saw_kerf))
+		new_bars = math.ceil(count / per_bar)
+		if available[stock_id] is not None:
+			new_bars = min(new_bars, available[stock_id])
+			available[stock_id] -= new_bars
+		return stock_id, per_bar, new_bars
+	return None
+
+
+def _bar_groups(bins):
+	"""The bars as (stock_id, yield, bars) groups of identical bars."""
+	bar_indices = np.concatenate([indices for indices, _, _ in bins["placements"]])
+	part_indices = np.concatenate([np.full(len(indices), part) for indices, part, _ in bins["placements"]])
+	counts = np.concatenate([takes for _, _, takes in bins["placements"]])
+	order = np.lexsort((part_indices, bar_indices))
+	bar_indices, part_indices, counts = bar_indices[order], part_indices[order], counts[order]
+	starts = np.flatnonzero(np.r_[True, bar_indices[1:] != bar_indices[:-1]])
+	ends = np.r_[starts[1:], len(bar_indices)]
+
+	stock_index = bins["stock_index"]
+	grouped = {}
+	for start, end in zip(starts.tolist(), ends.tolist(), strict=True):
+		bar = int(bar_indices[start])
+		key = (
+			int(stock_index[bar]),
+			tuple(zip(part_indices[start:end].tolist(), counts[start:end].tolist(), strict=True)),
+		)
+		grouped[key] = grouped.get(key, 0) + 1
+
+	stock_ids, part_ids = bins["stock_ids"], bins["part_ids"]
+	return [
+		(stock_ids[stock], {part_ids[part]: count for part, count in items}, bars)
+		for (stock, items), bars in grouped.items()
+	]
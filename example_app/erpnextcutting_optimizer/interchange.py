@@ -0,0 +1,257 @@
+#
+# 1D Cutting Optimizer - Binary Interchange Format
+#
+# Problems and solutions crossing a process boundary (the solver pool, batch
+# files) were pickled as lists of pattern dicts, which costs more than the
+# solve for plans with thousands of patterns. This format is one flat buffer:
+# a fixed header, a small JSON block (stock entries, kerf, the solution's
+# report keys) and int32 arrays for the part lengths, demands, the yield
+# matrix and usage counts. The arrays are numpy views straight into the
+# buffer, so a memory-mapped file or received bytes are read without copying.
+#
+# Part lengths are stored in fixed-point units of 10^-decimals mm, with the
+# fewest decimals that represent every length exactly, so the decoded parts
+# and part ids are exactly the ones that were encoded.
+#
+import json
+import re
+import struct
+
+import numpy as np
+
+from .fixed_point import LENGTH_DECIMALS, LENGTH_FIELDS
+from .optimizer_core import _build_pattern, _package_solution, compute_solution_stats
+
+MAGIC = b"C1DX"
+FORMAT_VERSION = 1
+KIND_PROBLEM = 1
+KIND_SOLUTION = 2
+# magic, version, kind, length decimals, parts, patterns, reserved, JSON bytes
+HEADER = struct.Struct("<4sHHIIIIQ")
+MAX_LENGTH_DECIMALS = 6
+ALIGNMENT = 8
+# Bit 0 of a part's flags: the length was an int, so its part id has no ".0".
+FLAG_INTEGER_LENGTH = 1
+SOLUTION_SCHEMA_KEYS = ("status", "total_stock_items_used", "total_parts_produced", "patterns", "stats")
+PATTERN_ID = re.compile(r"pat_(\d+)\Z")
+
+
+class InterchangeFormatError(ValueError):
+	"""The buffer is not in this format, or the data cannot be encoded in it."""
+
+
+def encode_problem(stock_data, parts_data, saw_kerf):
+	"""The problem as an interchange buffer (bytes)."""
+	return _encode(KIND_PROBLEM, stock_data, parts_data, saw_kerf)
+
+
+def encode_solution(solution, stock_data, parts_data, saw_kerf):
+	"""
+	The solution, together with its problem, as an interchange buffer.
+	Pattern layouts are stored as yields and laid out longest first again,
+	as every engine lays them out; `stats` are recomputed on decoding.
+	"""
+	return _encode(KIND_SOLUTION, stock_data, parts_data, saw_kerf, solution)
+
+
+def write_interchange(path, buffer):
+	with open(path, "wb") as f:
+		f.write(buffer)
+
+
+def open_interchange(path):
+	"""An InterchangeBuffer over a read-only memory map of the file at `path`."""
+	return InterchangeBuffer(np.memmap(path, dtype=np.uint8, mode="r"))
+
+
+class InterchangeBuffer:
+	"""
+	Read access to an interchange buffer (bytes, memoryview or memmap). The
+	array attributes are views into the buffer; `problem()` and `solution()`
+	convert to the dict schema of `run_1d_optimizer`.
+	"""
+
+	def __init__(self, buffer):
+		self.buffer = memoryview(buffer).cast("B")
+		if len(self.buffer) < HEADER.size:
+			raise InterchangeFormatError("Buffer is shorter than the interchange header")
+		magic, version, self.kind, self.length_decimals, parts, patterns, _, meta_bytes = HEADER.unpack_from(
+			self.buffer
+		)
+		if magic != MAGIC or version != FORMAT_VERSION:
+			raise InterchangeFormatError("Not a cutting optimizer interchange buffer of a supported version")
+
+		offset = HEADER.size
+		self.meta = json.loads(bytes(self.buffer[offset : offset + meta_bytes]))
+		offset = _aligned(offset + meta_bytes)
+		arrays = {}
+		for name, shape in _array_shapes(self.kind, parts, patterns):
+			count = int(np.prod(shape))
+			if offset + count * 4 > len(self.buffer):
+				raise InterchangeFormatError("Interchange buffer is truncated")
+			arrays[name] = np.frombuffer(self.buffer, dtype=np.int32, count=count, offset=offset).reshape(
+				shape
+			)
+			offset = _aligned(offset + count * 4)
+
+		self.part_lengths = arrays["part_lengths"]
+		self.part_demands = arrays["part_demands"]
+		self.part_flags = arrays["part_flags"]
+		self.pattern_numbers = arrays.get("pattern_numbers")
+		self.pattern_stock = arrays.get("pattern_stock")
+		self.usage = arrays.get("usage")
+		self.yield_matrix = arrays.get("yield_matrix")
+
+	def problem(self):
+		"""(stock_data, parts_data, saw_kerf) as they were encoded."""
+		stock_data = {stock_id: info for stock_id, info in self.meta["stock"]}
+		return stock_data, self._parts_data(), self.meta["saw_kerf"]
+
+	def solution(self):
+		"""The encoded solution in the dict schema, or None for a problem buffer."""
+		if self.kind != KIND_SOLUTION:
+			return None
+		stock_data, parts_data, saw_kerf = self.problem()
+		stock_ids = [stock_id for stock_id, _ in self.meta["stock"]]
+		lengths = [part["length"] for part in parts_data]
+		part_ids = [f"{length}" for length in lengths]
+		pattern_ids = self.meta.get("pattern_ids")
+
+		# The nonzero yields, pattern by pattern with the longest part first,
+		# as the engines lay pieces out.
+		rows, columns = np.nonzero(self.yield_matrix)
+		rank = np.argsort(np.argsort(-np.array(lengths, dtype=np.float64), kind="stable"))
+		order = np.lexsort((rank[columns], rows))
+		rows, columns = rows[order], columns[order]
+		counts = self.yield_matrix[rows, columns].tolist()
+		bounds = np.searchsorted(rows, np.arange(len(self.usage) + 1)).tolist()
+		columns = columns.tolist()
+
+		patterns = []
+		for i, (stock_index, usage) in enumerate(
+			zip(self.pattern_stock.tolist(), self.usage.tolist(), strict=True)
+		):
+			stock_id = stock_ids[stock_index]
+			pieces = range(bounds[i], bounds[i + 1])
+			pattern_yield = {part_ids[columns[k]]: counts[k] for k in pieces}
+			layout = [
+				{"part_id": part_ids[columns[k]], "length": lengths[columns[k]]}
+				for k in pieces
+				for _ in range(counts[k])
+			]
+			pattern_id = pattern_ids[i] if pattern_ids else f"pat_{self.pattern_numbers[i]}"
+			pattern = _build_pattern(
+				pattern_id, stock_id, stock_data[stock_id]["length"], saw_kerf, pattern_yield, layout
+			)
+			for key in LENGTH_FIELDS:
+				pattern[key] = round(pattern[key], LENGTH_DECIMALS)
+			pattern["usage_count"] = usage
+			patterns.append(pattern)
+
+		solution = _package_solution(patterns, stock_data, parts_data)
+		solution["status"] = self.meta["status"]
+		solution.update(self.meta["extras"])
+		if self.meta["stats"]:
+			solution["stats"] = compute_solution_stats(solution, stock_data, parts_data)
+		return solution
+
+	def _parts_data(self):
+		scale = 10**self.length_decimals
+		parts_data = []
+		for units, demand, flags in zip(
+			self.part_lengths.tolist(), self.part_demands.tolist(), self.part_flags.tolist(), strict=True
+		):
+			# Dividing the exact integer gives the float nearest the decimal, as parsing it would.
+			length = units // scale if flags & FLAG_INTEGER_LENGTH else units / scale
+			parts_data.append({"length": length, "demand": demand})
+		return parts_data
+
+
+def _encode(kind, stock_data, parts_data, saw_kerf, solution=None):
+	lengths = [part["length"] for part in parts_data]
+	decimals = _length_decimals(lengths)
+	arrays = [
+		np.array([round(length * 10**decimals) for length in lengths], dtype=np.int32),
+		np.array([part["demand"] for part in parts_data], dtype=np.int32),
+		np.array(
+			[FLAG_INTEGER_LENGTH if isinstance(length, int) else 0 for length in lengths], dtype=np.int32
+		),
+	]
+	meta = {"stock": [[stock_id, info] for stock_id, info in stock_data.items()], "saw_kerf": saw_kerf}
+
+	patterns = []
+	if kind == KIND_SOLUTION:
+		patterns = solution["patterns"]
+		stock_index = {stock_id: i for i, stock_id in enumerate(stock_data)}
+		# Duplicate lengths share the column of their first entry.
+		column = {}
+		for j, length in enumerate(lengths):
+			column.setdefault(f"{length}", j)
+		yield_matrix = np.zeros((len(patterns), len(lengths)), dtype=np.int32)
+		for i, pattern in enumerate(patterns):
+			for part_id, count in pattern["yield"].items():
+				yield_matrix[i, column[part_id]] = count
+
+		matches = [PATTERN_ID.match(str(pattern["pattern_id"])) for pattern in patterns]
+		if all(matches):
+			pattern_numbers = [int(match.group(1)) for match in matches]
+		else:
+			pattern_numbers = [0] * len(patterns)
+			meta["pattern_ids"] = [pattern["pattern_id"] for pattern in patterns]
+		arrays += [
+			np.array(pattern_numbers, dtype=np.int32),
+			np.array([stock_index[pattern["stock_id_used"]] for pattern in patterns], dtype=np.int32),
+			np.array([pattern["usage_count"] for pattern in patterns], dtype=np.int32),
+			yield_matrix,
+		]
+		meta["status"] = solution.get("status", "Success")
+		meta["stats"] = "stats" in solution
+		meta["extras"] = {key: value for key, value in solution.items() if key not in SOLUTION_SCHEMA_KEYS}
+
+	meta_json = json.dumps(meta, default=_json_default).encode()
+	header = HEADER.pack(
+		MAGIC, FORMAT_VERSION, kind, decimals, len(lengths), len(patterns), 0, len(meta_json)
+	)
+	chunks = [header, meta_json]
+	size = len(header) + len(meta_json)
+	for array in arrays:
+		chunks.append(bytes(_aligned(size) - size))
+		size = _aligned(size)
+		chunks.append(array.tobytes())
+		size += array.nbytes
+	return b"".join(chunks)
+
+
+def _length_decimals(lengths):
+	"""The fewest decimals in which every length is an exact int32."""
+	for decimals in range(MAX_LENGTH_DECIMALS + 1):
+		scale = 10**decimals
+		units = [round(length * scale) for length in lengths]
+		if all(unit / scale == length for unit, length in zip(units, lengths, strict=True)):
+			if max(units, default=0) > np.iinfo(np.int32).max:
+				break
+			return decimals
+	raise InterchangeFormatError("Part lengths cannot be stored as int32 fixed-point values")
+
+
+def _array_shapes(kind, parts, patterns):
+	shapes = [("part_lengths", (parts,)), ("part_demands", (parts,)), ("part_flags", (parts,))]
+	if kind == KIND_SOLUTION:
+		shapes += [
+			("pattern_numbers", (patterns,)),
+			("pattern_stock", (patterns,)),
+			("usage", (patterns,)),
+			("yield_matrix", (patterns, parts)),
+		]
+	return shapes
+
+
+def _aligned(offset):
+	return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _json_default(value):
+	# Engine reports may hold numpy scalars.
+	if isinstance(value, np.generic):
+		return value.item()
+	raise TypeError(f"{type(value).__name__} is not JSON serializable")
@@ -0,0 +1,520 @@
+#
+# 1D Cutting Optimizer - Load Test Harness
+#
+# Replays synthetic Sales Order configs through the real
+# `api.run_full_optimization_job`, with an in-process stand-in for the Frappe
+# APIs the job touches: in-memory documents, a file sink for the PDFs and a
+# recorded realtime stream. Reports throughput, latency percentiles, peak
+# memory and the time spent per stage.
+#
+# Jobs run as threads of one process, like concurrent jobs sharing a worker's
+# pattern cache; the solvers run in native code and release the GIL.
+#
+#   python -m example_app.erpnextcutting_optimizer.load_test --jobs 40 --concurrency 4
+#
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+STOCK_LENGTHS_MM = (6000, 6500, 7000)
+# The api functions timed as job stages.
+STAGES = {
+	"optimize": ("_run_optimizer",),
+	"pdf": ("_generate_and_attach_profile_pdf",),
+	"pattern_library": ("_load_pattern_hints", "_update_pattern_library"),
+	"remnants": ("_load_remnant_index", "_update_remnant_inventory"),
+	"sales_order_update": ("_update_sales_order_items",),
+}
+
+
+class FakeDoc:
+	"""
+	A document with attribute and item access, stored in a FakeFrappe. Not a
+	dict, so child tables such as `items` do not clash with dict methods.
+	"""
+
+	def __init__(self, site, fields=None):
+		object.__setattr__(self, "_site", site)
+		self.__dict__.update(fields or {})
+
+	def __getitem__(self, key):
+		return self.__dict__[key]
+
+	def __setitem__(self, key, value):
+		self.__dict__[key] = value
+
+	def get(self, key, default=None):
+		return self.__dict__.get(key, default)
+
+	def setdefault(self, key, default=None):
+		return self.__dict__.setdefault(key, default)
+
+	def update(self, values):
+		self.__dict__.update(values)
+
+	def append(self, table, row):
+		row = FakeDoc(self._site, row)
+		self.setdefault(table, []).append(row)
+		return row
+
+	def insert(self, ignore_permissions=False):
+		self._site.insert(self)
+		return self
+
+	def save(self, ignore_permissions=False):
+		self._site.save(self)
+		return self
+
+
+class FakeCache:
+	"""The Redis calls the job makes, on dicts and lists."""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._lists, self._hashes = {}, {}
+
+	def lpush(self, key, value):
+		with self._lock:
+			self._lists.setdefault(key, []).insert(0, value)
+
+	def ltrim(self, key, start, stop):
+		with self._lock:
+			self._lists[key] = self._lists.get(key, [])[start : stop + 1]
+
+	def lrange(self, key, start, stop):
+		with self._lock:
+			values = self._lists.get(key, [])
+			return values[start:] if stop == -1 else values[start : stop + 1]
+
+	def hget(self, name, key):
+		return self._hashes.get(name, {}).get(key)
+
+	def hset(self, name, key, value):
+		with self._lock:
+			self._hashes.setdefault(name, {})[key] = value
+
+	def hdel(self, name, key):
+		with self._lock:
+			self._hashes.get(name, {}).pop(key, None)
+
+
+class DoesNotExistError(Exception):
+	"""Raised for a missing document, like frappe's."""
+
+
+class FakeFrappe:
+	"""
+	An in-memory stand-in for the parts of the `frappe` module used by the
+	optimizer job. `install()` registers it in `sys.modules`, so it has to run
+	before `api` is imported.
+	"""
+
+	def __init__(self, conf=None):
+		self._lock = threading.Lock()
+		self._names = itertools.count(1)
+		self.docs = {}
+		self.files = []
+		self.realtime = []
+		self.errors = []
+		self.running_jobs = 0
+		self.conf = dict(conf or {})
+		self.cache = FakeCache()
+		self.local = threading.local()
+		# Site files such as incumbent checkpoints go to a throwaway directory.
+		self.site_path = tempfile.mkdtemp(prefix="optimizer-load-test-")
+
+	def install(self):
+		frappe = types.ModuleType("frappe")
+		frappe.conf = self.conf
+		frappe.local = self.local
+		frappe.session = types.SimpleNamespace(user="Administrator")
+		frappe.db = types.SimpleNamespace(
+			get_value=self.get_value, set_value=self.set_value, commit=lambda: None
+		)
+		frappe._ = lambda text: text
+		frappe.whitelist = lambda *args, **kwargs: args[0] if args and callable(args[0]) else (lambda fn: fn)
+		frappe.cache = lambda: self.cache
+		frappe.get_doc = self.get_doc
+		frappe.DoesNotExistError = DoesNotExistError
+		frappe.new_doc = lambda doctype: FakeDoc(self, {"doctype": doctype})
+		frappe.get_site_path = lambda *parts: os.path.join(self.site_path, *parts)
+		frappe.get_all = self.get_all
+		frappe.delete_doc = self.delete_doc
+		frappe.publish_realtime = self.publish_realtime
+		frappe.log_error = self.log_error
+		frappe.get_traceback = self.get_traceback
+		frappe.has_permission = lambda *args, **kwargs: True
+		frappe.logger = lambda *args, **kwargs: _NullLogger()
+		frappe.enqueue = lambda *args, **kwargs: types.SimpleNamespace(id="load-test")
+
+		utils = types.ModuleType("frappe.utils")
+		utils.now_datetime = datetime.now
+		pdf = types.ModuleType("frappe.utils.pdf")
+		pdf.get_pdf = lambda html, *args, **kwargs: b""
+		background_jobs = types.ModuleType("frappe.utils.background_jobs")
+		background_jobs.get_queues_timeout = lambda: {"default": 300, "short": 300, "long": 1500}
+		background_jobs.get_queue = self.get_queue
+		utils.pdf, utils.background_jobs, frappe.utils = pdf, background_jobs, utils
+
+		sys.modules.update(
+			{
+				"frappe": frappe,
+				"frappe.utils": utils,
+				"frappe.utils.pdf": pdf,
+				"frappe.utils.background_jobs": background_jobs,
+			}
+		)
+		return frappe
+
+	# --- Documents --------------------------------------------------------
+
+	def insert(self, doc):
+		if doc.get("doctype") == "File":
+			# The file sink keeps sizes only; PDFs are not held in memory.
+			with self._lock:
+				self.files.append(
+					(doc.get("file_name"), doc.get("attached_to_name"), len(doc.get("content") or b""))
+				)
+			return
+		with self._lock:
+			doc.setdefault("name", f"{doc['doctype']}-{next(self._names):08d}")
+			self.docs.setdefault(doc["doctype"], {})[doc["name"]] = doc
+
+	def save(self, doc):
+		with self._lock:
+			self.docs.setdefault(doc["doctype"], {})[doc["name"]] = doc
+
+	def get_doc(self, doctype, name=None):
+		if isinstance(doctype, dict):
+			return FakeDoc(self, doctype)
+		with self._lock:
+			if name not in self.docs.get(doctype, {}):
+				raise DoesNotExistError(f"{doctype} {name} not found")
+			return self.docs[doctype][name]
+
+	def delete_doc(self, doctype, name, **kwargs):
+		with self._lock:
+			self.docs.get(doctype, {}).pop(name, None)
+
+	def get_all(
+		self,
+		doctype,
+		filters=None,
+		fields=None,
+		order_by=None,
+		limit_page_length=None,
+		pluck=None,
+		as_list=False,
+	):
+		with self._lock:
+			rows = [doc for doc in self.docs.get(doctype, {}).values() if _matches(doc, filters)]
+		if order_by:
+			field, _, direction = order_by.partition(" ")
+			rows.sort(key=lambda doc: doc.get(field) or 0, reverse=direction.strip().lower() == "desc")
+		if limit_page_length:
+			rows = rows[:limit_page_length]
+		if pluck:
+			return [doc.get(pluck) for doc in rows]
+		fields = fields or ["name"]
+		if as_list:
+			return [tuple(doc.get(field) for field in fields) for doc in rows]
+		return [FakeDoc(self, {field: doc.get(field) for field in fields}) for doc in rows]
+
+	def get_value(self, doctype, filters, fieldname="name", for_update=False):
+		# Row locks are not modelled; the fake serializes each call instead.
+		if isinstance(filters, str):
+			with self._lock:
+				doc = self.docs.get(doctype, {}).get(filters)
+		else:
+			matches = self.get_all(doctype, filters=filters, fields=list(self._field_list(fieldname)))
+			doc = matches[0] if matches else None
+		if doc is None:
+			return None
+		if isinstance(fieldname, (list, tuple)):
+			return tuple(doc.get(field) for field in fieldname)
+		return doc.get(fieldname)
+
+	def set_value(self, doctype, name, values, value=None):
+		if not isinstance(values, dict):
+			values = {values: value}
+		with self._lock:
+			self.docs[doctype][name].update(values)
+
+	@staticmethod
+	def _field_list(fieldname):
+		return fieldname if isinstance(fieldname, (list, tuple)) else [fieldname]
+
+	# --- Jobs, realtime and errors ----------------------------------------
+
+	def get_queue(self, name):
+		registry = types.SimpleNamespace(count=self.running_jobs)
+		return types.SimpleNamespace(count=0, started_job_registry=registry)
+
+	def publish_realtime(self, event, message=None, **kwargs):
+		with self._lock:
+			self.realtime.append((time.perf_counter(), event, message))
+
+	def log_error(self, message=None, title=None, **kwargs):
+		with self._lock:
+			self.errors.append((title, message))
+
+	def get_traceback(self):
+		import traceback
+
+		return traceback.format_exc()
+
+
+class _NullLogger:
+	def info(self, *args, **kwargs):
+		pass
+
+
+def _matches(doc, filters):
+	for field, condition in (filters or {}).items():
+		value = doc.get(field)
+		if isinstance(condition, (list, tuple)):
+			operator, operand = condition
+			if operator == "in" and value not in operand:
+				return False
+		elif value != condition:
+			return False
+	return True
+
+
+def synthetic_config(rng, profiles=3, part_types=6, max_demand=20, families=10):
+	"""
+	A random optimizer config. Item codes come from a pool of `families`
+	profiles, so repeated jobs hit the pattern cache and library as real
+	recurring work does.
+	"""
+	config = {
+		"version": "2.0",
+		"profiles": {},
+		"settings": {"saw_kerf": 3.0, "allow_overproduction": 0, "engine": "auto"},
+	}
+	for family in rng.sample(range(families), min(profiles, families)):
+		stock_length = rng.choice(STOCK_LENGTHS_MM)
+		lengths = {round(rng.uniform(200, 0.45 * stock_length) * 2) / 2 for _ in range(part_types)}
+		config["profiles"][f"LT-PROFILE-{family:03d}"] = {
+			"item_code": f"LT-PROFILE-{family:03d}",
+			"stock_length_mm": stock_length,
+			"cost_per_piece": stock_length / 100,
+			"weight_per_piece": stock_length / 1000 * 1.5,
+			"parts": [{"length": length, "demand": rng.randint(1, max_demand)} for length in sorted(lengths)],
+			"solution": {},
+		}
+	return config
+
+
+def percentile(values, q):
+	if not values:
+		return None
+	ordered = sorted(values)
+	return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def run_load_test(
+	jobs=20,
+	concurrency=4,
+	seed=0,
+	profiles=3,
+	part_types=6,
+	max_demand=20,
+	settings=None,
+	conf=None,
+	clear_pattern_cache=False,
+	trace_memory=False,
+):
+	"""Runs `jobs` synthetic jobs, `concurrency` at a time, and returns the report dict."""
+	site = FakeFrappe(conf)
+	site.install()
+	from . import api
+	from .pattern_cache import get_pattern_cache
+
+	records = threading.local()
+	_time_stages(api, records)
+
+	rng = random.Random(seed)
+	configs = []
+	for i in range(jobs):
+		config = synthetic_config(rng, profiles, part_types, max_demand)
+		config["settings"].update(settings or {})
+		configs.append(config)
+		site.insert(
+			FakeDoc(
+				site,
+				{
+					"doctype": "Sales Order",
+					"name": f"SO-LT-{i:05d}",
+					"items": [
+						FakeDoc(site, {"item_code": item_code, "qty": 0}) for item_code in config["profiles"]
+					],
+				},
+			)
+		)
+
+	if clear_pattern_cache:
+		get_pattern_cache().clear()
+	if trace_memory:
+		tracemalloc.start()
+
+	running_lock = threading.Lock()
+
+	def run_job(i):
+		job_id = f"load-test-{i:05d}"
+		site.local.job = types.SimpleNamespace(name=job_id)
+		records.current = {"job_id": job_id, "stages": {}}
+		with running_lock:
+			site.running_jobs += 1
+		started = time.perf_counter()
+		try:
+			api.run_full_optimization_job(
+				f"SO-LT-{i:05d}", configs[i], "Administrator", enqueued_at=time.time()
+			)
+		finally:
+			with running_lock:
+				site.running_jobs -= 1
+		records.current["seconds"] = time.perf_counter() - started
+		return records.current
+
+	started = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load-test") as executor:
+		results = list(executor.map(run_job, range(jobs)))
+	wall_seconds = time.perf_counter() - started
+
+	traced_peak = None
+	if trace_memory:
+		traced_peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+
+	statuses = {}
+	progress_times = {}
+	for at, event, message in site.realtime:
+		if event == "update_job_status" and message.get("status") in ("complete", "failed"):
+			statuses[message["status"]] = statuses.get(message["status"], 0) + 1
+		elif event == "update_job_status":
+			progress_times.setdefault(message["job_id"], []).append(at)
+
+	latencies = [result["seconds"] for result in results]
+	stage_totals = {}
+	for result in results:
+		for stage, seconds in result["stages"].items():
+			stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+	job_seconds = sum(latencies)
+
+	return {
+		"jobs": jobs,
+		"concurrency": concurrency,
+		"wall_seconds": round(wall_seconds, 3),
+		"jobs_per_minute": round(jobs / wall_seconds * 60, 2) if wall_seconds > 0 else None,
+		"statuses": statuses,
+		"errors": len(site.errors),
+		# Progress events per job, and the most one job sent within any second.
+		"progress_updates": {
+			"per_job": round(sum(map(len, progress_times.values())) / jobs, 1),
+			"max_per_second": max((_max_per_second(times) for times in progress_times.values()), default=0),
+		},
+		"latency_seconds": {
+			name: round(percentile(latencies, q), 3)
+			for name, q in (("p50", 50), ("p90", 90), ("p95", 95), ("p99", 99), ("max", 100))
+		},
+		"stages": {
+			stage: {
+				"seconds": round(total, 3),
+				"per_job": round(total / jobs, 4),
+				"share": round(total / job_seconds, 3) if job_seconds else None,
+			}
+			for stage, total in sorted(stage_totals.items(), key=lambda item: -item[1])
+		},
+		# ru_maxrss is in KiB on Linux.
+		"peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+		"peak_traced_mb": round(traced_peak / 1024 / 1024, 1) if traced_peak is not None else None,
+		"pdf_files": len(site.files),
+		"pdf_bytes": sum(size for _, _, size in site.files),
+		"pattern_cache": dict(get_pattern_cache().stats),
+	}
+
+
+def _max_per_second(times):
+	most, first = 0, 0
+	for last, at in enumerate(times):
+		while at - times[first] >= 1.0:
+			first += 1
+		most = max(most, last - first + 1)
+	return most
+
+
+def _time_stages(api, records):
+	"""Wraps the api functions of each stage to add their time to the current job's record."""
+	for stage, names in STAGES.items():
+		for name in names:
+			setattr(api, name, _timed(getattr(api, name), stage, records))
+
+
+def _timed(fn, stage, records):
+	def wrapper(*args, **kwargs):
+		started = time.perf_counter()
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			stages = records.current["stages"]
+			stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - started
+
+	return wrapper
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+		description="Replay synthetic optimizer jobs and report throughput and latency."
+	)
+	parser.add_argument("--jobs", type=int, default=20)
+	parser.add_argument("--concurrency", type=int, default=4)
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--profiles", type=int, default=3, help="profiles per Sales Order")
+	parser.add_argument("--part-types", type=int, default=6, help="distinct part lengths per profile")
+	parser.add_argument("--max-demand", type=int, default=20)
+	parser.add_argument("--engine", default="auto")
+	parser.add_argument("--no-remnants", action="store_true")
+	parser.add_argument("--no-pattern-library", action="store_true")
+	parser.add_argument("--cold-cache", action="store_true", help="start with an empty pattern cache")
+	parser.add_argument(
+		"--trace-memory", action="store_true", help="also report the tracemalloc peak (slower)"
+	)
+	parser.add_argument(
+		"--solver-pool", metavar="SOCKET", help="solve and render in the warm solver pool on SOCKET"
+	)
+	args = parser.parse_args(argv)
+
+	report = run_load_test(
+		jobs=args.jobs,
+		concurrency=args.concurrency,
+		seed=args.seed,
+		profiles=args.profiles,
+		part_types=args.part_types,
+		max_demand=args.max_demand,
+		settings={
+			"engine": args.engine,
+			"use_remnants": not args.no_remnants,
+			"use_pattern_library": not args.no_pattern_library,
+		},
+		conf={"cutting_optimizer_solver_pool": {"socket": args.solver_pool}} if args.solver_pool else None,
+		clear_pattern_cache=args.cold_cache,
+		trace_memory=args.trace_memory,
+	)
+	print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+	main()
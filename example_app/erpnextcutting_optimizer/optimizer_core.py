@@ -1,37 +1,420 @@
 #
 # 1D Cutting Optimizer - Core Logic
 #
+import heapq
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
 from ortools.sat.python import cp_model
 
-def run_1d_optimizer(stock_data, parts_data, saw_kerf, allow_overproduction=False):
+from .engine_selection import (
+    ENGINES,
+    bars_lower_bound,
+    demand_caps,
+    estimate_pattern_count,
+    select_engine,
+    total_demand_by_length,
+)
+from .pattern_cache import get_pattern_cache, make_pattern_set_key
+from .progress import progress_enabled, report_progress, reporting_progress
+
+logger = logging.getLogger(__name__)
+
+# Per stock length. Hitting the count or memory cap keeps the lowest-waste
+# patterns seen; hitting the time cap also stops the enumeration itself.
+DEFAULT_GENERATION_LIMITS = {
+    'max_patterns': 1_000_000,
+    'max_memory_mb': 512,
+    'max_seconds': 120,
+}
+SOLVER_TIME_LIMIT_SECONDS = 30.0
+# Time budget of the optional second phase that minimizes saw setups.
+SETUP_TIME_LIMIT_SECONDS = 10.0
+# What a fresh bar weighs in the objective; "auto" is cost when every fresh
+# stock has one, otherwise material length.
+OBJECTIVES = ("auto", "cost", "material", "bars")
+# Costs become integer objective weights in these units (cents).
+COST_SCALE = 100
+PATTERN_BASE_BYTES = 900
+PATTERN_BYTES_PER_PART = 100
+# Progress events while generating patterns and building the model, every so many patterns.
+PATTERN_PROGRESS_INTERVAL = 4096
+MODEL_PROGRESS_INTERVAL = 10_000
+
+# CP-SAT worker threads per solve; None lets CP-SAT use every core.
+_solver_num_workers = None
+# A smaller budget for the solves of one of several parallel subproblems (see `solver_thread_share`).
+_solver_thread_share = ContextVar("cutting_optimizer_solver_thread_share", default=None)
+
+def configure_solver_threads(num_workers=None):
+    """Sets the CP-SAT thread budget of this worker process (None: all cores)."""
+    global _solver_num_workers
+    _solver_num_workers = num_workers
+
+@contextmanager
+def solver_thread_share(parallel_solves):
+    """
+    Within this block, each CP-SAT solve gets its share of the process budget
+    when `parallel_solves` of them run at once, so they do not oversubscribe it.
+    """
+    budget = _solver_thread_share.get() or _solver_num_workers or os.cpu_count() or 1
+    token = _solver_thread_share.set(max(1, budget // max(1, parallel_solves)))
+    try:
+        yield
+    finally:
+        _solver_thread_share.reset(token)
+
+def with_solver_threads(fn):
+    """Wraps `fn` to keep the current thread share when it runs in another thread."""
+    share = _solver_thread_share.get()
+
+    def run(*args, **kwargs):
+        token = _solver_thread_share.set(share)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _solver_thread_share.reset(token)
+    return run
+
+def _configure_workers(solver):
+    num_workers = _solver_thread_share.get() or _solver_num_workers
+    if num_workers:
+        solver.parameters.num_workers = num_workers
+
+def run_1d_optimizer(stock_data, parts_data, saw_kerf, allow_overproduction=False, engine="auto", generation_limits=None, length_resolution=None, objective="auto", pattern_hints=None, on_incumbent=None, on_progress=None, minimize_setups=False):
     """
     Main function to run a single 1D optimization problem.
     This is the computational core.
+
+    `engine` is one of `ENGINES`, or "auto" to pick one from the estimated
+    pattern count of the instance. `generation_limits` overrides
+    DEFAULT_GENERATION_LIMITS for the enumerating engines. `objective` is one
+    of OBJECTIVES and only matters with several stock lengths.
+
+    `pattern_hints` are known good patterns, e.g. from the item's pattern
+    library: dicts of `stock_length`, `pieces` ([length, count] pairs) and
+    `frequency`. They are always offered to the solver and seed its search.
+    Only column generation also generates fewer patterns with them (its
+    master LP starts from the hints); the enumerating engines still enumerate
+    the full set and merely add the hints it lacks.
+
+    `on_incumbent(solution)` is called with every improving CP-SAT solution,
+    in original lengths, from a solver thread; it lets callers persist the
+    best plan of a solve that may not finish.
+
+    With `minimize_setups`, the CP-SAT solve of the enumerating engines
+    (enumeration, maximal, column generation, portfolio) keeps the stock used
+    it found and then minimizes the number of distinct patterns, i.e. saw
+    setups, for up to SETUP_TIME_LIMIT_SECONDS. The other engines return
+    their plan as it is.
+
+    `on_progress(stage, done, total)` receives the progress of pattern
+    generation, model construction and the solve (see progress.py), from
+    whichever thread does the work.
+
+    Lengths are solved as integers of `length_resolution` mm (see
+    fixed_point.py); the solution is returned in the original lengths.
+    """
+    from .fixed_point import DEFAULT_LENGTH_RESOLUTION, FixedPointProblem
+
+    problem = FixedPointProblem(stock_data, parts_data, saw_kerf, length_resolution or DEFAULT_LENGTH_RESOLUTION)
+    objective = _assign_objective_weights(problem.stock_data, objective)
+    hint_patterns = _hint_patterns(
+        problem.scale_pattern_hints(pattern_hints), problem.stock_data, problem.parts_data, problem.saw_kerf
+    )
+    if on_incumbent:
+        report_incumbent = on_incumbent
+
+        def on_incumbent(incumbent):
+            report_incumbent(problem.to_original(incumbent))
+    with reporting_progress(on_progress):
+        solution = _run_engine(
+            problem.stock_data, problem.parts_data, problem.saw_kerf, allow_overproduction, engine, generation_limits,
+            hint_patterns, on_incumbent, SETUP_TIME_LIMIT_SECONDS if minimize_setups else None
+        )
+    solution = problem.to_original(solution)
+    if solution:
+        solution['objective'] = objective
+        solution['stats'] = compute_solution_stats(solution, stock_data, parts_data)
+    return solution
+
+def compute_solution_stats(solution, stock_data, parts_data):
+    """
+    Computes every total of a solution in one vectorized pass over its yield
+    matrix (patterns x parts) and usage vector. Stock entries may carry a
+    per-bar `cost` and `weight`; weights are spread evenly over the length.
+    Per-part values are keyed by part id. Each distinct pattern used is one
+    saw setup.
+    """
+    patterns = solution.get('patterns', [])
+    lengths = list(total_demand_by_length(parts_data))
+    part_ids = [f"{length}" for length in lengths]
+    part_lengths = np.array(lengths, dtype=np.float64)
+    column = {part_id: j for j, part_id in enumerate(part_ids)}
+
+    yield_matrix = np.zeros((len(patterns), len(part_ids)), dtype=np.int64)
+    usage = np.zeros(len(patterns), dtype=np.int64)
+    pattern_values = np.zeros((len(patterns), 4))
+    stock_values = np.zeros((len(patterns), 3))
+    for i, pattern in enumerate(patterns):
+        for part_id, count in pattern['yield'].items():
+            yield_matrix[i, column[part_id]] = count
+        usage[i] = pattern.get('usage_count', 1)
+        pattern_values[i] = (
+            pattern.get('total_kerf_length_in_pattern', 0), pattern.get('waste_length_in_pattern', 0),
+            pattern.get('num_cuts_in_pattern', 0), pattern.get('total_parts_length_in_pattern', 0),
+        )
+        stock_info = stock_data.get(pattern['stock_id_used'], {})
+        stock_values[i] = (stock_info.get('length', 0), stock_info.get('weight', 0), stock_info.get('cost', 0))
+
+    stock_length, stock_weight, stock_cost = stock_values.T
+    weight_per_mm = np.divide(stock_weight, stock_length, out=np.zeros(len(patterns)), where=stock_length > 0)
+
+    kerf, waste, cuts, parts_length = usage @ pattern_values
+    produced = yield_matrix.T @ usage
+    weight_per_part = (yield_matrix.T @ (usage * weight_per_mm)) * part_lengths
+    stock_used_mm = float(usage @ stock_length)
+    stock_used_kg = float(usage @ stock_weight)
+    parts_kg = float(weight_per_part.sum())
+    kerf_kg = float(usage @ (pattern_values[:, 0] * weight_per_mm))
+
+    return {
+        'total_length_all_parts_produced_mm': float(parts_length),
+        'total_length_all_stock_used_mm': stock_used_mm,
+        'total_kerf_length_mm': float(kerf),
+        'total_waste_length_mm': float(waste),
+        'total_number_of_cuts': int(cuts),
+        'total_weight_all_stock_used_kg': stock_used_kg,
+        'total_weight_all_parts_produced_kg': parts_kg,
+        'total_weight_kerf_kg': kerf_kg,
+        'total_weight_waste_kg': stock_used_kg - parts_kg - kerf_kg,
+        'total_stock_cost': float(usage @ stock_cost),
+        'yield_percentage': (float(parts_length) / stock_used_mm * 100) if stock_used_mm > 0 else 0,
+        'parts_produced': {part_id: int(count) for part_id, count in zip(part_ids, produced, strict=True)},
+        'weight_produced_per_part_kg': {part_id: float(kg) for part_id, kg in zip(part_ids, weight_per_part, strict=True)},
+        'pattern_usage': {pattern['pattern_id']: int(count) for pattern, count in zip(patterns, usage, strict=True)},
+        'number_of_setups': _count_setups(patterns, usage),
+    }
+
+def _run_engine(stock_data, parts_data, saw_kerf, allow_overproduction, engine, generation_limits, hint_patterns=None, on_incumbent=None, setup_time_limit=None):
+    selection = None
+    if engine == "auto":
+        selection = select_engine(stock_data, parts_data, saw_kerf)
+        engine = selection['engine']
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown optimizer engine: {engine}")
+
+    generation_report = {}
+    if engine == "column_generation":
+        from .column_generation import run_column_generation
+        solution = run_column_generation(
+            stock_data, parts_data, saw_kerf, allow_overproduction, hint_patterns, on_incumbent, setup_time_limit
+        )
+    elif engine == "decomposition":
+        from .decomposition import run_decomposition
+        solution = run_decomposition(stock_data, parts_data, saw_kerf, allow_overproduction, generation_limits)
+    elif engine == "high_volume":
+        from .high_volume import run_high_volume
+        solution = run_high_volume(stock_data, parts_data, saw_kerf, allow_overproduction)
+    elif engine == "heuristic":
+        from .heuristics import run_first_fit_decreasing
+        solution = run_first_fit_decreasing(stock_data, parts_data, saw_kerf, allow_overproduction)
+    elif engine == "maximal":
+        solution = _run_maximal_patterns(
+            stock_data, parts_data, saw_kerf, allow_overproduction, generation_limits, generation_report,
+            hint_patterns, on_incumbent, setup_time_limit
+        )
+    elif engine == "portfolio":
+        from .portfolio import run_portfolio
+        solution = run_portfolio(
+            stock_data, parts_data, saw_kerf, allow_overproduction, generation_limits, generation_report,
+            hint_patterns=hint_patterns, on_incumbent=on_incumbent, setup_time_limit=setup_time_limit
+        )
+    else:
+        solution = _run_enumeration(
+            stock_data, parts_data, saw_kerf, allow_overproduction, generation_limits, generation_report,
+            hint_patterns, on_incumbent, setup_time_limit
+        )
+
+    if solution:
+        solution['engine'] = engine
+        solution['proven_optimal'] = bool(solution.get('proven_optimal')) or _meets_bars_lower_bound(
+            solution, stock_data, parts_data, saw_kerf
+        )
+        if selection:
+            solution['engine_selection'] = selection
+        if generation_report:
+            solution['generation'] = generation_report
+        if hint_patterns:
+            hinted = {_pattern_key(pattern) for pattern in hint_patterns}
+            solution['pattern_hints'] = {
+                'offered': len(hint_patterns),
+                'used': sum(1 for pattern in solution['patterns'] if _pattern_key(pattern) in hinted),
+            }
+    return solution
+
+def _run_enumeration(stock_data, parts_data, saw_kerf, allow_overproduction, generation_limits=None, generation_report=None, hint_patterns=None, on_incumbent=None, setup_time_limit=None):
+    generation_report = {} if generation_report is None else generation_report
+    all_patterns = _generate_all_patterns(
+        stock_data, parts_data, saw_kerf, limits=generation_limits, report=generation_report,
+        extra_patterns=hint_patterns
+    )
+    if not all_patterns:
+        return None
+    if not _needs_cover_and_trim(allow_overproduction, generation_report):
+        return _solve_cutting_problem(
+            all_patterns, stock_data, parts_data, allow_overproduction, hint_patterns=hint_patterns,
+            on_incumbent=on_incumbent, setup_time_limit=setup_time_limit,
+            pattern_set_complete=not _generation_capped(generation_report)
+        )
+
+    # Only a capped pattern set is covered and trimmed, so no optimality is proven here.
+    solution = _solve_cutting_problem(
+        all_patterns, stock_data, parts_data, allow_overproduction=True, hint_patterns=hint_patterns,
+        on_incumbent=on_incumbent
+    )
+    if solution:
+        solution = _trim_and_minimize_setups(all_patterns, solution, stock_data, parts_data, saw_kerf, setup_time_limit)
+    return solution
+
+def _needs_cover_and_trim(allow_overproduction, generation_report):
+    """
+    Exact demand over a truncated pattern set is hard for the solvers to
+    satisfy; such runs cover the demand instead and trim the surplus.
+    """
+    return not allow_overproduction and _generation_capped(generation_report)
+
+def _generation_capped(generation_report):
+    """Whether a generation cap truncated the pattern set of any stock length."""
+    return any(r['cap_hit'] for r in generation_report.values())
+
+def _meets_bars_lower_bound(solution, stock_data, parts_data, saw_kerf):
     """
-    all_patterns = _generate_all_patterns(stock_data, parts_data, saw_kerf)
+    Whether the solution uses no more bars than the material bound, which
+    proves it optimal while every bar weighs the same in the objective.
+    """
+    if len(set(_stock_objective_weights(stock_data).values())) != 1:
+        return False
+    return sum(solution['total_stock_items_used'].values()) <= bars_lower_bound(stock_data, parts_data, saw_kerf)
+
+def _run_maximal_patterns(stock_data, parts_data, saw_kerf, allow_overproduction, generation_limits=None, generation_report=None, hint_patterns=None, on_incumbent=None, setup_time_limit=None):
+    """
+    Solves over maximal patterns only. Every pattern extends to a maximal one,
+    so covering the demand with them needs no more bars than the full set;
+    surplus pieces are then trimmed when overproduction is not allowed.
+    Trimming keeps the stock used, so an optimal cover stays optimal.
+    """
+    generation_report = {} if generation_report is None else generation_report
+    all_patterns = _generate_all_patterns(
+        stock_data, parts_data, saw_kerf, maximal_only=True, limits=generation_limits, report=generation_report,
+        extra_patterns=hint_patterns
+    )
     if not all_patterns:
         return None
 
-    solution = _solve_cutting_problem(all_patterns, stock_data, parts_data, allow_overproduction)
+    solution = _solve_cutting_problem(
+        all_patterns, stock_data, parts_data, allow_overproduction=True, hint_patterns=hint_patterns,
+        on_incumbent=on_incumbent, setup_time_limit=setup_time_limit if allow_overproduction else None,
+        pattern_set_complete=not _generation_capped(generation_report)
+    )
+    if solution and not allow_overproduction:
+        proven_optimal = solution['proven_optimal']
+        solution = _trim_and_minimize_setups(all_patterns, solution, stock_data, parts_data, saw_kerf, setup_time_limit)
+        solution['proven_optimal'] = proven_optimal
     return solution
 
-def _solve_cutting_problem(all_patterns, stock_data, parts_data, allow_overproduction):
+def _solve_cutting_problem(all_patterns, stock_data, parts_data, allow_overproduction, solver=None, time_limit=SOLVER_TIME_LIMIT_SECONDS, hint_patterns=None, on_incumbent=None, setup_time_limit=None, pattern_set_complete=False, cancelled=None):
+    """
+    Solves the pattern model with CP-SAT. A caller that needs to stop the
+    search from another thread passes its own `solver` and calls StopSearch();
+    as that only reaches a running solve, a set `cancelled` event skips it.
+    `hint_patterns` seed the search with a greedy plan over those patterns.
+    `on_incumbent` receives every improving solution as it is found.
+    With `setup_time_limit`, a second phase then minimizes the number of
+    distinct patterns at the stock used (see `_minimize_setups`).
+    CP-SAT proves optimality over the patterns it is given only, so the
+    solution is `proven_optimal` only with `pattern_set_complete`, i.e. when
+    `all_patterns` holds every pattern (or every maximal one when covering).
+    """
+    model, patterns, num_times_pattern_used, total_stock_used = _cutting_model(
+        all_patterns, stock_data, parts_data, allow_overproduction, hint_patterns
+    )
+    model.Minimize(total_stock_used)
+
+    solver = solver or cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = time_limit
+    _configure_workers(solver)
+    if cancelled is not None and cancelled.is_set():
+        return None
+    callback = _IncumbentCallback(patterns, num_times_pattern_used, stock_data, parts_data, on_incumbent) if on_incumbent else None
+    report_progress('solve', 0)
+    status = solver.Solve(model, callback)
+
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        usage = [solver.Value(usage_var) for usage_var in num_times_pattern_used]
+        setup_report = None
+        if setup_time_limit:
+            usage, setup_report = _minimize_setups(
+                model, patterns, num_times_pattern_used, total_stock_used, usage, round(solver.ObjectiveValue()),
+                solver, setup_time_limit, callback
+            )
+
+        # --- Package up the results ---
+        used_patterns = []
+        for pattern, usage_count in zip(patterns, usage, strict=True):
+            if usage_count > 0:
+                # Add usage count to the pattern dict for later reference
+                pattern_with_usage = pattern.copy()
+                pattern_with_usage['usage_count'] = usage_count
+                used_patterns.append(pattern_with_usage)
+
+        solution = _package_solution(used_patterns, stock_data, parts_data)
+        solution['proven_optimal'] = pattern_set_complete and status == cp_model.OPTIMAL
+        if setup_report:
+            solution['setup_minimization'] = setup_report
+        return solution
+    return None
+
+def _cutting_model(all_patterns, stock_data, parts_data, allow_overproduction, hint_patterns=None):
+    """
+    Builds the pattern model without its objective: a usage variable per
+    pattern, the demand and stock constraints, and the weighted stock used.
+    Built in a single pass, so `all_patterns` may be any iterable or stream.
+    Returns the model, the patterns, their usage variables and the stock
+    used expression.
+    """
     model = cp_model.CpModel()
-    parts_map = {f"{part['length']}": part for part in parts_data}
 
     max_usage_heuristic = sum(p['demand'] for p in parts_data) + 10 # Safety buffer
 
     # Variable: How many times is each pattern used?
-    num_times_pattern_used = [
-        model.NewIntVar(0, max_usage_heuristic, f"pattern_{p['pattern_id']}") for p in all_patterns
-    ]
+    patterns, num_times_pattern_used = [], []
+    terms_by_part = {f"{part['length']}": [] for part in parts_data}
+    vars_by_stock = {stock_id: [] for stock_id in stock_data}
+    hint_usage = _greedy_hint_usage(hint_patterns, parts_data) if hint_patterns else {}
+    total_patterns = len(all_patterns) if hasattr(all_patterns, '__len__') else None
+    for p in all_patterns:
+        if not len(patterns) % MODEL_PROGRESS_INTERVAL:
+            report_progress('model', len(patterns), total_patterns)
+        patterns.append(p)
+        usage_var = model.NewIntVar(0, max_usage_heuristic, f"pattern_{p['pattern_id']}")
+        num_times_pattern_used.append(usage_var)
+        if hint_usage:
+            usage_hint = hint_usage.pop(_pattern_key(p), None)
+            if usage_hint is not None:
+                model.AddHint(usage_var, usage_hint)
+        vars_by_stock[p['stock_id_used']].append(usage_var)
+        for part_id, count in p['yield'].items():
+            terms_by_part[part_id].append(usage_var * count)
 
     # Constraint: Produce at least the required number of each part.
     for part in parts_data:
-        part_id = f"{part['length']}"
-        constraint_expr = sum(
-            num_times_pattern_used[i] * p['yield'].get(part_id, 0) for i, p in enumerate(all_patterns)
-        )
+        constraint_expr = sum(terms_by_part[f"{part['length']}"])
         if allow_overproduction:
             model.Add(constraint_expr >= part['demand'])
         else:
@@ -40,83 +423,507 @@ def _solve_cutting_problem(all_patterns, stock_data, parts_data, allow_overprodu
     # Constraint: Don't use more stock than available (if specified).
     for stock_id, stock_info in stock_data.items():
         if 'available' in stock_info:
-            model.Add(sum(
-                num_times_pattern_used[i] for i, p in enumerate(all_patterns) if p['stock_id_used'] == stock_id
-            ) <= stock_info['available'])
+            model.Add(sum(vars_by_stock[stock_id]) <= stock_info['available'])
 
-    # Objective: Minimize the total number of stock bars used.
-    # A cost-based objective can be re-introduced later if needed.
-    total_stock_used = sum(num_times_pattern_used)
-    model.Minimize(total_stock_used)
+    # The weighted stock used, by cost, material or bar count and fresh bars
+    # before remnants (see `_stock_objective_weights`).
+    weights = _stock_objective_weights(stock_data)
+    total_stock_used = sum(
+        usage_var * weights[pattern['stock_id_used']]
+        for pattern, usage_var in zip(patterns, num_times_pattern_used, strict=True)
+    )
+    return model, patterns, num_times_pattern_used, total_stock_used
 
-    solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 30.0
-    status = solver.Solve(model)
+def _minimize_setups(model, patterns, usage_vars, stock_used, usage, stock_used_bound, solver, time_limit, callback=None):
+    """
+    The second, lexicographic phase of a solve: with the weighted stock used
+    kept at most `stock_used_bound`, minimizes the number of patterns in use,
+    each a saw setup, starting from the plan `usage`. Returns the usage of the
+    best plan found within `time_limit` seconds (`usage` itself if none is
+    better) and a report of the setup counts.
+    """
+    setups_before = _count_setups(patterns, usage)
+    model.Add(stock_used <= stock_used_bound)
+    model.ClearHints()
+    pattern_used = []
+    for pattern, usage_var, usage_count in zip(patterns, usage_vars, usage, strict=True):
+        is_used = model.NewBoolVar(f"uses_{pattern['pattern_id']}")
+        model.Add(usage_var == 0).OnlyEnforceIf(is_used.Not())
+        model.AddHint(usage_var, usage_count)
+        model.AddHint(is_used, usage_count > 0)
+        pattern_used.append(is_used)
+    model.Minimize(sum(pattern_used))
 
+    solver.parameters.max_time_in_seconds = time_limit
+    report_progress('setups', 0)
+    status = solver.Solve(model, callback)
     if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-        # --- Package up the results ---
-        total_bars_used_map = {sid: 0 for sid in stock_data}
-        total_parts_produced_map = {f"{p['length']}": 0 for p in parts_data}
-        
+        candidate = [solver.Value(usage_var) for usage_var in usage_vars]
+        if _count_setups(patterns, candidate) < setups_before:
+            usage = candidate
+    return usage, {
+        'setups_before': setups_before,
+        'setups': _count_setups(patterns, usage),
+        'proven_optimal': status == cp_model.OPTIMAL,
+    }
+
+def _minimize_plan_setups(all_patterns, solution, stock_data, parts_data, allow_overproduction, time_limit):
+    """
+    Runs the setup phase (see `_minimize_setups`) on a plan found by another
+    solver, over `all_patterns`. Returns the solution with fewer setups, or
+    the plan itself when none is found in time.
+    """
+    plan_usage = {}
+    for pattern in solution['patterns']:
+        plan_usage[_pattern_key(pattern)] = plan_usage.get(_pattern_key(pattern), 0) + pattern['usage_count']
+    if not plan_usage.keys() <= {_pattern_key(pattern) for pattern in all_patterns}:
+        # The plan uses patterns outside the set (e.g. a truncated set).
+        return solution
+
+    model, patterns, usage_vars, stock_used = _cutting_model(all_patterns, stock_data, parts_data, allow_overproduction)
+    # A pattern the set holds twice takes the plan's usage once.
+    usage = [plan_usage.pop(_pattern_key(pattern), 0) for pattern in patterns]
+
+    weights = _stock_objective_weights(stock_data)
+    bound = sum(pattern['usage_count'] * weights[pattern['stock_id_used']] for pattern in solution['patterns'])
+    solver = cp_model.CpSolver()
+    _configure_workers(solver)
+    usage, setup_report = _minimize_setups(model, patterns, usage_vars, stock_used, usage, bound, solver, time_limit)
+    if setup_report['setups'] < setup_report['setups_before']:
+        used_patterns = [dict(pattern, usage_count=count) for pattern, count in zip(patterns, usage, strict=True) if count > 0]
+        solution = dict(solution, **_package_solution(used_patterns, stock_data, parts_data))
+    solution['setup_minimization'] = setup_report
+    return solution
+
+def _trim_and_minimize_setups(all_patterns, solution, stock_data, parts_data, saw_kerf, setup_time_limit=None):
+    """
+    Trims a plan that covers the demand (see `_trim_overproduction`), then,
+    with `setup_time_limit`, runs the setup phase on the trimmed plan over
+    `all_patterns` and the trimmed patterns, so that its report describes the
+    plan returned.
+    """
+    solution = _trim_overproduction(solution, stock_data, parts_data, saw_kerf)
+    if setup_time_limit:
+        solution = _minimize_plan_setups(
+            all_patterns + solution['patterns'], solution, stock_data, parts_data, False, setup_time_limit
+        )
+    return solution
+
+def _count_setups(patterns, usage):
+    """Distinct patterns (stock and yield) used by `usage`."""
+    return len({_pattern_key(pattern) for pattern, count in zip(patterns, usage, strict=True) if count > 0})
+
+class _IncumbentCallback(cp_model.CpSolverSolutionCallback):
+    """Hands every improving CP-SAT solution, packaged, to `on_incumbent`."""
+
+    def __init__(self, patterns, usage_vars, stock_data, parts_data, on_incumbent):
+        super().__init__()
+        self._patterns = patterns
+        self._usage_vars = usage_vars
+        self._stock_data = stock_data
+        self._parts_data = parts_data
+        self._on_incumbent = on_incumbent
+
+    def on_solution_callback(self):
         used_patterns = []
-        for i, pattern in enumerate(all_patterns):
-            usage_count = solver.Value(num_times_pattern_used[i])
+        for pattern, usage_var in zip(self._patterns, self._usage_vars, strict=True):
+            usage_count = self.Value(usage_var)
             if usage_count > 0:
-                # Add usage count to the pattern dict for later reference
-                pattern_with_usage = pattern.copy()
-                pattern_with_usage['usage_count'] = usage_count
-                used_patterns.append(pattern_with_usage)
+                used_patterns.append(dict(pattern, usage_count=usage_count))
+        try:
+            self._on_incumbent(_package_solution(used_patterns, self._stock_data, self._parts_data))
+        except Exception:
+            # A failing listener must not abort the search.
+            logger.exception("Incumbent callback failed")
 
-                # Aggregate totals
-                stock_id = pattern['stock_id_used']
-                total_bars_used_map[stock_id] += usage_count
-                for part_id, yielded_count in pattern['yield'].items():
-                    total_parts_produced_map[part_id] += yielded_count * usage_count
-
-        return {
-            "status": "Success",
-            "total_stock_items_used": total_bars_used_map,
-            "total_parts_produced": total_parts_produced_map,
-            "patterns": used_patterns
-        }
-    return None
+def _assign_objective_weights(stock_data, objective):
+    """
+    Stores the integer `objective_weight` of a fresh bar on each stock entry
+    of the (integer-length) problem and returns the objective actually used.
+    Weights are reduced by their GCD, so a single stock length weighs 1.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown optimizer objective: {objective}")
+    fresh = {sid: info for sid, info in stock_data.items() if not info.get('remnant')}
+    if objective == "auto":
+        objective = "cost" if fresh and all(info.get('cost', 0) > 0 for info in fresh.values()) else "material"
+
+    if objective == "cost":
+        weights = {sid: max(1, round(info.get('cost', 0) * COST_SCALE)) for sid, info in fresh.items()}
+    elif objective == "material":
+        weights = {sid: max(1, int(info['length'])) for sid, info in fresh.items()}
+    else:
+        weights = {sid: 1 for sid in fresh}
+
+    divisor = math.gcd(*weights.values()) if weights else 1
+    for sid, weight in weights.items():
+        stock_data[sid]['objective_weight'] = weight // divisor
+    return objective
+
+def _pattern_key(pattern):
+    """Identifies a pattern by its stock and yield, whatever its id."""
+    return pattern['stock_id_used'], tuple(sorted(pattern['yield'].items()))
+
+def _hint_patterns(hints, stock_data, parts_data, saw_kerf):
+    """
+    Builds the pattern dicts of scaled `hints` (stock_id, yield, frequency),
+    dropping those that no longer fit, most frequent first.
+    """
+    length_by_part_id = {f"{p['length']}": p['length'] for p in parts_data}
+    patterns = []
+    for hint in sorted(hints or [], key=lambda hint: hint['frequency'], reverse=True):
+        ordered = sorted(hint['yield'].items(), key=lambda item: length_by_part_id[item[0]], reverse=True)
+        layout = [
+            {'part_id': part_id, 'length': length_by_part_id[part_id]}
+            for part_id, count in ordered for _ in range(count)
+        ]
+        stock_id = hint['stock_id']
+        pattern = _build_pattern(
+            f"hint_{len(patterns)}", stock_id, stock_data[stock_id]['length'], saw_kerf, dict(hint['yield']), layout
+        )
+        if pattern is not None:
+            pattern['frequency'] = hint['frequency']
+            patterns.append(pattern)
+    return patterns
+
+def _greedy_hint_usage(hint_patterns, parts_data):
+    """
+    A partial starting plan for CP-SAT: each hint pattern, most frequent
+    first, used as often as the remaining demand allows.
+    """
+    remaining = _demand_by_part_id(parts_data)
+    usage = {}
+    for pattern in hint_patterns:
+        times = min(remaining.get(part_id, 0) // count for part_id, count in pattern['yield'].items())
+        if times > 0:
+            for part_id, count in pattern['yield'].items():
+                remaining[part_id] -= count * times
+            usage[_pattern_key(pattern)] = usage.get(_pattern_key(pattern), 0) + times
+    return usage
+
+def _stock_objective_weights(stock_data):
+    """
+    Objective weight of one bar per stock entry: its `objective_weight` (see
+    `_assign_objective_weights`, 1 if unset). Entries marked `remnant` are
+    offcuts already on the shelf: any saving on fresh stock outweighs all
+    available remnants together, so fresh stock is minimized first and
+    remnants are only consumed where they save some.
+    """
+    remnant_bars = sum(info.get('available', 0) for info in stock_data.values() if info.get('remnant'))
+    return {
+        stock_id: 1 if info.get('remnant') else info.get('objective_weight', 1) * (remnant_bars + 1)
+        for stock_id, info in stock_data.items()
+    }
+
+def _package_solution(used_patterns, stock_data, parts_data):
+    """Builds the standard solution dict from patterns carrying a `usage_count`."""
+    total_bars_used_map = {sid: 0 for sid in stock_data}
+    total_parts_produced_map = {f"{p['length']}": 0 for p in parts_data}
+
+    for pattern in used_patterns:
+        usage_count = pattern['usage_count']
+        # Aggregate totals
+        total_bars_used_map[pattern['stock_id_used']] += usage_count
+        for part_id, yielded_count in pattern['yield'].items():
+            total_parts_produced_map[part_id] += yielded_count * usage_count
+
+    return {
+        "status": "Success",
+        "total_stock_items_used": total_bars_used_map,
+        "total_parts_produced": total_parts_produced_map,
+        "patterns": used_patterns
+    }
+
+def _trim_overproduction(solution, stock_data, parts_data, saw_kerf):
+    """
+    Removes surplus pieces from the used patterns so that production matches
+    demand exactly. Taking pieces off a bar always leaves a valid pattern, so
+    the bar count never increases; bars left empty are dropped.
+    """
+    produced = solution['total_parts_produced']
+    surplus = {
+        part_id: produced.get(part_id, 0) - demand
+        for part_id, demand in _demand_by_part_id(parts_data).items()
+    }
+    if all(extra <= 0 for extra in surplus.values()):
+        return solution
+
+    # Work on [stock_id, yield, bars] groups, splitting a group when only some
+    # of its bars lose pieces.
+    groups = [[p['stock_id_used'], dict(p['yield']), p['usage_count']] for p in solution['patterns']]
+    for part_id, extra in surplus.items():
+        for group in list(groups):
+            stock_id, group_yield, _ = group
+            while extra > 0 and group[2] > 0 and group_yield.get(part_id, 0):
+                per_bar = min(group_yield[part_id], extra)
+                trimmed_bars = min(group[2], extra // per_bar)
+                trimmed_yield = dict(group_yield)
+                trimmed_yield[part_id] -= per_bar
+                if not trimmed_yield[part_id]:
+                    del trimmed_yield[part_id]
+                group[2] -= trimmed_bars
+                groups.append([stock_id, trimmed_yield, trimmed_bars])
+                extra -= trimmed_bars * per_bar
+
+    return _solution_from_yields(groups, stock_data, parts_data, saw_kerf)
+
+def _solution_from_yields(groups, stock_data, parts_data, saw_kerf):
+    """
+    Builds a solution from (stock_id, yield, bars) groups, merging groups with
+    the same stock and yield and laying pieces out longest first.
+    """
+    length_by_part_id = {f"{p['length']}": p['length'] for p in parts_data}
+    merged = {}
+    for stock_id, group_yield, bars in groups:
+        if bars <= 0 or not group_yield:
+            continue
+        key = (stock_id, tuple(sorted(group_yield.items())))
+        merged[key] = merged.get(key, 0) + bars
+
+    used_patterns = []
+    for (stock_id, yield_items), bars in merged.items():
+        ordered = sorted(yield_items, key=lambda item: length_by_part_id[item[0]], reverse=True)
+        layout = [
+            {'part_id': part_id, 'length': length_by_part_id[part_id]}
+            for part_id, count in ordered for _ in range(count)
+        ]
+        pattern = _build_pattern(
+            f"pat_{len(used_patterns)}", stock_id, stock_data[stock_id]['length'], saw_kerf,
+            dict(yield_items), layout
+        )
+        if pattern is None:
+            continue
+        pattern['usage_count'] = bars
+        used_patterns.append(pattern)
+
+    return _package_solution(used_patterns, stock_data, parts_data)
+
+def _demand_by_part_id(parts_data):
+    return {f"{length}": demand for length, demand in total_demand_by_length(parts_data).items()}
+
+def _generate_all_patterns(stock_data, parts_data, saw_kerf, maximal_only=False, limits=None, report=None, extra_patterns=None):
+    """
+    Generates the pattern set of every stock entry, within the pattern count and
+    memory `limits` (per generated set, see DEFAULT_GENERATION_LIMITS). When a
+    cap is hit the lowest-waste patterns are kept and `report` says so.
+
+    The full enumeration runs once, for the longest stock: a pattern fits a
+    shorter stock exactly when its used length does, so the shorter stocks
+    take the matching subset. Maximal patterns of a shorter stock are not
+    maximal for the longest one, so `maximal_only` sets are generated per stock.
 
-def _generate_all_patterns(stock_data, parts_data, saw_kerf):
+    `extra_patterns` (bound to a stock) are added where the generated set
+    lacks them, e.g. library patterns a cap or `maximal_only` left out. They
+    do not shorten the enumeration itself, which still visits every pattern.
+    """
+    limits = {**DEFAULT_GENERATION_LIMITS, **(limits or {})}
     all_patterns = []
-    # Create a unique ID for each part based on length for the yield dict
-    parts_map = {f"{part['length']}": part for part in parts_data}
-    
-    # Sort parts from longest to shortest.
-    sorted_parts = sorted(parts_data, key=lambda p: p['length'], reverse=True)
+    total_demand = total_demand_by_length(parts_data)
+    stock_ids = sorted(stock_data, key=lambda sid: stock_data[sid]['length'], reverse=True)
+    if not stock_ids:
+        return all_patterns
 
-    for stock_id, stock_info in stock_data.items():
-        stock_length = stock_info['length']
-        generated_for_stock, pattern_hashes = [], set()
-        
-        _generate_recursive(
-            stock_length=stock_length,
-            remaining_length=stock_length,
-            current_yield={},
-            current_layout=[], # Track the visual layout
-            parts_to_try=sorted_parts,
-            generated_patterns=generated_for_stock,
-            pattern_hashes=pattern_hashes,
-            stock_id=stock_id,
-            saw_kerf=saw_kerf
+    shared_patterns = shared_report = shared_used_lengths = None
+    if not maximal_only:
+        shared_patterns, shared_report = _generated_pattern_set(
+            stock_ids[0], stock_data[stock_ids[0]]['length'], total_demand, saw_kerf, False, limits
         )
-        all_patterns.extend(generated_for_stock)
+        # The shortest bar each pattern fits: its parts and the kerfs between them.
+        shared_used_lengths = np.fromiter(
+            (pattern['total_parts_length_in_pattern'] + (pattern['num_cuts_in_pattern'] - 1) * saw_kerf
+             for pattern in shared_patterns),
+            dtype=np.float64, count=len(shared_patterns)
+        )
+
+    for stock_id in stock_ids:
+        stock_length = stock_data[stock_id]['length']
+        if maximal_only:
+            patterns, stock_report = _generated_pattern_set(
+                stock_id, stock_length, total_demand, saw_kerf, True, limits
+            )
+        elif stock_id == stock_ids[0]:
+            patterns, stock_report = shared_patterns, shared_report
+        else:
+            patterns, stock_report = _shared_subset(
+                shared_patterns, shared_used_lengths, shared_report,
+                stock_ids[0], stock_length, total_demand, saw_kerf
+            )
+
+        if report is not None:
+            report[stock_id] = stock_report
+
+        # Cached patterns are shared, so bind the stock on a copy. Ids restart
+        # per cached set and are renumbered to stay unique across stocks.
+        for pattern in patterns:
+            all_patterns.append(_bind_pattern(pattern, f"pat_{len(all_patterns)}", stock_id, stock_length, saw_kerf))
+
+    if extra_patterns:
+        known = {_pattern_key(pattern) for pattern in all_patterns}
+        for pattern in extra_patterns:
+            if _pattern_key(pattern) not in known:
+                known.add(_pattern_key(pattern))
+                all_patterns.append(dict(pattern, pattern_id=f"pat_{len(all_patterns)}"))
     return all_patterns
 
-def _add_pattern_if_new(current_yield, layout_details, generated_patterns, pattern_hashes, stock_id, stock_length, saw_kerf):
-    if not current_yield:
-        return
+def _bind_pattern(pattern, pattern_id, stock_id, stock_length, saw_kerf):
+    """
+    Copies a pattern onto a stock entry. Its length fields depend on the bar
+    (see `_build_pattern`: the cut after the last piece only counts when it
+    fits), so they are recomputed for `stock_length`.
+    """
+    parts_length, num_cuts = pattern['total_parts_length_in_pattern'], pattern['num_cuts_in_pattern']
+    kerf_length = num_cuts * saw_kerf
+    if parts_length + kerf_length > stock_length:
+        kerf_length -= saw_kerf
+    return dict(
+        pattern, pattern_id=pattern_id, stock_id_used=stock_id,
+        total_used_length_in_pattern=parts_length + kerf_length,
+        waste_length_in_pattern=stock_length - parts_length - kerf_length,
+        total_kerf_length_in_pattern=kerf_length,
+    )
+
+def _generated_pattern_set(stock_id, stock_length, total_demand, saw_kerf, maximal_only, limits):
+    """The (cached) pattern set and generation report of one stock length."""
+    sorted_lengths = sorted(total_demand, reverse=True)
+    caps = demand_caps(total_demand, stock_length, saw_kerf)
+    cache_key = make_pattern_set_key(stock_length, caps, saw_kerf, maximal_only, limits)
+    pattern_cache = get_pattern_cache()
 
-    yield_tuple = tuple(sorted(current_yield.items()))
-    if yield_tuple in pattern_hashes:
-        return
+    patterns, stock_report = pattern_cache.get(
+        cache_key,
+        lambda yield_matrix: _patterns_from_yield_matrix(yield_matrix, cache_key),
+    )
+    if patterns is None:
+        pattern_stream = _stream_patterns(stock_length, sorted_lengths, caps, saw_kerf, maximal_only)
+        protected = _single_length_patterns(stock_length, sorted_lengths, caps, saw_kerf)
+        # The estimate counts every pattern; maximal sets finish early.
+        expected = round(estimate_pattern_count(stock_length, caps, saw_kerf)) if progress_enabled() else None
+        patterns, stock_report = _collect_patterns(pattern_stream, protected, caps, limits, expected)
+        # Where the clock stops a set depends on the machine's load; only
+        # complete sets and those capped by count or memory are repeatable.
+        if stock_report['cap_hit'] != 'time':
+            pattern_cache.put(cache_key, patterns, stock_report)
+    report_progress('patterns', len(patterns), len(patterns))
 
-    pattern_hashes.add(yield_tuple)
-    
+    if stock_report['cap_hit']:
+        logger.warning(
+            "Pattern %s cap hit for stock %s: kept %d lowest-waste of %d patterns",
+            stock_report['cap_hit'], stock_id, stock_report['patterns_kept'], stock_report['patterns_generated'],
+        )
+    return patterns, stock_report
+
+def _shared_subset(shared_patterns, used_lengths, shared_report, shared_stock_id, stock_length, total_demand, saw_kerf):
+    """
+    The patterns of the longest stock's set that fit `stock_length`. When that
+    set was capped, this stock's own single-length patterns are added, since
+    they keep exact demand feasible.
+    """
+    patterns = [shared_patterns[i] for i in np.flatnonzero(used_lengths <= stock_length)]
+    if shared_report['cap_hit']:
+        seen = {tuple(sorted(pattern['yield'].items())) for pattern in patterns}
+        caps = demand_caps(total_demand, stock_length, saw_kerf)
+        for pattern in _single_length_patterns(stock_length, sorted(total_demand, reverse=True), caps, saw_kerf):
+            if tuple(sorted(pattern['yield'].items())) not in seen:
+                patterns.append(pattern)
+
+    stock_report = {
+        'patterns_generated': 0,
+        'patterns_kept': len(patterns),
+        'cap_hit': shared_report['cap_hit'],
+        'shared_with': shared_stock_id,
+    }
+    return patterns, stock_report
+
+def _collect_patterns(pattern_stream, protected, caps, limits, expected=None):
+    """
+    Drains a pattern stream into a list bounded by `limits`. Once full, a new
+    pattern replaces the highest-waste pattern kept if it wastes less.
+    The `protected` single-length patterns are always kept, so exact demand
+    stays feasible whatever is cut; the stream's copies of them are skipped.
+    Progress is reported against `expected` patterns.
+    """
+    max_patterns = limits['max_patterns']
+    max_bytes = limits['max_memory_mb'] * 1024 * 1024
+    deadline = time.monotonic() + limits['max_seconds']
+    heap = []
+    used_bytes = sum(_estimate_pattern_bytes(pattern) for pattern in protected)
+    report = {'patterns_generated': 0, 'patterns_kept': 0, 'cap_hit': None}
+
+    for sequence, pattern in enumerate(pattern_stream):
+        report['patterns_generated'] += 1
+        if not sequence % PATTERN_PROGRESS_INTERVAL:
+            if time.monotonic() > deadline:
+                report['cap_hit'] = 'time'
+                break
+            report_progress('patterns', sequence, expected)
+        size = _estimate_pattern_bytes(pattern)
+        if _is_protected_pattern(pattern, caps):
+            continue
+
+        if len(protected) + len(heap) < max_patterns and used_bytes + size <= max_bytes:
+            heapq.heappush(heap, (-pattern['waste_length_in_pattern'], sequence, pattern))
+            used_bytes += size
+            continue
+
+        report['cap_hit'] = 'count' if len(protected) + len(heap) >= max_patterns else 'memory'
+        if heap and -heap[0][0] > pattern['waste_length_in_pattern']:
+            _, _, dropped = heapq.heapreplace(heap, (-pattern['waste_length_in_pattern'], sequence, pattern))
+            used_bytes += size - _estimate_pattern_bytes(dropped)
+
+    kept = protected + [pattern for _, _, pattern in sorted(heap, key=lambda entry: entry[1])]
+    for index, pattern in enumerate(kept):
+        pattern['pattern_id'] = f"pat_{index}"
+    report['patterns_kept'] = len(kept)
+    return kept, report
+
+def _single_length_patterns(stock_length, sorted_lengths, caps, saw_kerf):
+    """One piece of each length, and as many of it as the cap allows."""
+    patterns = []
+    for length in sorted_lengths:
+        piece = [{'part_id': f"{length}", 'length': length}]
+        for count in sorted({1, caps[length]}):
+            if count < 1:
+                continue
+            pattern = _pattern_from_counts(None, stock_length, saw_kerf, [length], piece, [count])
+            if pattern is not None:
+                patterns.append(pattern)
+    return patterns
+
+def _is_protected_pattern(pattern, caps):
+    if len(pattern['yield']) != 1:
+        return False
+    count = next(iter(pattern['yield'].values()))
+    length = pattern['layout_pieces'][0]['length']
+    return count == 1 or count == caps[length]
+
+def _estimate_pattern_bytes(pattern):
+    # Dict and list overheads as measured on CPython 3.10+; piece dicts are shared.
+    return PATTERN_BASE_BYTES + PATTERN_BYTES_PER_PART * len(pattern['yield']) + 8 * pattern['num_cuts_in_pattern']
+
+def _patterns_from_yield_matrix(yield_matrix, cache_key):
+    """
+    Rebuilds the pattern dicts of a cached set from its yield matrix.
+    Pieces are laid out longest first, as `_stream_patterns` places them.
+    """
+    stock_length, lengths, saw_kerf = cache_key[:3]
+    pieces = [{'part_id': f"{length}", 'length': length} for length in lengths]
+    patterns = []
+    for row in yield_matrix:
+        pattern = _pattern_from_counts(f"pat_{len(patterns)}", stock_length, saw_kerf, lengths, pieces, row.tolist())
+        if pattern is not None:
+            patterns.append(pattern)
+    return patterns
+
+def _pattern_from_counts(pattern_id, stock_length, saw_kerf, lengths, pieces, counts):
+    pattern_yield, layout = {}, []
+    for piece, count in zip(pieces, counts, strict=True):
+        if count:
+            pattern_yield[piece['part_id']] = count
+            layout.extend([piece] * count)
+    return _build_pattern(pattern_id, None, stock_length, saw_kerf, pattern_yield, layout)
+
+def _build_pattern(pattern_id, stock_id, stock_length, saw_kerf, pattern_yield, layout_details):
+    """Computes the pattern dict for a layout, or None if it does not fit the bar."""
     total_parts_len = sum(part['length'] for part in layout_details)
     # The number of cuts is the number of pieces produced from the stock.
     num_cuts = len(layout_details) if layout_details else 0
@@ -145,49 +952,73 @@ def _add_pattern_if_new(current_yield, layout_details, generated_patterns, patte
         waste = stock_length - total_used_len
         # If waste is still negative, this pattern is truly invalid.
         if waste < 0:
-            return
+            return None
 
-
-    generated_patterns.append({
-        'pattern_id': f"pat_{len(generated_patterns)}",
+    return {
+        'pattern_id': pattern_id,
         'stock_id_used': stock_id,
-        'yield': current_yield.copy(),
+        'yield': pattern_yield,
         'layout_pieces': layout_details,
         'total_used_length_in_pattern': total_used_len,
         'waste_length_in_pattern': waste,
         'num_cuts_in_pattern': num_cuts,
         'total_kerf_length_in_pattern': total_kerf_len,
         'total_parts_length_in_pattern': total_parts_len
-    })
-
-
-def _generate_recursive(stock_length, remaining_length, current_yield, current_layout, parts_to_try, generated_patterns, pattern_hashes, stock_id, saw_kerf):
-    # A pattern is valid if it contains at least one part.
-    if current_yield:
-        _add_pattern_if_new(current_yield, current_layout, generated_patterns, pattern_hashes, stock_id, stock_length, saw_kerf)
-
-    # Explore adding more parts.
-    for i, part in enumerate(parts_to_try):
-        length_needed = part['length']
-        # Add a saw kerf for every cut, including the first.
-        if current_layout: # No kerf needed before the first piece
-            length_needed += saw_kerf
-
-        if length_needed <= remaining_length:
-            new_yield = current_yield.copy()
-            part_id = f"{part['length']}"
-            new_yield[part_id] = new_yield.get(part_id, 0) + 1
-            
-            new_layout = current_layout + [{'part_id': part_id, 'length': part['length']}]
-
-            _generate_recursive(
-                stock_length,
-                remaining_length - length_needed,
-                new_yield,
-                new_layout,
-                parts_to_try[i:], # We can reuse the same part
-                generated_patterns,
-                pattern_hashes,
-                stock_id,
-                saw_kerf
-            ) 
\ No newline at end of file
+    }
+
+
+def _stream_patterns(stock_length, sorted_lengths, caps, saw_kerf, maximal_only=False):
+    """
+    Yields every pattern for one stock length, without a stock bound yet.
+
+    Depth-first over the lengths in non-increasing order, so each multiset of
+    pieces comes out exactly once and no duplicate check is needed. An explicit
+    stack keeps memory flat and avoids recursion limits on bars holding
+    hundreds of pieces. With `maximal_only`, only patterns with no room left
+    for any length below its cap are yielded.
+    """
+    num_lengths = len(sorted_lengths)
+    cap_list = [caps[length] for length in sorted_lengths]
+    # Layouts share one piece dict per length; patterns never modify them.
+    pieces = [{'part_id': f"{length}", 'length': length} for length in sorted_lengths]
+    counts = [0] * num_lengths
+    num_pieces = 0
+
+    # Frame: [next length index to try, remaining length, index added to reach it].
+    stack = [[0, stock_length, None]]
+    while stack:
+        frame = stack[-1]
+        i = frame[0]
+        while i < num_lengths:
+            # A saw kerf separates every piece from the previous one.
+            length_needed = sorted_lengths[i] + saw_kerf if num_pieces else sorted_lengths[i]
+            if counts[i] < cap_list[i] and length_needed <= frame[1]:
+                break
+            i += 1
+
+        if i == num_lengths:
+            stack.pop()
+            if frame[2] is not None:
+                counts[frame[2]] -= 1
+                num_pieces -= 1
+            continue
+
+        # Resume with the next length after returning; the child may reuse this one.
+        frame[0] = i + 1
+        counts[i] += 1
+        num_pieces += 1
+        remaining = frame[1] - length_needed
+        stack.append([i, remaining, i])
+
+        if maximal_only and not _is_maximal(counts, cap_list, sorted_lengths, remaining, saw_kerf):
+            continue
+        pattern = _pattern_from_counts(None, stock_length, saw_kerf, sorted_lengths, pieces, counts)
+        if pattern is not None:
+            yield pattern
+
+def _is_maximal(counts, cap_list, sorted_lengths, remaining_length, saw_kerf):
+    # The shortest lengths are the last to stop fitting.
+    for j in range(len(sorted_lengths) - 1, -1, -1):
+        if counts[j] < cap_list[j]:
+            return sorted_lengths[j] + saw_kerf > remaining_length
+    return True
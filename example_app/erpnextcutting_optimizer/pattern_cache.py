@@ -0,0 +1,199 @@
+#
+# 1D Cutting Optimizer - Pattern Set Cache
+#
+# Generated pattern sets only depend on the stock length, the unique part
+# lengths, the saw kerf and the per-length demand caps. Different profiles and
+# different orders share these far more often than not, so the sets are kept
+# in a process-wide LRU cache that lives as long as the RQ worker does.
+#
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_CACHED_PATTERNS = 2_000_000
+DEFAULT_MAX_SPILLED_PATTERNS = 20_000_000
+# Generation limits left out of the cache key (see `make_pattern_set_key`).
+UNCACHED_LIMITS = ("max_seconds",)
+
+
+def make_pattern_set_key(stock_length, demand_caps, saw_kerf, maximal_only=False, limits=None):
+	"""
+	Builds the cache key for one stock length.
+	`demand_caps` maps part length -> maximum count of that length per bar.
+	The count and memory `limits` are part of the key, since a capped set
+	differs. The time limit is not: sets cut short by it are never cached.
+	"""
+	lengths = tuple(sorted(demand_caps, reverse=True))
+	caps = tuple(demand_caps[length] for length in lengths)
+	limits_key = tuple(
+		sorted((name, value) for name, value in (limits or {}).items() if name not in UNCACHED_LIMITS)
+	)
+	return (stock_length, lengths, saw_kerf, caps, maximal_only, limits_key)
+
+
+class PatternSetCache:
+	"""
+	LRU cache of generated pattern sets, bounded by the total number of
+	patterns held rather than by the number of entries.
+
+	Entries evicted from memory are optionally spilled to `spill_dir` as
+	int32 yield matrices (one row per pattern, one column per unique length)
+	and read back through a memory map on the next hit.
+
+	Each entry also carries a small `meta` dict (e.g. the generation report).
+	Cached pattern lists are shared between callers and must be treated as
+	read-only; callers copy the pattern dicts they need to modify.
+	"""
+
+	def __init__(
+		self,
+		max_total_patterns=DEFAULT_MAX_CACHED_PATTERNS,
+		spill_dir=None,
+		max_spilled_patterns=DEFAULT_MAX_SPILLED_PATTERNS,
+	):
+		self.max_total_patterns = max_total_patterns
+		self.spill_dir = spill_dir
+		self.max_spilled_patterns = max_spilled_patterns
+		self._entries = OrderedDict()
+		self._total_patterns = 0
+		self._spilled = OrderedDict()
+		self._total_spilled = 0
+		self._lock = threading.Lock()
+		self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+	def configure(self, max_total_patterns=None, spill_dir=None, max_spilled_patterns=None):
+		"""Updates the limits in place, keeping whatever is already cached."""
+		with self._lock:
+			if max_total_patterns is not None:
+				self.max_total_patterns = max_total_patterns
+			if max_spilled_patterns is not None:
+				self.max_spilled_patterns = max_spilled_patterns
+			if spill_dir is not None and spill_dir != self.spill_dir:
+				self._drop_spilled()
+				self.spill_dir = spill_dir
+			self._evict()
+
+	def get(self, key, rebuild):
+		"""
+		Returns `(patterns, meta)` for `key`, or `(None, None)` on a miss.
+		`rebuild(yield_matrix)` turns a spilled yield matrix back into patterns.
+		"""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None:
+				self._entries.move_to_end(key)
+				self.stats["hits"] += 1
+				return entry
+
+			spilled = self._spilled.pop(key, None)
+			if spilled is None:
+				self.stats["misses"] += 1
+				return None, None
+
+			path, count, meta = spilled
+			self._total_spilled -= count
+			try:
+				yield_matrix = np.load(path, mmap_mode="r")
+				patterns = rebuild(yield_matrix)
+				del yield_matrix
+			except (OSError, ValueError):
+				self.stats["misses"] += 1
+				return None, None
+			finally:
+				_remove_quietly(path)
+
+			self.stats["disk_hits"] += 1
+			self._insert(key, patterns, meta)
+			return patterns, meta
+
+	def put(self, key, patterns, meta=None):
+		with self._lock:
+			if key in self._entries:
+				self._total_patterns -= len(self._entries.pop(key)[0])
+			self._insert(key, patterns, meta or {})
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self._total_patterns = 0
+			self._drop_spilled()
+
+	def __len__(self):
+		return len(self._entries)
+
+	@property
+	def total_patterns(self):
+		return self._total_patterns
+
+	def _insert(self, key, patterns, meta):
+		self._entries[key] = (patterns, meta)
+		self._total_patterns += len(patterns)
+		self._evict()
+
+	def _evict(self):
+		# Always keep the most recent entry, even if it alone exceeds the limit.
+		while self._total_patterns > self.max_total_patterns and len(self._entries) > 1:
+			key, (patterns, meta) = self._entries.popitem(last=False)
+			self._total_patterns -= len(patterns)
+			self.stats["evictions"] += 1
+			if self.spill_dir:
+				self._spill(key, patterns, meta)
+
+	def _spill(self, key, patterns, meta):
+		if len(patterns) > self.max_spilled_patterns:
+			return
+		lengths = key[1]
+		yield_matrix = np.zeros((len(patterns), len(lengths)), dtype=np.int32)
+		columns = {f"{length}": j for j, length in enumerate(lengths)}
+		for i, pattern in enumerate(patterns):
+			for part_id, count in pattern["yield"].items():
+				yield_matrix[i, columns[part_id]] = count
+
+		try:
+			os.makedirs(self.spill_dir, exist_ok=True)
+			digest = hashlib.sha1(repr(key).encode()).hexdigest()
+			path = os.path.join(self.spill_dir, f"patterns_{digest}.npy")
+			np.save(path, yield_matrix)
+		except OSError:
+			return
+
+		self._spilled[key] = (path, len(patterns), meta)
+		self._total_spilled += len(patterns)
+		while self._total_spilled > self.max_spilled_patterns and self._spilled:
+			_, (old_path, old_count, _) = self._spilled.popitem(last=False)
+			self._total_spilled -= old_count
+			_remove_quietly(old_path)
+
+	def _drop_spilled(self):
+		for path, _, _ in self._spilled.values():
+			_remove_quietly(path)
+		self._spilled.clear()
+		self._total_spilled = 0
+
+
+def _remove_quietly(path):
+	try:
+		os.remove(path)
+	except OSError:
+		pass
+
+
+_pattern_cache = PatternSetCache()
+
+
+def get_pattern_cache():
+	"""Returns the process-wide pattern set cache."""
+	return _pattern_cache
+
+
+def configure_pattern_cache(max_total_patterns=None, spill_dir=None, max_spilled_patterns=None):
+	"""Adjusts the process-wide cache limits without dropping cached sets."""
+	_pattern_cache.configure(
+		max_total_patterns=max_total_patterns,
+		spill_dir=spill_dir,
+		max_spilled_patterns=max_spilled_patterns,
+	)
+	return _pattern_cache
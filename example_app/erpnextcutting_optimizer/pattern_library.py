@@ -0,0 +1,63 @@
+#
+# 1D Cutting Optimizer - Pattern Library
+#
+# Shops cut the same product families again and again, and the patterns that
+# solved an item before usually solve it again. Every used pattern of a
+# successful solution is kept per item as a "Cutting Pattern" with how often
+# it was cut; the most frequent ones are handed to the next solve of the item
+# as `pattern_hints` (see run_1d_optimizer). They seed the solver of every
+# engine, but only column generation skips generating what they already hold;
+# the enumerating engines enumerate every pattern as before.
+#
+import json
+
+# Library patterns offered to one solve, most frequently used first.
+PATTERN_HINT_LIMIT = 200
+
+
+def pattern_key(stock_length, saw_kerf, pieces):
+	"""A stable text key for a pattern: stock length, kerf and sorted pieces."""
+	pieces_key = ",".join(f"{length:g}x{count}" for length, count in sorted(pieces, reverse=True))
+	return f"{stock_length:g}|{saw_kerf:g}|{pieces_key}"
+
+
+def library_entries(solution, stock_data, saw_kerf):
+	"""
+	The library records of a solution's patterns on fresh stock, merged by
+	key: `pattern_key`, `stock_length`, `pieces` ([length, count] pairs) and
+	`bars` cut. Remnant patterns depend on what is on the shelf and are skipped.
+	"""
+	entries = {}
+	for pattern in solution.get("patterns", []):
+		stock_info = stock_data.get(pattern["stock_id_used"], {})
+		if stock_info.get("remnant") or not pattern.get("layout_pieces"):
+			continue
+		counts = {}
+		for piece in pattern["layout_pieces"]:
+			counts[float(piece["length"])] = counts.get(float(piece["length"]), 0) + 1
+		pieces = sorted(([length, count] for length, count in counts.items()), reverse=True)
+		stock_length = float(stock_info["length"])
+		key = pattern_key(stock_length, float(saw_kerf), pieces)
+		entry = entries.setdefault(
+			key, {"pattern_key": key, "stock_length": stock_length, "pieces": pieces, "bars": 0}
+		)
+		entry["bars"] += pattern.get("usage_count", 1)
+	return list(entries.values())
+
+
+def hints_from_library(rows):
+	"""Turns library rows (stock_length_mm, pieces JSON, times_used) into pattern hints."""
+	hints = []
+	for row in rows:
+		try:
+			pieces = json.loads(row["pieces"])
+		except (TypeError, ValueError):
+			continue
+		hints.append(
+			{
+				"stock_length": row["stock_length_mm"],
+				"pieces": pieces,
+				"frequency": row.get("times_used") or 1,
+			}
+		)
+	return hints
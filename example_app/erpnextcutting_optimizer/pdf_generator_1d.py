@@ -1,16 +1,33 @@
 # example_app/erpnextcutting_optimizer/pdf_generator_1d.py
 
 import io
+import math
 from datetime import datetime
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape, portrait
 from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
 from reportlab.pdfgen import canvas
 
+# Diagram layouts from roomiest to densest. The least dense layout that fits
+# all unique patterns into the page budget is used.
+DIAGRAM_LAYOUTS = (
+    {'rows': 4, 'bar_offset': 25 * mm, 'bar_height': 15 * mm, 'title_style': 'sub_header', 'labels': True},
+    {'rows': 8, 'bar_offset': 12 * mm, 'bar_height': 7 * mm, 'title_style': 'body_bold_small', 'labels': False},
+    {'rows': 16, 'bar_offset': 6.5 * mm, 'bar_height': 3.5 * mm, 'title_style': 'body_tiny', 'labels': False},
+)
+# Landscape pages of pattern diagrams at most; the patterns that do not fit
+# are listed in the cut list, lowest usage first.
+DEFAULT_PATTERN_PAGE_BUDGET = 25
+# Patterns cut at most this many times move to the cut list first when the
+# diagrams do not fit the budget.
+CUT_LIST_MAX_USAGE = 1
+
 
 class OneDCuttingPDFGenerator:
-    def __init__(self, stock_data, parts_data, all_patterns_dict, solution_details_list, parts_production_summary_list, saw_kerf=1):
+    def __init__(self, stock_data, parts_data, all_patterns_dict, solution_details_list, parts_production_summary_list, saw_kerf=1,
+                 pattern_page_budget=DEFAULT_PATTERN_PAGE_BUDGET, cut_list_max_usage=CUT_LIST_MAX_USAGE, on_progress=None):
         self.buffer = io.BytesIO()
         self.stock_data = stock_data
         self.parts_data = parts_data
@@ -18,6 +35,10 @@ class OneDCuttingPDFGenerator:
         self.solution_details_list = solution_details_list
         self.parts_production_summary_list = parts_production_summary_list
         self.saw_kerf = saw_kerf
+        self.pattern_page_budget = pattern_page_budget
+        self.cut_list_max_usage = cut_list_max_usage
+        # Called as on_progress('pdf', pages_drawn, pages_planned) for the pattern pages.
+        self.on_progress = on_progress
         
         self.width, self.height = portrait(A4)
         self.c = canvas.Canvas(self.buffer, pagesize=portrait(A4))
@@ -28,9 +49,61 @@ class OneDCuttingPDFGenerator:
             'body': ('Helvetica', 9),
             'body_small': ('Helvetica', 8),
             'body_bold_small': ('Helvetica-Bold', 8),
+            'body_tiny': ('Helvetica', 6),
         }
         self.margins = {'left': 20 * mm, 'right': 20 * mm, 'top': 25 * mm, 'bottom': 20 * mm}
         self.line_height = 5.5 * mm
+        self._index_report()
+
+    def _index_report(self):
+        """
+        Indexes the inputs once, so drawing stays linear in the number of
+        patterns: usage by pattern id, production summary rows by profile, and
+        the unique patterns (identical cuts on the same stock are one diagram)
+        with their multiplicities, most used first.
+        """
+        self.pattern_usage = {}
+        for details in self.solution_details_list:
+            for pattern_id, count in details.get('pattern_usage', {}).items():
+                self.pattern_usage.setdefault(pattern_id, count)
+
+        # Rows name their profile; older callers only tag part names with the
+        # first four characters of the profile id.
+        self.production_summary_by_profile = {}
+        profiles_by_prefix = {}
+        for details in self.solution_details_list:
+            profile_id = details.get('profile_id', 'Unnamed Profile')
+            profiles_by_prefix.setdefault(profile_id[:4], []).append(profile_id)
+            self.production_summary_by_profile[profile_id] = []
+        prefix_lengths = {len(prefix) for prefix in profiles_by_prefix}
+        for row in self.parts_production_summary_list:
+            if 'Profile' in row:
+                profile_ids = [row['Profile']]
+            else:
+                part_id = row.get('Part ID', '')
+                profile_ids = [
+                    profile_id for length in prefix_lengths
+                    for profile_id in profiles_by_prefix.get(part_id[len(part_id) - length:], [])
+                ]
+            for profile_id in profile_ids:
+                self.production_summary_by_profile.setdefault(profile_id, []).append(row)
+
+        unique = {}
+        for pattern_id, pattern_details in self.all_patterns_dict.items():
+            key = (
+                pattern_details.get('stock_id_used'),
+                tuple(piece.get('length', 0) for piece in pattern_details.get('layout_pieces', [])),
+            )
+            entry = unique.setdefault(key, {'pattern_id': pattern_id, 'details': pattern_details, 'usage': 0, 'merged': 0})
+            entry['usage'] += self._pattern_usage_count(pattern_id, pattern_details)
+            entry['merged'] += 1
+        self.unique_patterns = sorted(unique.values(), key=lambda entry: entry['usage'], reverse=True)
+
+    def _pattern_usage_count(self, pattern_id, pattern_details):
+        usage = pattern_details.get('usage_count')
+        if usage is None:
+            usage = self.pattern_usage.get(pattern_id, 0)
+        return usage
 
     def _set_font(self, style):
         font_name, size = self.styles[style]
@@ -44,14 +117,7 @@ class OneDCuttingPDFGenerator:
         for solution_details in self.solution_details_list:
             profile_id = solution_details.get('profile_id', 'Unnamed Profile')
             y_pos = self._draw_profile_summary_section(y_pos, solution_details, profile_id)
-            
-            # Since the generator now handles one profile at a time in the loop,
-            # we need to filter the production summary for the current profile.
-            current_production_summary = [
-                s for s in self.parts_production_summary_list 
-                if s.get('Part ID', '').endswith(profile_id[:4])
-            ]
-            y_pos = self._draw_production_summary_table(y_pos, current_production_summary)
+            y_pos = self._draw_production_summary_table(y_pos, self.production_summary_by_profile.get(profile_id, []))
             y_pos -= self.line_height * 2
 
         self._draw_part_legend(y_pos)
@@ -74,10 +140,16 @@ class OneDCuttingPDFGenerator:
         self.c.drawString(self.margins['left'], y_pos, f"Summary for Profile: {profile_id}")
         y_pos -= self.line_height * 1.5
         
+        # Each distinct pattern is one saw setup; the setup phase reports the count it started from.
+        setups = f"{details.get('number_of_setups', len(details.get('pattern_usage', {})))}"
+        setup_report = details.get('setup_minimization')
+        if setup_report and setup_report['setups_before'] > setup_report['setups']:
+            setups += f" (minimized from {setup_report['setups_before']})"
+
         summary_items = [
             ("Total Stock Cost:", f"{details.get('total_stock_cost', 0):.2f}"),
             ("Yield:", f"{details.get('yield_percentage', 0):.2f} %"),
-            ("Unique Patterns Used:", len(details.get('pattern_usage', {}))),
+            ("Saw Setups (Unique Patterns):", setups),
             ("Total Parts Length:", f"{details.get('total_length_all_parts_produced_mm', 0):.0f} mm"),
             ("Total Stock Used Length:", f"{details.get('total_length_all_stock_used_mm', 0):.0f} mm"),
             ("Total Parts Weight:", f"{details.get('total_weight_all_parts_produced_kg', 0):.2f} kg"),
@@ -114,6 +186,8 @@ class OneDCuttingPDFGenerator:
         stock_usage = details.get('total_stock_items_used', {})
         for stock_id, count in stock_usage.items():
             info = self.stock_data.get(stock_id, {})
+            if info.get('remnant') and not count:
+                continue
             total_cost = count * info.get('cost', 0)
             total_weight = count * info.get('weight', 0)
             values = [
@@ -161,29 +235,18 @@ class OneDCuttingPDFGenerator:
         ]
         
         known_parts_by_name = {p['name']: p for p in self.parts_data if 'name' in p}
-        length_to_name_map = {p['length']: p['name'] for p in self.parts_data if 'name' in p and 'length' in p}
-
-        all_part_ids_in_solution = set(known_parts_by_name.keys())
-
-        for pattern_details in self.all_patterns_dict.values():
-            for piece in pattern_details.get('layout_pieces', []):
-                part_id = piece.get('part_id')
-                if not part_id or part_id not in known_parts_by_name:
-                    part_length = piece.get('length')
-                    if part_length in length_to_name_map:
-                        piece['part_id'] = length_to_name_map[part_length]
-                        all_part_ids_in_solution.add(piece['part_id'])
-                elif part_id:
-                     all_part_ids_in_solution.add(part_id)
+        # Layouts carry the optimizer's part ids; pieces are matched to the named
+        # parts by length instead of rewriting the shared pattern dicts.
+        self.part_name_by_length = {p['length']: p['name'] for p in self.parts_data if 'name' in p and 'length' in p}
 
-        sorted_part_ids = sorted(list(all_part_ids_in_solution))
+        sorted_part_ids = sorted(known_parts_by_name)
 
         part_meta_data = {
             part_id: {
                 'short_id': f"P{i+1}",
                 'color': part_colors[i % len(part_colors)],
                 'length': known_parts_by_name[part_id].get('length', 0)
-            } for i, part_id in enumerate(sorted_part_ids) if part_id in known_parts_by_name
+            } for i, part_id in enumerate(sorted_part_ids)
         }
         self.part_meta_data = part_meta_data
         
@@ -205,28 +268,69 @@ class OneDCuttingPDFGenerator:
                 self._set_font('body_small') # Reset font on new page
         return y_pos
 
-    def _draw_all_patterns(self):
-        if not self.all_patterns_dict:
-            return
-            
+    def _plan_pattern_pages(self):
+        """
+        Splits the unique patterns into diagrams and cut-list rows and picks
+        the diagram layout, keeping the diagrams within the page budget.
+        """
+        budget = max(0, self.pattern_page_budget)
+        diagrams, cut_list = self.unique_patterns, []
+        if not self._layout_for(len(diagrams), budget):
+            diagrams = [entry for entry in self.unique_patterns if entry['usage'] > self.cut_list_max_usage]
+            capacity = DIAGRAM_LAYOUTS[-1]['rows'] * budget
+            diagrams = diagrams[:capacity]
+            kept = {id(entry) for entry in diagrams}
+            cut_list = [entry for entry in self.unique_patterns if id(entry) not in kept]
+        return self._layout_for(len(diagrams), budget) or DIAGRAM_LAYOUTS[-1], diagrams, cut_list
+
+    def _layout_for(self, count, budget):
+        for layout in DIAGRAM_LAYOUTS:
+            if math.ceil(count / layout['rows']) <= budget:
+                return layout
+        return None
+
+    def _new_landscape_page(self):
         self.c.showPage()
         self.c.setPageSize(landscape(A4))
-        width, height = landscape(A4)
-        
-        max_patterns_per_page = 4
+        return landscape(A4)
+
+    def _draw_all_patterns(self):
+        if not self.unique_patterns:
+            return
+
+        layout, diagrams, cut_list = self._plan_pattern_pages()
+        max_patterns_per_page = layout['rows']
         y_start_offset = 30 * mm
+        width, height = self._new_landscape_page()
         y_pos_pattern = height - y_start_offset
-        
-        for i, (pattern_id, pattern_details) in enumerate(self.all_patterns_dict.items()):
+        # Cut-list rows mostly fit one line; the page count is an estimate.
+        cut_list_rows_per_page = int((height - y_start_offset - self.margins['bottom']) / (self.line_height * 0.8 * 1.25))
+        self._pages_drawn = 0
+        self._pages_planned = math.ceil(len(diagrams) / max_patterns_per_page) + math.ceil(len(cut_list) / cut_list_rows_per_page)
+
+        for i, entry in enumerate(diagrams):
             if i > 0 and i % max_patterns_per_page == 0:
-                self.c.showPage()
-                self.c.setPageSize(landscape(A4))
+                self._page_drawn()
+                self._new_landscape_page()
                 y_pos_pattern = height - y_start_offset
 
-            self._draw_single_pattern(y_pos_pattern, pattern_id, pattern_details, width)
+            self._draw_single_pattern(y_pos_pattern, entry, width, layout)
             y_pos_pattern -= (height - 40*mm) / max_patterns_per_page
-            
-    def _draw_single_pattern(self, y_pos, pattern_id, pattern_details, page_width):
+
+        if cut_list:
+            if diagrams:
+                self._page_drawn()
+                self._new_landscape_page()
+            self._draw_cut_list(height - y_start_offset, cut_list, width, height)
+        self._page_drawn()
+
+    def _page_drawn(self):
+        self._pages_drawn += 1
+        if self.on_progress:
+            self.on_progress('pdf', self._pages_drawn, max(self._pages_planned, self._pages_drawn))
+
+    def _draw_single_pattern(self, y_pos, entry, page_width, layout=DIAGRAM_LAYOUTS[0]):
+        pattern_id, pattern_details, usage = entry['pattern_id'], entry['details'], entry['usage']
         stock_id = pattern_details.get('stock_id_used')
         if not stock_id:
             return
@@ -234,49 +338,50 @@ class OneDCuttingPDFGenerator:
         stock_info = self.stock_data.get(stock_id, {})
         stock_length = stock_info.get('length', 0)
         
-        self._set_font('sub_header')
-        
-        usage = 0
-        for details in self.solution_details_list:
-            if pattern_id in details.get('pattern_usage', {}):
-                usage = details['pattern_usage'][pattern_id]
-                break
-        
-        title = f"Pattern: {pattern_id} (used {usage} times on stock '{stock_id}')"
+        self._set_font(layout['title_style'])
+        merged_note = f" + {entry['merged'] - 1} identical" if entry['merged'] > 1 else ""
+        title = f"Pattern: {pattern_id}{merged_note} (used {usage} times on stock '{stock_id}')"
         self.c.drawString(self.margins['left'], y_pos, title)
         
-        bar_y = y_pos - 25*mm
-        bar_height = 15*mm
+        bar_y = y_pos - layout['bar_offset']
+        bar_height = layout['bar_height']
         
         if stock_length <= 0: return
 
+        label_style = 'body_small' if layout['labels'] else 'body_tiny'
+        label_font, label_size = self.styles[label_style]
+        label_y = bar_y + bar_height / 2 - label_size * 0.35
+
         draw_scale = (page_width - self.margins['left'] * 2) / stock_length
         self.c.setFillColor(colors.lightgrey)
         self.c.rect(self.margins['left'], bar_y, stock_length * draw_scale, bar_height, stroke=1, fill=1)
         
         current_x_abs = self.margins['left']
         num_pieces = len(pattern_details.get('layout_pieces', []))
+        self._set_font(label_style)
         for i, piece in enumerate(pattern_details.get('layout_pieces', [])):
             part_id = piece.get('part_id')
             part_length = piece.get('length', 0)
+            piece_width = part_length * draw_scale
             
-            meta = self.part_meta_data.get(part_id, {})
+            meta = self._part_meta(part_id, part_length)
             if meta:
                 self.c.setFillColor(meta.get('color', colors.white))
-                self.c.rect(current_x_abs, bar_y, part_length * draw_scale, bar_height, stroke=1, fill=1)
+                self.c.rect(current_x_abs, bar_y, piece_width, bar_height, stroke=1, fill=1)
             
             self.c.setFillColor(colors.black)
-            self._set_font('body_small')
             short_id = meta.get('short_id', '?')
-            self.c.drawCentredString(current_x_abs + (part_length * draw_scale / 2), bar_y + 5*mm, f"{short_id}")
+            if layout['labels'] or self.c.stringWidth(short_id, label_font, label_size) < piece_width:
+                self.c.drawCentredString(current_x_abs + piece_width / 2, label_y, f"{short_id}")
             
             # Conditionally draw the length label to prevent overlapping text
-            length_label = f"({part_length:.1f}mm)"
-            text_width = self.c.stringWidth(length_label, self.styles['body_small'][0], self.styles['body_small'][1])
-            if text_width < (part_length * draw_scale):
-                self.c.drawCentredString(current_x_abs + (part_length * draw_scale / 2), bar_y - 5*mm, length_label)
+            if layout['labels']:
+                length_label = f"({part_length:.1f}mm)"
+                text_width = self.c.stringWidth(length_label, label_font, label_size)
+                if text_width < piece_width:
+                    self.c.drawCentredString(current_x_abs + piece_width / 2, bar_y - 5*mm, length_label)
                 
-            current_x_abs += part_length * draw_scale
+            current_x_abs += piece_width
             
             # Draw kerf after the piece, but not for the last piece
             if i < num_pieces - 1:
@@ -293,4 +398,61 @@ class OneDCuttingPDFGenerator:
             self.c.rect(current_x_abs, bar_y, waste * draw_scale, bar_height, stroke=1, fill=0)
             # Reset the dash to not affect other elements
             self.c.setDash([])
-            self.c.drawCentredString(current_x_abs + (waste * draw_scale / 2), bar_y + bar_height/2, f"Waste: {waste:.1f}mm") 
\ No newline at end of file
+            waste_label = f"Waste: {waste:.1f}mm"
+            if layout['labels'] or self.c.stringWidth(waste_label, label_font, label_size) < waste * draw_scale:
+                self.c.drawCentredString(current_x_abs + (waste * draw_scale / 2), label_y, waste_label)
+
+    def _part_meta(self, part_id, part_length):
+        return self.part_meta_data.get(part_id) or self.part_meta_data.get(self.part_name_by_length.get(part_length), {})
+
+    def _draw_cut_list(self, y_pos, cut_list, page_width, page_height):
+        """One row per pattern: stock, quantity, the pieces in cutting order and the waste."""
+        self._set_font('header')
+        self.c.drawString(self.margins['left'], y_pos, "Cut List")
+        y_pos -= self.line_height * 1.5
+
+        headers = ["Pattern", "Stock ID", "Qty", "Cuts", "Waste (mm)"]
+        coords = [self.margins['left'] + x for x in [0, 30*mm, 65*mm, 80*mm, 235*mm]]
+        cuts_width = coords[4] - coords[3] - 5*mm
+        body_font, body_size = self.styles['body_small']
+        row_height = self.line_height * 0.8
+
+        def draw_headers(y):
+            self._set_font('sub_header')
+            for i, h in enumerate(headers):
+                self.c.drawString(coords[i], y, h)
+            self._set_font('body_small')
+            return y - self.line_height
+
+        y_pos = draw_headers(y_pos)
+        for entry in cut_list:
+            pattern_details = entry['details']
+            cuts = simpleSplit(self._describe_cuts(pattern_details), body_font, body_size, cuts_width)
+            if y_pos - row_height * (len(cuts) - 1) < self.margins['bottom']:
+                self._page_drawn()
+                self._new_landscape_page()
+                y_pos = draw_headers(page_height - 30*mm)
+
+            pattern_label = entry['pattern_id'] + (f" +{entry['merged'] - 1}" if entry['merged'] > 1 else "")
+            values = [pattern_label, pattern_details.get('stock_id_used', ''), entry['usage']]
+            for i, v in enumerate(values):
+                self.c.drawString(coords[i], y_pos, str(v))
+            self.c.drawRightString(coords[4] + 20*mm, y_pos, f"{pattern_details.get('waste_length_in_pattern', 0):.1f}")
+            for line in cuts:
+                self.c.drawString(coords[3], y_pos, line)
+                y_pos -= row_height
+            y_pos -= row_height * 0.25
+
+    def _describe_cuts(self, pattern_details):
+        """The pieces of a pattern in cutting order, runs of one part merged, e.g. "P1 1200.0 x2, P3 850.0"."""
+        runs = []
+        for piece in pattern_details.get('layout_pieces', []):
+            part_length = piece.get('length', 0)
+            if runs and runs[-1][0] == part_length:
+                runs[-1][1] += 1
+            else:
+                runs.append([part_length, 1])
+        return ", ".join(
+            f"{self._part_meta(None, part_length).get('short_id', '?')} {part_length:.1f}" + (f" x{count}" if count > 1 else "")
+            for part_length, count in runs
+        )
@@ -0,0 +1,286 @@
+#
+# 1D Cutting Optimizer - Portfolio Engine
+#
+# Different instance shapes favour different solvers. The portfolio runs
+# CP-SAT and a MIP solver over the same patterns, next to the greedy
+# heuristic, and stops as soon as one result is provably optimal.
+#
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ortools.linear_solver import pywraplp
+from ortools.sat.python import cp_model
+
+from .engine_selection import bars_lower_bound
+from .heuristics import run_first_fit_decreasing
+from .optimizer_core import (
+	SOLVER_TIME_LIMIT_SECONDS,
+	_generate_all_patterns,
+	_generation_capped,
+	_minimize_plan_setups,
+	_needs_cover_and_trim,
+	_package_solution,
+	_solve_cutting_problem,
+	_stock_objective_weights,
+	_trim_and_minimize_setups,
+	with_solver_threads,
+)
+from .progress import with_progress_listener
+
+logger = logging.getLogger(__name__)
+
+# Tried in order; the first backend available in the OR-Tools build is used.
+MIP_BACKENDS = ("SCIP", "CBC")
+
+
+def run_portfolio(
+	stock_data,
+	parts_data,
+	saw_kerf,
+	allow_overproduction=False,
+	generation_limits=None,
+	generation_report=None,
+	time_limit=SOLVER_TIME_LIMIT_SECONDS,
+	hint_patterns=None,
+	on_incumbent=None,
+	setup_time_limit=None,
+):
+	"""
+	Races CP-SAT, a MIP and First-Fit-Decreasing in threads (the OR-Tools
+	solvers run in native code). Returns the first result that is proven
+	optimal or meets the material lower bound, after stopping the others;
+	otherwise the result with the best objective once all have finished.
+	With `setup_time_limit`, the winning plan then goes through the setup
+	phase of the optimizer core, whichever solver found it.
+	"""
+	generation_report = {} if generation_report is None else generation_report
+	all_patterns = _generate_all_patterns(
+		stock_data,
+		parts_data,
+		saw_kerf,
+		limits=generation_limits,
+		report=generation_report,
+		extra_patterns=hint_patterns,
+	)
+	if not all_patterns:
+		return None
+
+	cover_and_trim = _needs_cover_and_trim(allow_overproduction, generation_report)
+	# Optimal over a capped set proves nothing; such results race to the lower bound only.
+	pattern_set_complete = not _generation_capped(generation_report)
+	model_overproduction = allow_overproduction or cover_and_trim
+	weights = _stock_objective_weights(stock_data)
+	# The bar count bound only bounds the objective while all bars weigh the same.
+	lower_bound = (
+		bars_lower_bound(stock_data, parts_data, saw_kerf) if len(set(weights.values())) == 1 else None
+	)
+
+	cancelled = threading.Event()
+	cancel_callbacks = []
+	cancel_lock = threading.Lock()
+
+	def register_cancel(callback):
+		with cancel_lock:
+			cancel_callbacks.append(callback)
+		return not cancelled.is_set()
+
+	def solve_cp_sat():
+		solver = cp_model.CpSolver()
+		if not register_cancel(lambda: _stop_cp_sat(solver)):
+			return None
+		return _solve_cutting_problem(
+			all_patterns,
+			stock_data,
+			parts_data,
+			model_overproduction,
+			solver=solver,
+			time_limit=time_limit,
+			hint_patterns=hint_patterns,
+			on_incumbent=on_incumbent,
+			pattern_set_complete=pattern_set_complete,
+			cancelled=cancelled,
+		)
+
+	def solve_mip():
+		return _solve_mip(
+			all_patterns,
+			stock_data,
+			parts_data,
+			model_overproduction,
+			time_limit,
+			register_cancel,
+			weights,
+			pattern_set_complete,
+		)
+
+	def solve_greedy():
+		solution = run_first_fit_decreasing(stock_data, parts_data, saw_kerf, allow_overproduction)
+		if solution:
+			solution["proven_optimal"] = False
+		return solution
+
+	racers = {"cp_sat": solve_cp_sat, "mip": solve_mip, "greedy": solve_greedy}
+	results, winner = {}, None
+	started = time.monotonic()
+	executor = ThreadPoolExecutor(max_workers=len(racers), thread_name_prefix="optimizer-portfolio")
+	try:
+		pending = {
+			executor.submit(with_solver_threads(with_progress_listener(racer))): name
+			for name, racer in racers.items()
+		}
+		while pending and winner is None:
+			done, _ = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				name = pending.pop(future)
+				try:
+					solution = future.result()
+				except Exception:
+					logger.exception("Portfolio solver %s failed", name)
+					solution = None
+				results[name] = _race_entry(solution, started, weights)
+				if solution and (
+					solution.get("proven_optimal")
+					or (lower_bound is not None and _bars_used(solution) <= lower_bound)
+				):
+					winner = name
+					break
+	finally:
+		cancelled.set()
+		with cancel_lock:
+			for callback in cancel_callbacks:
+				callback()
+		executor.shutdown(wait=False, cancel_futures=True)
+
+	if winner is None:
+		finished = [name for name, entry in results.items() if entry["solution"]]
+		if not finished:
+			return None
+		winner = min(finished, key=lambda name: results[name]["objective"])
+
+	solution = results[winner]["solution"]
+	if cover_and_trim and winner != "greedy":
+		# The solver plans cover the demand; the greedy plan meets it as asked.
+		solution = _trim_and_minimize_setups(
+			all_patterns, solution, stock_data, parts_data, saw_kerf, setup_time_limit
+		)
+	elif setup_time_limit:
+		solution = _minimize_plan_setups(
+			all_patterns, solution, stock_data, parts_data, allow_overproduction, setup_time_limit
+		)
+
+	logger.info(
+		"Portfolio won by %s with %s bars (lower bound %s)", winner, results[winner]["bars"], lower_bound
+	)
+	solution["portfolio"] = {
+		"winner": winner,
+		"lower_bound": lower_bound,
+		"results": {
+			name: {key: value for key, value in entry.items() if key != "solution"}
+			for name, entry in results.items()
+		},
+	}
+	return solution
+
+
+def _race_entry(solution, started, weights):
+	return {
+		"solution": solution,
+		"bars": _bars_used(solution) if solution else None,
+		"objective": sum(
+			weights[stock_id] * bars for stock_id, bars in solution["total_stock_items_used"].items()
+		)
+		if solution
+		else None,
+		"proven_optimal": bool(solution and solution.get("proven_optimal")),
+		"seconds": round(time.monotonic() - started, 3),
+	}
+
+
+def _stop_cp_sat(solver):
+	"""
+	Stops a CP-SAT solve whether it is running or about to start: StopSearch()
+	only reaches a running one, and a solve starting later reads the zero time
+	limit.
+	"""
+	solver.parameters.max_time_in_seconds = 0
+	solver.StopSearch()
+
+
+def _stop_mip(solver):
+	"""Like `_stop_cp_sat`, for the linear solver wrapper (1 ms, as 0 means no limit)."""
+	solver.SetTimeLimit(1)
+	solver.InterruptSolve()
+
+
+def _bars_used(solution):
+	return sum(solution["total_stock_items_used"].values())
+
+
+def _solve_mip(
+	all_patterns,
+	stock_data,
+	parts_data,
+	allow_overproduction,
+	time_limit,
+	register_cancel,
+	weights,
+	pattern_set_complete=False,
+):
+	"""
+	The CP-SAT pattern model, as a MIP for the linear solver wrapper. Like
+	`_solve_cutting_problem`, optimal only counts with `pattern_set_complete`.
+	"""
+	solver = None
+	for backend in MIP_BACKENDS:
+		solver = pywraplp.Solver.CreateSolver(backend)
+		if solver:
+			break
+	if solver is None:
+		return None
+
+	max_usage_heuristic = sum(p["demand"] for p in parts_data) + 10
+	usage_vars = []
+	terms_by_part = {f"{part['length']}": [] for part in parts_data}
+	vars_by_stock = {stock_id: [] for stock_id in stock_data}
+	for p in all_patterns:
+		usage_var = solver.IntVar(0, max_usage_heuristic, f"pattern_{p['pattern_id']}")
+		usage_vars.append(usage_var)
+		vars_by_stock[p["stock_id_used"]].append(usage_var)
+		for part_id, count in p["yield"].items():
+			terms_by_part[part_id].append(usage_var * count)
+
+	for part in parts_data:
+		constraint_expr = solver.Sum(terms_by_part[f"{part['length']}"])
+		if allow_overproduction:
+			solver.Add(constraint_expr >= part["demand"])
+		else:
+			solver.Add(constraint_expr == part["demand"])
+
+	for stock_id, stock_info in stock_data.items():
+		if "available" in stock_info:
+			solver.Add(solver.Sum(vars_by_stock[stock_id]) <= stock_info["available"])
+
+	solver.Minimize(
+		solver.Sum(
+			usage_var * weights[p["stock_id_used"]]
+			for p, usage_var in zip(all_patterns, usage_vars, strict=True)
+		)
+	)
+	solver.SetTimeLimit(int(time_limit * 1000))
+	if not register_cancel(lambda: _stop_mip(solver)):
+		return None
+	status = solver.Solve()
+	if status not in (pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE):
+		return None
+
+	used_patterns = []
+	for pattern, usage_var in zip(all_patterns, usage_vars, strict=True):
+		usage_count = round(usage_var.solution_value())
+		if usage_count > 0:
+			used_patterns.append(dict(pattern, usage_count=usage_count))
+
+	solution = _package_solution(used_patterns, stock_data, parts_data)
+	solution["proven_optimal"] = pattern_set_complete and status == pywraplp.Solver.OPTIMAL
+	return solution
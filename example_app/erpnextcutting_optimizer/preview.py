@@ -0,0 +1,153 @@
+#
+# 1D Cutting Optimizer - Interactive Preview
+#
+# The dialog previews the cutting plan of one profile while the user edits its
+# parts list, without enqueueing a job. A preview is solved inline within a
+# small time budget: First-Fit-Decreasing always, then enumeration + CP-SAT,
+# started from the greedy plan, for the remaining time when the pattern set is
+# small. The result is a compact summary the client draws as SVG; the full job
+# with its PDF still runs when the user commits.
+#
+import time
+
+from .engine_selection import instance_features
+from .fixed_point import DEFAULT_LENGTH_RESOLUTION, FixedPointProblem
+from .heuristics import run_first_fit_decreasing
+from .optimizer_core import (
+	_assign_objective_weights,
+	_generate_all_patterns,
+	_generation_capped,
+	_needs_cover_and_trim,
+	_solve_cutting_problem,
+	_stock_objective_weights,
+	_trim_overproduction,
+	compute_solution_stats,
+)
+
+PREVIEW_TIME_LIMIT_SECONDS = 0.3
+# CP-SAT is only tried when the estimated pattern count is at most this, which
+# keeps generating the patterns and building the model well inside the budget.
+PREVIEW_PATTERN_LIMIT = 1_500
+# Not worth starting CP-SAT with less time than this left.
+MIN_SOLVER_SECONDS = 0.05
+# Larger parts lists are previewed with the heuristic alone.
+PREVIEW_MAX_PIECES = 20_000
+
+
+def run_preview(
+	stock_data,
+	parts_data,
+	saw_kerf,
+	allow_overproduction=False,
+	objective="auto",
+	time_limit=PREVIEW_TIME_LIMIT_SECONDS,
+):
+	"""
+	Solves one profile within about `time_limit` seconds and returns the
+	solution in original lengths (with `stats`, `engine` and
+	`proven_optimal`), or None when the parts do not fit the stock.
+	"""
+	started = time.perf_counter()
+	problem = FixedPointProblem(stock_data, parts_data, saw_kerf, DEFAULT_LENGTH_RESOLUTION)
+	objective = _assign_objective_weights(problem.stock_data, objective)
+	scaled_stock, scaled_parts, scaled_kerf = problem.stock_data, problem.parts_data, problem.saw_kerf
+
+	solution = run_first_fit_decreasing(scaled_stock, scaled_parts, scaled_kerf, allow_overproduction)
+	if solution:
+		solution.update(engine="heuristic", proven_optimal=False)
+
+	if sum(part["demand"] for part in scaled_parts) <= PREVIEW_MAX_PIECES and time_limit > MIN_SOLVER_SECONDS:
+		features = instance_features(scaled_stock, scaled_parts, scaled_kerf)
+		if features["estimated_patterns"] <= PREVIEW_PATTERN_LIMIT:
+			exact = _solve_exact(
+				scaled_stock, scaled_parts, scaled_kerf, allow_overproduction, solution, started + time_limit
+			)
+			if exact and (
+				not solution or _objective(exact, scaled_stock) <= _objective(solution, scaled_stock)
+			):
+				solution = dict(exact, engine=exact.get("engine", "enumeration"))
+
+	solution = problem.to_original(solution)
+	if solution:
+		solution["objective"] = objective
+		solution["stats"] = compute_solution_stats(solution, stock_data, parts_data)
+		solution["elapsed_ms"] = round((time.perf_counter() - started) * 1000)
+	return solution
+
+
+def summarize_preview(solution, stock_data):
+	"""
+	The compact plan the dialog draws: one entry per pattern with its stock
+	length, piece lengths in cutting order, yield by length, usage count and
+	waste per bar, plus the totals.
+	"""
+	stats = solution["stats"]
+	patterns = []
+	for pattern in sorted(solution["patterns"], key=lambda p: p["usage_count"], reverse=True):
+		patterns.append(
+			{
+				"stock_id": pattern["stock_id_used"],
+				"stock_length": stock_data[pattern["stock_id_used"]]["length"],
+				"pieces": [piece["length"] for piece in pattern["layout_pieces"]],
+				"yield": {f"{float(part_id):g}": count for part_id, count in pattern["yield"].items()},
+				"usage_count": pattern["usage_count"],
+				"kerf": pattern["total_kerf_length_in_pattern"],
+				"waste": pattern["waste_length_in_pattern"],
+			}
+		)
+	return {
+		"engine": solution.get("engine"),
+		"proven_optimal": bool(solution.get("proven_optimal")),
+		"elapsed_ms": solution.get("elapsed_ms"),
+		"bars": sum(solution["total_stock_items_used"].values()),
+		"stock_used_mm": stats["total_length_all_stock_used_mm"],
+		"waste_mm": stats["total_waste_length_mm"],
+		"yield_percentage": round(stats["yield_percentage"], 2),
+		"stock_cost": stats["total_stock_cost"],
+		"patterns": patterns,
+	}
+
+
+def _solve_exact(stock_data, parts_data, saw_kerf, allow_overproduction, greedy, deadline):
+	"""
+	Enumeration + CP-SAT until `deadline` (a perf_counter time), started from
+	the greedy plan, which is offered as hint patterns. A plan over a pattern
+	set cut short by the deadline is reported as heuristic.
+	"""
+	report = {}
+	hints = [
+		dict(pattern, frequency=pattern["usage_count"]) for pattern in (greedy or {}).get("patterns", [])
+	]
+	all_patterns = _generate_all_patterns(
+		stock_data,
+		parts_data,
+		saw_kerf,
+		limits={"max_seconds": deadline - time.perf_counter()},
+		report=report,
+		extra_patterns=hints,
+	)
+	remaining = deadline - time.perf_counter()
+	if not all_patterns or remaining < MIN_SOLVER_SECONDS:
+		return None
+
+	cover_and_trim = _needs_cover_and_trim(allow_overproduction, report)
+	capped = _generation_capped(report)
+	solution = _solve_cutting_problem(
+		all_patterns,
+		stock_data,
+		parts_data,
+		allow_overproduction or cover_and_trim,
+		time_limit=remaining,
+		hint_patterns=hints,
+		pattern_set_complete=not capped,
+	)
+	if solution and cover_and_trim:
+		solution = _trim_overproduction(solution, stock_data, parts_data, saw_kerf)
+	if solution and capped:
+		solution.update(engine="heuristic", proven_optimal=False)
+	return solution
+
+
+def _objective(solution, stock_data):
+	weights = _stock_objective_weights(stock_data)
+	return sum(pattern["usage_count"] * weights[pattern["stock_id_used"]] for pattern in solution["patterns"])
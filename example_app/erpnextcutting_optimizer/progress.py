@@ -0,0 +1,142 @@
+#
+# 1D Cutting Optimizer - Progress Reporting
+#
+# A large profile spends minutes generating patterns, building the model and
+# drawing the report, and a progress bar that only moves between profiles looks
+# frozen. The optimizer core and the PDF generator report stage events
+# (`stage`, `done`, `total`) to a listener; JobProgress places them within
+# the current profile's share of the job's bar and publishes them at most once
+# per PROGRESS_INTERVAL_SECONDS, keeping only the latest event in between.
+#
+# Realtime updates can only be published from the job's own thread, which a
+# CP-SAT solve would block for its whole run. So the job runs the solve and
+# the rendering in a helper thread (JobProgress.run) and keeps publishing.
+#
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+PROGRESS_INTERVAL_SECONDS = 1.0
+# Share of a profile's progress band covered by each stage.
+STAGE_BANDS = {
+	"patterns": (0.0, 0.4),
+	"model": (0.4, 0.5),
+	"solve": (0.5, 0.7),
+	"setups": (0.7, 0.8),
+	"pdf": (0.8, 1.0),
+}
+STAGE_LABELS = {
+	"patterns": "generating patterns",
+	"model": "building the model",
+	"solve": "solving",
+	"setups": "minimizing saw setups",
+	"pdf": "drawing the report",
+}
+
+# The listener of the optimization running in this context (see `reporting_progress`).
+_listener = ContextVar("cutting_optimizer_progress_listener", default=None)
+
+
+@contextmanager
+def reporting_progress(listener):
+	"""Sends the stage events of the optimizer core to `listener` within this block."""
+	token = _listener.set(listener)
+	try:
+		yield
+	finally:
+		_listener.reset(token)
+
+
+def with_progress_listener(fn):
+	"""Wraps `fn` to report to the current listener when it runs in another thread."""
+	listener = _listener.get()
+
+	def run(*args, **kwargs):
+		with reporting_progress(listener):
+			return fn(*args, **kwargs)
+
+	return run
+
+
+def progress_enabled():
+	return _listener.get() is not None
+
+
+def report_progress(stage, done, total=None):
+	"""A stage event: `done` of `total` (None when unknown) units of `stage`."""
+	listener = _listener.get()
+	if listener is not None:
+		listener(stage, done, total)
+
+
+class JobProgress:
+	"""
+	A progress listener for a background job. `publish(percent, message)` is
+	called with the latest event at most once per `min_interval` seconds, and
+	only from the thread that created the JobProgress; events from other
+	threads wait for it (see `run`).
+	"""
+
+	def __init__(self, publish, min_interval=PROGRESS_INTERVAL_SECONDS):
+		self._publish = publish
+		self._min_interval = min_interval
+		self._owner = threading.get_ident()
+		self._lock = threading.Lock()
+		self._band = (0, 100)
+		self._label = ""
+		self._pending = None
+		self._last_publish = None
+		self._percent = 0
+
+	def begin(self, start, end, label):
+		"""Starts a step spanning `start`..`end` percent, e.g. the next profile."""
+		with self._lock:
+			self._band = (start, end)
+			self._label = label
+			self._percent = start
+			self._pending = (start, label)
+		self._publish_if_due()
+
+	def __call__(self, stage, done, total=None):
+		with self._lock:
+			low, high = STAGE_BANDS.get(stage, (0.0, 1.0))
+			fraction = min(1.0, done / total) if total else 0.0
+			start, end = self._band
+			# Engines that solve in rounds restart their stages; the bar never moves back.
+			self._percent = max(self._percent, int(start + (end - start) * (low + (high - low) * fraction)))
+			if total:
+				detail = f"{done:,} of {'~' if stage == 'patterns' else ''}{total:,}"
+			else:
+				detail = f"{done:,}" if done else ""
+			message = f"{self._label}: {STAGE_LABELS.get(stage, stage)}" + (f" ({detail})" if detail else "")
+			self._pending = (self._percent, message)
+		self._publish_if_due()
+
+	def run(self, fn, *args, **kwargs):
+		"""
+		Calls `fn(*args, **kwargs)` in a helper thread and returns its result,
+		publishing the events it reports from this thread in the meantime.
+		`fn` must not need the Frappe context of this thread.
+		"""
+		with ThreadPoolExecutor(max_workers=1, thread_name_prefix="optimizer-progress") as executor:
+			future = executor.submit(fn, *args, **kwargs)
+			while not future.done():
+				wait([future], timeout=max(0.05, self._min_interval - self._elapsed()))
+				self._publish_if_due()
+			return future.result()
+
+	def _publish_if_due(self):
+		if threading.get_ident() != self._owner:
+			return
+		with self._lock:
+			pending = self._pending if self._elapsed() >= self._min_interval else None
+			if pending:
+				self._pending = None
+				self._last_publish = time.monotonic()
+		if pending:
+			self._publish(*pending)
+
+	def _elapsed(self):
+		return float("inf") if self._last_publish is None else time.monotonic() - self._last_publish
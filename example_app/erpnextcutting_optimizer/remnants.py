@@ -0,0 +1,149 @@
+#
+# 1D Cutting Optimizer - Remnant Inventory Index
+#
+# Offcuts long enough to be cut again are kept per item as "Cutting Remnant"
+# records. A job loads the available ones into a sorted length index, feeds
+# them to the optimizer as extra stock entries with `available` limits, and
+# afterwards picks the concrete remnants to consume by best fit. Lookups are
+# binary searches, so shelves with tens of thousands of remnants stay cheap.
+#
+from bisect import bisect_left, bisect_right
+
+DEFAULT_MIN_REMNANT_LENGTH_MM = 300
+# Remnants are offered to the optimizer in length buckets of this size (rounded
+# down), keeping the number of extra stock entries and pattern sets small.
+REMNANT_BUCKET_MM = 50
+MAX_REMNANT_STOCK_TYPES = 12
+REMNANT_STOCK_PREFIX = "remnant"
+
+
+class RemnantIndex:
+	"""
+	Available remnants of one item, as parallel lists sorted by length.
+	`best_fit(length)` returns the shortest remnant at least `length` long.
+	"""
+
+	def __init__(self, remnants=()):
+		"""`remnants` is an iterable of (name, length) pairs, in any order."""
+		ordered = sorted(remnants, key=lambda remnant: remnant[1])
+		self._names = [name for name, _ in ordered]
+		self._lengths = [length for _, length in ordered]
+		self._length_by_name = dict(ordered)
+
+	def __len__(self):
+		return len(self._lengths)
+
+	def add(self, name, length):
+		i = bisect_right(self._lengths, length)
+		self._lengths.insert(i, length)
+		self._names.insert(i, name)
+		self._length_by_name[name] = length
+
+	def remove(self, name):
+		length = self._length_by_name.pop(name, None)
+		if length is None:
+			return False
+		i = bisect_left(self._lengths, length)
+		while self._names[i] != name:
+			i += 1
+		del self._lengths[i]
+		del self._names[i]
+		return True
+
+	def best_fit(self, length):
+		"""Returns `(name, length)` of the shortest remnant of at least `length`, or None."""
+		i = bisect_left(self._lengths, length)
+		if i == len(self._lengths):
+			return None
+		return self._names[i], self._lengths[i]
+
+	def take_best_fit(self, length):
+		i = bisect_left(self._lengths, length)
+		if i == len(self._lengths):
+			return None
+		name = self._names.pop(i)
+		del self._length_by_name[name]
+		return name, self._lengths.pop(i)
+
+	def as_stock_data(
+		self,
+		item_code,
+		min_length,
+		max_length,
+		weight_per_mm=0,
+		bucket=REMNANT_BUCKET_MM,
+		max_types=MAX_REMNANT_STOCK_TYPES,
+	):
+		"""
+		Stock entries for the remnants usable on a job: lengths from the
+		shortest part (`min_length`) up to, but excluding, the fresh stock
+		length. Remnants are grouped into buckets rounded down to `bucket` mm
+		and only the `max_types` longest buckets are offered.
+		"""
+		stock_data = {}
+		upper = bisect_left(self._lengths, max_length)
+		lower = bisect_left(self._lengths, min_length)
+		i = upper
+		while i > lower and len(stock_data) < max_types:
+			bucket_length = max(min_length, (self._lengths[i - 1] // bucket) * bucket)
+			start = bisect_left(self._lengths, bucket_length, lower, i)
+			stock_data[remnant_stock_id(item_code, bucket_length)] = {
+				"length": bucket_length,
+				"available": i - start,
+				"remnant": True,
+				"cost": 0,
+				"weight": bucket_length * weight_per_mm,
+			}
+			i = start
+		return stock_data
+
+	def allocate(self, solution, stock_data):
+		"""
+		Picks the remnants a solution cuts, shortest fitting first, and removes
+		them from the index. Returns a list of (name, length, stock_id).
+		"""
+		allocated = []
+		for stock_id, bars in solution.get("total_stock_items_used", {}).items():
+			stock_info = stock_data.get(stock_id, {})
+			if not stock_info.get("remnant"):
+				continue
+			for _ in range(bars):
+				remnant = self.take_best_fit(stock_info["length"])
+				if remnant is None:
+					break
+				allocated.append((*remnant, stock_id))
+		return allocated
+
+
+def remnant_stock_id(item_code, length):
+	return f"{REMNANT_STOCK_PREFIX}-{item_code}-{length:g}"
+
+
+def usable_offcuts(solution, saw_kerf, min_length=DEFAULT_MIN_REMNANT_LENGTH_MM, bar_lengths=None):
+	"""
+	Offcut lengths left by a solution that are worth keeping, one entry per
+	bar. A pattern's waste already excludes the kerf of the cut that
+	separates the offcut from the last piece.
+
+	`bar_lengths` maps a stock id to the actual lengths of the bars cut from
+	it, e.g. the remnants consumed for a length bucket, which are longer than
+	the bucket. Their offcuts are measured from those lengths.
+	"""
+	bar_lengths = {stock_id: list(lengths) for stock_id, lengths in (bar_lengths or {}).items()}
+	offcuts = []
+	for pattern in solution.get("patterns", []):
+		actual_lengths = bar_lengths.get(pattern["stock_id_used"], [])
+		for _ in range(pattern.get("usage_count", 1)):
+			if actual_lengths:
+				# On the actual bar, the cut after the last piece is always made.
+				length = max(
+					0,
+					actual_lengths.pop()
+					- pattern.get("total_parts_length_in_pattern", 0)
+					- pattern.get("num_cuts_in_pattern", 0) * saw_kerf,
+				)
+			else:
+				length = pattern.get("waste_length_in_pattern", 0)
+			if length >= min_length:
+				offcuts.append(length)
+	return offcuts
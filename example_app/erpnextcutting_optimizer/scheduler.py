@@ -0,0 +1,70 @@
+#
+# 1D Cutting Optimizer - Job Scheduling & CPU Budgeting
+#
+# Optimization jobs run on their own RQ queue so they cannot starve the
+# shared `long` queue. Small jobs, the ones a user sits waiting for, are put
+# at the front of it. Each running job gets a share of the machine's cores
+# as its CP-SAT thread budget, recomputed from the number of running jobs
+# before every profile, so concurrent jobs do not oversubscribe the box.
+#
+import math
+import os
+
+OPTIMIZER_QUEUE = "optimizer"
+FALLBACK_QUEUE = "long"
+JOB_TIMEOUT_SECONDS = 1500
+
+DEFAULT_SCHEDULER_SETTINGS = {
+	# Jobs with at most this many pieces over all profiles jump the queue.
+	"interactive_max_pieces": 500,
+	# Cores left free for the web workers and other queues.
+	"reserved_cores": 1,
+	"max_solver_threads": 8,
+}
+
+# Wait times kept for the metrics, newest first.
+WAIT_TIME_SAMPLES = 200
+
+
+def scheduler_settings(overrides=None):
+	return {**DEFAULT_SCHEDULER_SETTINGS, **(overrides or {})}
+
+
+def job_size(config):
+	"""Number of profiles and of pieces to cut over all profiles of a job config."""
+	profiles = config.get("profiles", {})
+	pieces = sum(
+		int(part.get("demand", 0) or 0) for profile in profiles.values() for part in profile.get("parts", [])
+	)
+	return {"profiles": len(profiles), "pieces": pieces}
+
+
+def is_interactive(size, settings=None):
+	return size["pieces"] <= scheduler_settings(settings)["interactive_max_pieces"]
+
+
+def thread_budget(running_jobs, cpu_count=None, settings=None):
+	"""
+	Solver threads for one job while `running_jobs` jobs (including it) run:
+	an even share of the unreserved cores, at least 1 and at most
+	`max_solver_threads`.
+	"""
+	settings = scheduler_settings(settings)
+	cpu_count = cpu_count or os.cpu_count() or 1
+	available = max(1, cpu_count - settings["reserved_cores"])
+	share = available // max(1, running_jobs)
+	return max(1, min(settings["max_solver_threads"], share))
+
+
+def summarize_wait_times(wait_times):
+	"""Count, mean, 95th percentile and maximum of queue wait times in seconds."""
+	if not wait_times:
+		return {"count": 0, "mean": None, "p95": None, "max": None}
+	ordered = sorted(wait_times)
+	p95 = ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+	return {
+		"count": len(ordered),
+		"mean": round(sum(ordered) / len(ordered), 3),
+		"p95": round(p95, 3),
+		"max": round(ordered[-1], 3),
+	}
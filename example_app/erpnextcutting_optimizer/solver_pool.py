@@ -0,0 +1,383 @@
+#
+# 1D Cutting Optimizer - Warm Solver Pool
+#
+# Every RQ job runs in a freshly forked work horse, so OR-Tools and reportlab
+# imports, font metrics and the pattern cache are rebuilt for each job and
+# thrown away after it. The solver pool is a long-lived supervisor with a few
+# pre-warmed worker processes accepting on one Unix socket. A job sends its
+# problems there and gets back the solution, the incumbents on the way (both as
+# interchange buffers, see interchange.py) and rendered PDFs; the caches live
+# as long as the workers do. Workers recycle themselves past a memory or request limit and the
+# supervisor starts replacements. Whenever the pool is not configured, not
+# running or dies mid-request, the job solves in-process instead. A busy pool
+# is not down: the job waits for a free worker (see SolverPoolBusy), and a
+# request that times out in a worker fails the job (see SolverPoolTimeout).
+#
+# Run it next to the bench workers, e.g. as a Procfile or supervisor entry:
+#
+#   python -m example_app.erpnextcutting_optimizer.solver_pool --socket /path/to/solver.sock --workers 2
+#
+import argparse
+import hashlib
+import logging
+import multiprocessing
+import os
+import pickle
+import resource
+import signal
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from multiprocessing.connection import Client, Listener
+
+from .interchange import InterchangeBuffer, InterchangeFormatError, encode_problem, encode_solution
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SETTINGS = {
+	"workers": 2,
+	# A worker finishing a request above this resident size exits and is replaced.
+	"max_rss_mb": 2048,
+	"max_requests": 500,
+	# How long a request waits for a free worker before SolverPoolBusy.
+	"accept_timeout_seconds": 1500,
+	"request_timeout_seconds": 1500,
+}
+SOLUTION_CACHE_SIZE = 32
+HEALTH_CHECK_INTERVAL_SECONDS = 5
+# The supervisor kills a worker that grows past this multiple of `max_rss_mb`
+# while busy, since it cannot recycle itself before the request ends.
+RSS_KILL_FACTOR = 2
+
+
+class SolverPoolUnavailable(Exception):
+	"""The pool cannot take the request; the caller should work in-process."""
+
+
+class SolverPoolBusy(Exception):
+	"""
+	The supervisor is up but no worker freed up within
+	`accept_timeout_seconds`. Solving in-process would only add to the load
+	the pool is sized for, so the caller should not.
+	"""
+
+
+class SolverPoolError(RuntimeError):
+	"""The request failed inside the pool worker."""
+
+
+class SolverPoolTimeout(SolverPoolError):
+	"""
+	A worker took the request but did not answer within
+	`request_timeout_seconds`. It may still be solving, so the caller must not
+	start the same work again in-process.
+	"""
+
+
+def pool_settings(overrides=None):
+	return {**DEFAULT_POOL_SETTINGS, **(overrides or {})}
+
+
+# --- Client ---------------------------------------------------------------
+
+
+def solve_in_pool(
+	settings,
+	stock_data,
+	parts_data,
+	saw_kerf,
+	on_incumbent=None,
+	num_workers=None,
+	pattern_cache=None,
+	on_progress=None,
+	**options,
+):
+	"""
+	Runs `run_1d_optimizer(stock_data, parts_data, saw_kerf, **options)` in a
+	pool worker and returns its solution. `on_incumbent` and `on_progress`
+	are called here with the incumbents and progress events the worker
+	reports; `num_workers` is the CP-SAT thread budget and `pattern_cache`
+	the cache limits to apply in the worker.
+	"""
+	try:
+		problem = encode_problem(stock_data, parts_data, saw_kerf)
+	except InterchangeFormatError as e:
+		raise SolverPoolUnavailable(f"Problem cannot be sent to the solver pool: {e}") from e
+	request = {
+		"op": "solve",
+		"problem": problem,
+		"options": options,
+		"num_workers": num_workers,
+		"pattern_cache": pattern_cache,
+		"incumbents": on_incumbent is not None,
+		"progress": on_progress is not None,
+	}
+	if on_incumbent:
+		report_incumbent = on_incumbent
+
+		def on_incumbent(buffer):
+			report_incumbent(InterchangeBuffer(buffer).solution())
+
+	buffer = _request(settings, request, on_incumbent, on_progress)
+	return InterchangeBuffer(buffer).solution() if buffer else None
+
+
+def render_pdf_in_pool(settings, generator_kwargs, on_progress=None):
+	"""Renders a OneDCuttingPDFGenerator report in a pool worker and returns the PDF bytes."""
+	request = {"op": "render_pdf", "kwargs": generator_kwargs, "progress": on_progress is not None}
+	return _request(settings, request, on_progress=on_progress)
+
+
+def ping(settings):
+	"""Health check: the answering worker's pid, uptime, requests served and resident size."""
+	return _request(settings, {"op": "ping"})
+
+
+def _request(settings, request, on_incumbent=None, on_progress=None):
+	settings = pool_settings(settings)
+	try:
+		conn = Client(settings["socket"], family="AF_UNIX")
+	except (OSError, KeyError) as e:
+		raise SolverPoolUnavailable(f"Solver pool not reachable: {e}") from e
+
+	with conn:
+		try:
+			# A worker greets a connection as soon as it accepts it.
+			if not conn.poll(settings["accept_timeout_seconds"]):
+				raise SolverPoolBusy("No solver pool worker is free")
+			conn.recv()
+			conn.send(request)
+			deadline = time.monotonic() + settings["request_timeout_seconds"]
+			while True:
+				if not conn.poll(max(0, deadline - time.monotonic())):
+					raise SolverPoolTimeout("Solver pool request timed out")
+				message = conn.recv()
+				if message["type"] == "incumbent":
+					if on_incumbent:
+						on_incumbent(message["solution"])
+				elif message["type"] == "progress":
+					if on_progress:
+						on_progress(*message["event"])
+				elif message["type"] == "error":
+					raise SolverPoolError(f"{message['error']}\n{message['traceback']}")
+				else:
+					return message["value"]
+		except (EOFError, OSError) as e:
+			raise SolverPoolUnavailable(f"Solver pool worker went away: {e}") from e
+
+
+# --- Worker ---------------------------------------------------------------
+
+
+class _Worker:
+	def __init__(self, settings):
+		self.settings = settings
+		self.started = time.monotonic()
+		self.requests = 0
+		self._solutions = OrderedDict()
+		self._send_lock = threading.Lock()
+
+	def warm_up(self):
+		"""Imports the solver stack and loads the report fonts before the first request."""
+		from .optimizer_core import run_1d_optimizer
+
+		run_1d_optimizer({"warm": {"length": 100}}, [{"length": 40, "demand": 2}], 1)
+		self._render_pdf(
+			{
+				"stock_data": {},
+				"parts_data": [],
+				"all_patterns_dict": {},
+				"solution_details_list": [],
+				"parts_production_summary_list": [],
+			}
+		)
+
+	def serve(self, listener):
+		while True:
+			try:
+				conn = listener.accept()
+			except OSError:
+				# The listener is gone; the supervisor replaces this worker.
+				return
+			with conn:
+				self._serve_connection(conn)
+			self.requests += 1
+			if self.requests >= self.settings["max_requests"] or _rss_mb() > self.settings["max_rss_mb"]:
+				logger.info("Solver pool worker %s recycling after %s requests", os.getpid(), self.requests)
+				return
+
+	def _serve_connection(self, conn):
+		try:
+			conn.send({"type": "hello", "pid": os.getpid()})
+			request = conn.recv()
+		except (EOFError, OSError):
+			# The client gave up waiting for a free worker.
+			return
+		try:
+			value = getattr(self, f"_op_{request['op']}")(conn, request)
+			message = {"type": "result", "value": value}
+		except Exception as e:
+			message = {"type": "error", "error": str(e), "traceback": traceback.format_exc()}
+		self._send(conn, message)
+
+	def _op_ping(self, conn, request):
+		return {
+			"pid": os.getpid(),
+			"uptime_seconds": round(time.monotonic() - self.started, 1),
+			"requests": self.requests,
+			"rss_mb": round(_rss_mb(), 1),
+		}
+
+	def _op_solve(self, conn, request):
+		from .optimizer_core import configure_solver_threads, run_1d_optimizer
+		from .pattern_cache import configure_pattern_cache
+
+		stock_data, parts_data, saw_kerf = InterchangeBuffer(request["problem"]).problem()
+		# Identical problems (reruns, previews of the same order) are answered from memory.
+		key = hashlib.sha1(request["problem"] + pickle.dumps(sorted(request["options"].items()))).hexdigest()
+		if key in self._solutions:
+			self._solutions.move_to_end(key)
+			return self._solutions[key]
+
+		configure_solver_threads(request["num_workers"])
+		if request["pattern_cache"]:
+			configure_pattern_cache(**request["pattern_cache"])
+
+		def send_incumbent(solution):
+			self._send(
+				conn,
+				{
+					"type": "incumbent",
+					"solution": encode_solution(solution, stock_data, parts_data, saw_kerf),
+				},
+			)
+
+		solution = run_1d_optimizer(
+			stock_data,
+			parts_data,
+			saw_kerf,
+			on_incumbent=send_incumbent if request["incumbents"] else None,
+			on_progress=self._progress_sender(conn) if request["progress"] else None,
+			**request["options"],
+		)
+		buffer = encode_solution(solution, stock_data, parts_data, saw_kerf) if solution else None
+		self._solutions[key] = buffer
+		while len(self._solutions) > SOLUTION_CACHE_SIZE:
+			self._solutions.popitem(last=False)
+		return buffer
+
+	def _op_render_pdf(self, conn, request):
+		on_progress = self._progress_sender(conn) if request["progress"] else None
+		return self._render_pdf(request["kwargs"], on_progress)
+
+	def _render_pdf(self, kwargs, on_progress=None):
+		from .pdf_generator_1d import OneDCuttingPDFGenerator
+
+		return OneDCuttingPDFGenerator(**kwargs, on_progress=on_progress).generate_pdf().getvalue()
+
+	def _progress_sender(self, conn):
+		return lambda stage, done, total=None: self._send(
+			conn, {"type": "progress", "event": (stage, done, total)}
+		)
+
+	def _send(self, conn, message):
+		"""Sends a message unless the client is gone; solver threads call this too."""
+		try:
+			with self._send_lock:
+				conn.send(message)
+		except (EOFError, OSError):
+			pass
+
+
+def _worker_main(listener, settings):
+	# The supervisor handles termination; workers just stop with it.
+	signal.signal(signal.SIGTERM, signal.SIG_DFL)
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	worker = _Worker(settings)
+	worker.warm_up()
+	worker.serve(listener)
+
+
+def _rss_mb(pid=None):
+	"""Current resident set size in MiB, from /proc where available."""
+	try:
+		with open(f"/proc/{pid or 'self'}/statm") as f:
+			return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+	except (OSError, ValueError, IndexError):
+		if pid:
+			return 0.0
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# --- Supervisor -----------------------------------------------------------
+
+
+def serve(settings):
+	"""
+	Runs the pool until SIGTERM or SIGINT: keeps `workers` warm worker
+	processes accepting on `socket`, replacing those that exit and killing
+	those that outgrow RSS_KILL_FACTOR x `max_rss_mb`.
+	"""
+	settings = pool_settings(settings)
+	address = settings["socket"]
+	if os.path.exists(address):
+		os.remove(address)
+	# The socket takes pickles; only the bench user may connect, from the
+	# moment it is bound.
+	umask = os.umask(0o177)
+	try:
+		listener = Listener(address, family="AF_UNIX")
+	finally:
+		os.umask(umask)
+
+	context = multiprocessing.get_context("fork")
+	workers = []
+	stopping = threading.Event()
+	for signum in (signal.SIGTERM, signal.SIGINT):
+		signal.signal(signum, lambda *args: stopping.set())
+
+	try:
+		while not stopping.is_set():
+			for process in list(workers):
+				if not process.is_alive():
+					process.join()
+					workers.remove(process)
+				elif _rss_mb(process.pid) > RSS_KILL_FACTOR * settings["max_rss_mb"]:
+					logger.warning("Killing solver pool worker %s above its memory limit", process.pid)
+					process.kill()
+			while len(workers) < settings["workers"]:
+				process = context.Process(target=_worker_main, args=(listener, settings), daemon=True)
+				process.start()
+				workers.append(process)
+			stopping.wait(HEALTH_CHECK_INTERVAL_SECONDS)
+	finally:
+		for process in workers:
+			process.terminate()
+		for process in workers:
+			process.join(timeout=10)
+		listener.close()
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Run the warm solver pool for optimization jobs.")
+	parser.add_argument(
+		"--socket", required=True, help="Unix socket path, as in cutting_optimizer_solver_pool"
+	)
+	parser.add_argument("--workers", type=int, default=DEFAULT_POOL_SETTINGS["workers"])
+	parser.add_argument("--max-rss-mb", type=float, default=DEFAULT_POOL_SETTINGS["max_rss_mb"])
+	parser.add_argument("--max-requests", type=int, default=DEFAULT_POOL_SETTINGS["max_requests"])
+	args = parser.parse_args(argv)
+	logging.basicConfig(level=logging.INFO)
+	serve(
+		{
+			"socket": args.socket,
+			"workers": args.workers,
+			"max_rss_mb": args.max_rss_mb,
+			"max_requests": args.max_requests,
+		}
+	)
+
+
+if __name__ == "__main__":
+	main()
@@ -147,6 +147,13 @@ after_install = "example_app.setup.after_install"
 # 	}
 # }
 
+doc_events = {
+	"Item": {
+		"on_update": "example_app.erpnextcutting_optimizer.api.invalidate_item_profile_cache",
+		"on_trash": "example_app.erpnextcutting_optimizer.api.invalidate_item_profile_cache"
+	}
+}
+
 # Scheduled Tasks
 # ---------------
 
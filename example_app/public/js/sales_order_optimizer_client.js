@@ -39,7 +39,11 @@ function get_initial_config() {
         profiles: {}, // Keyed by item_code. Stores parts lists and settings for each profile.
         settings: {
             saw_kerf: 3.0, // Global setting for saw kerf.
-            allow_overproduction: 0
+            allow_overproduction: 0,
+            use_remnants: 1, // Cut from shelved offcuts before fresh bars.
+            min_remnant_length_mm: 300, // Shorter offcuts are not kept as remnants.
+            objective: 'auto', // What to minimize across stock lengths: auto, cost, material or bars.
+            minimize_setups: 0 // Then minimize distinct patterns (saw setups) at that stock usage.
         },
         results: {} // To store the output from the optimizer.
     };
@@ -83,61 +87,47 @@ function save_config_to_form(frm, config) {
 async function sync_config_with_so_items(frm, config) {
     const so_item_codes = new Set(frm.doc.items.map(item => item.item_code).filter(Boolean));
 
-    for (const item_code of so_item_codes) {
-        if (!config.profiles[item_code]) {
-            try {
-                const item_doc = await frappe.db.get_doc('Item', item_code);
-
-                // Exclude items from the 'Services' group from being added as profiles
-                if (item_doc.item_group === 'Services') {
-                    continue;
-                }
-                
-                let length_in_meters = 0;
-                
-                if (item_doc.uoms && item_doc.uoms.length) {
-                    const ks_uom_entry = item_doc.uoms.find(uom => uom.uom === 'ks');
-                    if (ks_uom_entry) {
-                        length_in_meters = ks_uom_entry.conversion_factor;
-                    }
-                }
+    // One round-trip for the attributes of every item on the order.
+    let attributes = {};
+    try {
+        const r = await frappe.call({
+            method: 'example_app.erpnextcutting_optimizer.api.get_item_profile_attributes',
+            args: { item_codes: Array.from(so_item_codes) }
+        });
+        attributes = r.message || {};
+    } catch (e) {
+        console.error("Failed to fetch item details for the optimizer", e);
+        return;
+    }
 
-                config.profiles[item_code] = {
-                    item_code: item_code,
-                    stock_length_mm: length_in_meters > 0 ? length_in_meters * 1000 : 6000,
-                    cost_per_meter: item_doc.valuation_rate || 0,
-                    weight_per_meter: item_doc.weight_per_unit || 0,
-                    cost_per_piece: (item_doc.valuation_rate || 0) * (length_in_meters || 1),
-                    weight_per_piece: (item_doc.weight_per_unit || 0) * (length_in_meters || 1),
-                    parts: [],
-                    solution: {}
-                };
-            } catch (e) {
-                console.error("Failed to fetch item details for", item_code, e);
-            }
+    for (const item_code of so_item_codes) {
+        const item = attributes[item_code];
+        // Exclude items from the 'Services' group from being added as profiles
+        if (config.profiles[item_code] || !item || item.item_group === 'Services') {
+            continue;
         }
+
+        const length_in_meters = item.length_in_meters || 0;
+        config.profiles[item_code] = {
+            item_code: item_code,
+            stock_length_mm: length_in_meters > 0 ? length_in_meters * 1000 : 6000,
+            cost_per_meter: item.valuation_rate || 0,
+            weight_per_meter: item.weight_per_unit || 0,
+            cost_per_piece: (item.valuation_rate || 0) * (length_in_meters || 1),
+            weight_per_piece: (item.weight_per_unit || 0) * (length_in_meters || 1),
+            parts: [],
+            solution: {}
+        };
     }
 
     // --- Cleanup Logic ---
     // Iterate over a copy of the keys, as we might modify the object.
     const profiles_to_check = Object.keys(config.profiles);
     for (const item_code of profiles_to_check) {
-        // Condition 1: Item was removed from the sales order grid.
-        if (!so_item_codes.has(item_code)) {
+        const item = attributes[item_code];
+        // Remove items that left the sales order grid, no longer exist, or are service items.
+        if (!so_item_codes.has(item_code) || !item || item.item_group === 'Services') {
             delete config.profiles[item_code];
-            continue; // Go to next item
-        }
-
-        // Condition 2: Item is a service item and should be removed.
-        try {
-            const item_doc = await frappe.db.get_doc('Item', item_code);
-            if (item_doc.item_group === 'Services') {
-                delete config.profiles[item_code];
-            }
-        } catch (e) {
-            // If the item doesn't exist, it should be removed anyway.
-            delete config.profiles[item_code];
-            console.error("Could not verify item group for", item_code, e);
         }
     }
 }
@@ -174,6 +164,39 @@ async function show_master_optimizer_dialog(frm) {
                 description: 'If checked, the optimizer can produce more parts than demanded to minimize waste.',
                 onchange: () => config.settings.allow_overproduction = dialog.get_value('allow_overproduction')
             },
+            {
+                label: 'Minimize',
+                fieldname: 'objective',
+                fieldtype: 'Select',
+                options: 'auto\ncost\nmaterial\nbars',
+                default: config.settings.objective || 'auto',
+                description: 'With several stock lengths: stock cost, material length or bar count. "auto" uses cost when known.',
+                onchange: () => config.settings.objective = dialog.get_value('objective')
+            },
+            {
+                label: 'Minimize Saw Setups',
+                fieldname: 'minimize_setups',
+                fieldtype: 'Check',
+                default: config.settings.minimize_setups || 0,
+                description: 'If checked, the plan keeps its stock usage and uses as few distinct patterns as possible, each one saw setup. Takes up to 10 s more per profile.',
+                onchange: () => config.settings.minimize_setups = dialog.get_value('minimize_setups')
+            },
+            {
+                label: 'Use Remnants',
+                fieldname: 'use_remnants',
+                fieldtype: 'Check',
+                default: config.settings.use_remnants ?? 1,
+                description: 'If checked, available offcuts of each profile are cut before fresh stock, and new usable offcuts are registered as remnants.',
+                onchange: () => config.settings.use_remnants = dialog.get_value('use_remnants')
+            },
+            {
+                label: 'Minimum Remnant Length (mm)',
+                fieldname: 'min_remnant_length_mm',
+                fieldtype: 'Float',
+                default: config.settings.min_remnant_length_mm ?? 300,
+                depends_on: 'use_remnants',
+                onchange: () => config.settings.min_remnant_length_mm = dialog.get_value('min_remnant_length_mm')
+            },
             {
                 fieldtype: 'Section Break',
                 label: __('Profiles to Optimize')
@@ -269,7 +292,7 @@ function render_profiles_html(dialog, frm, config) {
         const item_code = $(this).data('item-code');
         show_parts_entry_dialog(config.profiles[item_code], () => {
             render_profiles_html(dialog, frm, config); // Re-render to update summary.
-        });
+        }, config.settings);
     });
 }
 
@@ -282,8 +305,9 @@ function render_profiles_html(dialog, frm, config) {
  * Shows the detail dialog for defining the parts to be cut from a single profile.
  * @param {object} profile_config - The specific profile object from the main config.
  * @param {function} on_save_callback - A function to call after parts are confirmed, to refresh the master view.
+ * @param {object} settings - The optimizer settings (kerf, overproduction, objective), used by the preview.
  */
-function show_parts_entry_dialog(profile_config, on_save_callback) {
+function show_parts_entry_dialog(profile_config, on_save_callback, settings) {
     const parts_dialog = new frappe.ui.Dialog({
         title: `Define Cuts for: ${profile_config.item_code}`,
         fields: [
@@ -295,6 +319,13 @@ function show_parts_entry_dialog(profile_config, on_save_callback) {
                 reqd: 1,
                 description: "The length of a single raw material bar for this profile."
             },
+            {
+                label: 'Alternative Stock Lengths (mm)',
+                fieldname: 'alternative_stock_lengths_mm',
+                fieldtype: 'Data',
+                default: (profile_config.alternative_stock_lengths_mm || []).join(', '),
+                description: "Optional, comma separated, e.g. 6500, 7000. The optimizer may mix all stock lengths."
+            },
             {
                 fieldname: 'parts_table',
                 fieldtype: 'Table',
@@ -304,19 +335,156 @@ function show_parts_entry_dialog(profile_config, on_save_callback) {
                     { label: 'Required Qty', fieldname: 'demand', fieldtype: 'Int', in_list_view: 1, reqd: 1 }
                 ],
                 data: profile_config.parts || []
+            },
+            {
+                fieldtype: 'Section Break',
+                label: __('Preview')
+            },
+            {
+                fieldname: 'preview_html',
+                fieldtype: 'HTML'
             }
         ],
         primary_action_label: __('Confirm Parts'),
         primary_action: (values) => {
-            profile_config.stock_length_mm = values.stock_length_mm;
-            profile_config.parts = values.parts_table || []; // Ensure it's an array
+            Object.assign(profile_config, read_parts_dialog_values(values));
             parts_dialog.hide();
             on_save_callback();
-        }
+        },
+        secondary_action_label: __('Preview Plan'),
+        secondary_action: () => {
+            const values = read_parts_dialog_values(parts_dialog.get_values(true) || {});
+            preview_profile(
+                { ...profile_config, ...values },
+                settings || {},
+                parts_dialog.get_field('preview_html').$wrapper
+            );
+        },
+        size: 'large'
     });
     parts_dialog.show();
 }
 
+/**
+ * Reads the stock lengths and parts of the parts entry dialog into profile fields.
+ * @param {object} values - The dialog values.
+ */
+function read_parts_dialog_values(values) {
+    return {
+        stock_length_mm: values.stock_length_mm,
+        alternative_stock_lengths_mm: (values.alternative_stock_lengths_mm || '')
+            .split(',')
+            .map(length => parseFloat(length))
+            .filter(length => length > 0),
+        parts: values.parts_table || [] // Ensure it's an array
+    };
+}
+
+
+// =================================================================================================
+// 4a. PREVIEW (Inline fast solve, drawn as SVG)
+// =================================================================================================
+
+const PREVIEW_MAX_PATTERNS = 25;
+const PREVIEW_BAR_WIDTH = 560;
+const PREVIEW_PIECE_COLORS = ['#5e64ff', '#28a745', '#ffa00a', '#e24c4c', '#7575ff', '#36b37e', '#f5a623', '#8d99a6'];
+// Numbers the pattern SVGs, so the id of each one's waste hatch is unique on the page.
+let preview_svg_count = 0;
+
+/**
+ * Asks the backend for a quick, time-boxed plan of one profile and draws it into `wrapper`.
+ * @param {object} profile - The profile with stock_length_mm, alternative_stock_lengths_mm and parts.
+ * @param {object} settings - The optimizer settings.
+ * @param {object} wrapper - jQuery element to draw into.
+ */
+function preview_profile(profile, settings, wrapper) {
+    wrapper.html(`<p class="text-muted">${__('Computing preview...')}</p>`);
+    frappe.call({
+        method: 'example_app.erpnextcutting_optimizer.api.preview_profile_optimization',
+        args: { profile: profile, settings: settings },
+        callback: (r) => {
+            const preview = r.message || {};
+            if (preview.error) {
+                wrapper.html(`<p class="text-danger">${frappe.utils.escape_html(preview.error)}</p>`);
+                return;
+            }
+            wrapper.html(render_preview_html(preview));
+        }
+    });
+}
+
+/**
+ * The preview summary line plus one SVG bar diagram per pattern, most used first.
+ * @param {object} preview - The summary returned by preview_profile_optimization.
+ */
+function render_preview_html(preview) {
+    const patterns = preview.patterns.slice(0, PREVIEW_MAX_PATTERNS);
+    const max_stock_length = Math.max(...patterns.map(pattern => pattern.stock_length));
+    const colors = {};
+    for (const pattern of preview.patterns) {
+        for (const length of pattern.pieces) {
+            if (!(length in colors)) {
+                colors[length] = PREVIEW_PIECE_COLORS[Object.keys(colors).length % PREVIEW_PIECE_COLORS.length];
+            }
+        }
+    }
+
+    const summary = `
+        <p>
+            <strong>${preview.bars}</strong> bars,
+            yield <strong>${preview.yield_percentage}%</strong>,
+            waste ${Math.round(preview.waste_mm)} mm
+            <span class="text-muted">
+                (${preview.proven_optimal ? __('optimal') : __('quick estimate')}, ${preview.elapsed_ms} ms)
+            </span>
+        </p>`;
+    const more = preview.patterns.length > patterns.length
+        ? `<p class="text-muted">${__('{0} more patterns not shown.', [preview.patterns.length - patterns.length])}</p>`
+        : '';
+    return summary + patterns.map(pattern => render_pattern_svg(pattern, max_stock_length, colors)).join('') + more;
+}
+
+/**
+ * Draws one pattern as a bar: pieces in cutting order, kerfs as gaps and the waste hatched.
+ * @param {object} pattern - One pattern of the preview summary.
+ * @param {number} max_stock_length - The longest stock length shown, which spans the full width.
+ * @param {object} colors - Fill color per piece length.
+ */
+function render_pattern_svg(pattern, max_stock_length, colors) {
+    const scale = PREVIEW_BAR_WIDTH / max_stock_length;
+    const hatch_id = `preview-waste-${++preview_svg_count}`;
+    const kerf = pattern.pieces.length ? pattern.kerf / pattern.pieces.length : 0;
+    const height = 22;
+    let x = 0;
+    const pieces = pattern.pieces.map(length => {
+        const width = length * scale;
+        const label = width > 34 ? `<text x="${x + width / 2}" y="15" font-size="10" fill="#fff" text-anchor="middle">${length}</text>` : '';
+        const rect = `<rect x="${x}" y="0" width="${width}" height="${height}" fill="${colors[length]}"><title>${length} mm</title></rect>${label}`;
+        x += width + kerf * scale;
+        return rect;
+    }).join('');
+    const bar_width = pattern.stock_length * scale;
+    const waste_width = Math.max(0, bar_width - x);
+    const waste = waste_width > 0
+        ? `<rect x="${x}" y="0" width="${waste_width}" height="${height}" fill="url(#${hatch_id})"><title>${__('Waste')} ${Math.round(pattern.waste)} mm</title></rect>`
+        : '';
+
+    return `
+        <div style="display: flex; align-items: center; margin-bottom: 4px;">
+            <div style="width: 60px; text-align: right; padding-right: 8px;"><strong>${pattern.usage_count}&times;</strong></div>
+            <svg width="${PREVIEW_BAR_WIDTH}" height="${height}" xmlns="http://www.w3.org/2000/svg">
+                <defs>
+                    <pattern id="${hatch_id}" width="6" height="6" patternUnits="userSpaceOnUse" patternTransform="rotate(45)">
+                        <rect width="6" height="6" fill="#f0f0f0"/><line x1="0" y1="0" x2="0" y2="6" stroke="#c0c0c0" stroke-width="2"/>
+                    </pattern>
+                </defs>
+                <rect x="0" y="0" width="${bar_width}" height="${height}" fill="none" stroke="#8d99a6"/>
+                ${pieces}${waste}
+            </svg>
+            <div class="text-muted" style="padding-left: 8px;">${pattern.stock_length} mm</div>
+        </div>`;
+}
+
 
 // =================================================================================================
 // 5. BACKEND COMMUNICATION
@@ -13,7 +13,7 @@ def after_install():
 
 def install_dependencies():
     """Install required Python packages"""
-    packages = ["reportlab>=4.0.0", "ortools>=9.0.0"]
+    packages = ["reportlab>=4.0.0", "ortools>=9.0.0", "numpy>=1.21"]
     
     try:
         for package in packages:
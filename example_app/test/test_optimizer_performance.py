@@ -0,0 +1,98 @@
+# Timing budgets of the optimizer core on fixed instances.
+#
+# Each step is timed as the best of a few rounds with a cold pattern cache and
+# must stay within its budget, roughly ten times its time on a current laptop
+# core: loose enough for a busy CI runner, tight enough that an algorithmic
+# regression fails here rather than in production. Slower machines can scale
+# all budgets with CUTTING_OPTIMIZER_TIME_BUDGET_FACTOR.
+import os
+import random
+import time
+import unittest
+
+from example_app.erpnextcutting_optimizer.high_volume import best_fit_decreasing
+from example_app.erpnextcutting_optimizer.optimizer_core import (
+	_generate_all_patterns,
+	_solve_cutting_problem,
+	compute_solution_stats,
+	run_1d_optimizer,
+)
+from example_app.erpnextcutting_optimizer.pattern_cache import get_pattern_cache
+
+TIME_BUDGET_FACTOR = float(os.environ.get("CUTTING_OPTIMIZER_TIME_BUDGET_FACTOR", 1))
+ROUNDS = 3
+
+STOCK = {"S": {"length": 6000, "cost": 10, "weight": 18.0}}
+SAW_KERF = 3
+# Six part types: a few hundred patterns, solved to optimality by CP-SAT.
+SMALL_PARTS = [
+	{"length": length, "demand": demand}
+	for length, demand in [(2150, 14), (1730, 22), (1210, 31), (860, 12), (725, 25), (455, 19)]
+]
+# Ten part types: about 15,000 patterns to enumerate.
+MEDIUM_PARTS = SMALL_PARTS + [
+	{"length": length, "demand": demand} for length, demand in [(1420, 9), (980, 17), (610, 8), (330, 27)]
+]
+
+
+def _high_volume_parts():
+	rng = random.Random(7)
+	return [
+		{"length": length, "demand": rng.randint(2000, 40000)} for length in rng.sample(range(300, 2900), 8)
+	]
+
+
+class TestOptimizerPerformance(unittest.TestCase):
+	def assertWithinBudget(self, func, budget_seconds):
+		"""Runs `func` ROUNDS times and checks the fastest round; returns its last result."""
+		best = float("inf")
+		for _ in range(ROUNDS):
+			get_pattern_cache().clear()
+			started = time.perf_counter()
+			result = func()
+			best = min(best, time.perf_counter() - started)
+		budget = budget_seconds * TIME_BUDGET_FACTOR
+		self.assertLessEqual(best, budget, f"took {best:.3f}s, budget {budget:.3f}s")
+		return result
+
+	def test_pattern_generation(self):
+		patterns = self.assertWithinBudget(lambda: _generate_all_patterns(STOCK, MEDIUM_PARTS, SAW_KERF), 2.0)
+		self.assertGreater(len(patterns), 10_000)
+
+	def test_cutting_problem_solve(self):
+		patterns = _generate_all_patterns(STOCK, SMALL_PARTS, SAW_KERF)
+		solution = self.assertWithinBudget(
+			lambda: _solve_cutting_problem(patterns, STOCK, SMALL_PARTS, allow_overproduction=False), 1.0
+		)
+		self.assertIsNotNone(solution)
+
+	def test_enumeration_engine(self):
+		solution = self.assertWithinBudget(
+			lambda: run_1d_optimizer(STOCK, SMALL_PARTS, SAW_KERF, engine="enumeration"), 1.0
+		)
+		self.assertTrue(solution["proven_optimal"])
+
+	def test_column_generation_engine(self):
+		solution = self.assertWithinBudget(
+			lambda: run_1d_optimizer(STOCK, SMALL_PARTS, SAW_KERF, engine="column_generation"), 1.0
+		)
+		self.assertIsNotNone(solution)
+
+	def test_high_volume_engine(self):
+		parts_data = _high_volume_parts()
+		solution = self.assertWithinBudget(
+			lambda: run_1d_optimizer(STOCK, parts_data, SAW_KERF, engine="high_volume"), 2.0
+		)
+		self.assertEqual(
+			solution["total_parts_produced"], {f"{part['length']}": part["demand"] for part in parts_data}
+		)
+
+	def test_best_fit_decreasing(self):
+		parts_data = [
+			{"length": part["length"], "demand": part["demand"] * 8} for part in _high_volume_parts()
+		]
+		self.assertWithinBudget(lambda: best_fit_decreasing(STOCK, parts_data, SAW_KERF), 0.5)
+
+	def test_solution_stats(self):
+		solution = run_1d_optimizer(STOCK, _high_volume_parts(), SAW_KERF, engine="high_volume")
+		self.assertWithinBudget(lambda: compute_solution_stats(solution, STOCK, _high_volume_parts()), 0.05)
@@ -0,0 +1,172 @@
+# Property-based checks of every optimizer engine on random instances.
+#
+# Each solution must be a valid cutting plan for its instance (demand, stock
+# limits, waste and kerf accounting) and, on instances small enough to solve
+# by brute force, no engine may use fewer bars than the optimum and the exact
+# engines must reach it.
+import math
+import unittest
+from functools import cache
+
+from hypothesis import HealthCheck, given, note, settings
+from hypothesis import strategies as st
+
+from example_app.erpnextcutting_optimizer.engine_selection import ENGINES
+from example_app.erpnextcutting_optimizer.optimizer_core import run_1d_optimizer
+
+TOLERANCE = 1e-6
+# Engines that solve small instances to optimality over all patterns.
+EXACT_ENGINES = ("enumeration", "maximal", "portfolio")
+ENGINE_SETTINGS = settings(max_examples=15, deadline=None, suppress_health_check=[HealthCheck.too_slow])
+
+# Lengths in half millimetres, so sums are exact in floating point.
+lengths = st.integers(min_value=200, max_value=5000).map(lambda units: units / 2)
+kerfs = st.sampled_from([0, 2, 3.5, 5])
+
+
+@st.composite
+def instances(draw, max_part_types=5, max_demand=8):
+	"""A feasible instance: stock, parts with distinct lengths, kerf and overproduction flag."""
+	stock_length = draw(st.sampled_from([3000, 4500, 6000]))
+	stock_data = {"S": {"length": stock_length, "cost": 10, "weight": stock_length / 1000}}
+	if draw(st.booleans()):
+		# A remnant in limited supply.
+		stock_data["R1"] = {
+			"length": draw(st.integers(min_value=500, max_value=stock_length - 100)),
+			"available": draw(st.integers(min_value=1, max_value=3)),
+			"cost": 0,
+			"weight": 0.5,
+			"remnant": True,
+		}
+	# Every part fits the shortest stock length.
+	part_lengths = draw(st.lists(lengths, min_size=1, max_size=max_part_types, unique=True))
+	parts_data = [
+		{"length": length, "demand": draw(st.integers(min_value=1, max_value=max_demand))}
+		for length in part_lengths
+	]
+	return stock_data, parts_data, draw(kerfs), draw(st.booleans())
+
+
+class TestEngineProperties(unittest.TestCase):
+	def assertValidPlan(self, solution, stock_data, parts_data, saw_kerf, allow_overproduction):
+		self.assertIsNotNone(solution)
+		self.assertEqual(solution["status"], "Success")
+		demand = {f"{part['length']}": part["demand"] for part in parts_data}
+		length_by_part_id = {f"{part['length']}": part["length"] for part in parts_data}
+
+		produced = dict.fromkeys(demand, 0)
+		bars = dict.fromkeys(stock_data, 0)
+		for pattern in solution["patterns"]:
+			stock_length = stock_data[pattern["stock_id_used"]]["length"]
+			layout = pattern["layout_pieces"]
+			self.assertGreater(pattern["usage_count"], 0)
+			bars[pattern["stock_id_used"]] += pattern["usage_count"]
+			for part_id, count in pattern["yield"].items():
+				produced[part_id] += count * pattern["usage_count"]
+
+			# The layout holds exactly the yield.
+			layout_counts = {}
+			for piece in layout:
+				self.assertEqual(piece["length"], length_by_part_id[piece["part_id"]])
+				layout_counts[piece["part_id"]] = layout_counts.get(piece["part_id"], 0) + 1
+			self.assertEqual(layout_counts, pattern["yield"])
+
+			# Kerf accounting: one cut per piece, the last one left out only
+			# when it would not fit the bar.
+			parts_length = sum(piece["length"] for piece in layout)
+			cuts = len(layout)
+			kerf = (
+				cuts * saw_kerf
+				if parts_length + cuts * saw_kerf <= stock_length + TOLERANCE
+				else (cuts - 1) * saw_kerf
+			)
+			self.assertEqual(pattern["num_cuts_in_pattern"], cuts)
+			self.assertAlmostEqual(pattern["total_parts_length_in_pattern"], parts_length, delta=TOLERANCE)
+			self.assertAlmostEqual(pattern["total_kerf_length_in_pattern"], kerf, delta=TOLERANCE)
+			self.assertAlmostEqual(
+				pattern["total_used_length_in_pattern"], parts_length + kerf, delta=TOLERANCE
+			)
+			self.assertAlmostEqual(
+				pattern["waste_length_in_pattern"], stock_length - parts_length - kerf, delta=TOLERANCE
+			)
+			self.assertGreaterEqual(pattern["waste_length_in_pattern"], -TOLERANCE)
+
+		for part_id, count in demand.items():
+			if allow_overproduction:
+				self.assertGreaterEqual(produced[part_id], count)
+			else:
+				self.assertEqual(produced[part_id], count)
+		self.assertEqual(solution["total_parts_produced"], produced)
+		self.assertEqual(solution["total_stock_items_used"], bars)
+		for stock_id, stock_info in stock_data.items():
+			if "available" in stock_info:
+				self.assertLessEqual(bars[stock_id], stock_info["available"])
+
+		stats = solution["stats"]
+		self.assertAlmostEqual(
+			stats["total_waste_length_mm"],
+			sum(
+				pattern["waste_length_in_pattern"] * pattern["usage_count"]
+				for pattern in solution["patterns"]
+			),
+			delta=TOLERANCE * len(solution["patterns"]) + TOLERANCE,
+		)
+		self.assertGreaterEqual(stats["total_waste_length_mm"], -TOLERANCE)
+
+	@ENGINE_SETTINGS
+	@given(instance=instances())
+	def test_every_engine_returns_a_valid_plan(self, instance):
+		stock_data, parts_data, saw_kerf, allow_overproduction = instance
+		for engine in ENGINES:
+			note(f"engine: {engine}")
+			solution = run_1d_optimizer(stock_data, parts_data, saw_kerf, allow_overproduction, engine=engine)
+			self.assertValidPlan(solution, stock_data, parts_data, saw_kerf, allow_overproduction)
+
+	@ENGINE_SETTINGS
+	@given(instance=instances(max_part_types=4, max_demand=3))
+	def test_no_engine_beats_the_optimum_and_exact_engines_reach_it(self, instance):
+		stock_data, parts_data, saw_kerf, _ = instance
+		# One unlimited stock length, so every engine minimizes the bar count.
+		stock_data = {"S": stock_data["S"]}
+		optimum = _optimal_bar_count(stock_data["S"]["length"], parts_data, saw_kerf)
+		for engine in ENGINES:
+			note(f"engine: {engine}")
+			solution = run_1d_optimizer(stock_data, parts_data, saw_kerf, engine=engine)
+			bars = sum(solution["total_stock_items_used"].values())
+			self.assertGreaterEqual(bars, optimum)
+			if engine in EXACT_ENGINES or solution.get("proven_optimal"):
+				self.assertEqual(bars, optimum)
+
+
+def _optimal_bar_count(stock_length, parts_data, saw_kerf):
+	"""
+	The fewest bars holding every piece, by dynamic programming over subsets
+	of the pieces. A bar holds pieces whose lengths plus one kerf between
+	each pair fit its length.
+	"""
+	pieces = [part["length"] for part in parts_data for _ in range(part["demand"])]
+	full = (1 << len(pieces)) - 1
+
+	fits = [False] * (full + 1)
+	for mask in range(1, full + 1):
+		chosen = [length for i, length in enumerate(pieces) if mask >> i & 1]
+		fits[mask] = sum(chosen) + (len(chosen) - 1) * saw_kerf <= stock_length + TOLERANCE
+
+	@cache
+	def bars(remaining):
+		if not remaining:
+			return 0
+		# The lowest remaining piece goes into some bar; try every bar holding it.
+		lowest = remaining & -remaining
+		rest = remaining ^ lowest
+		best = math.inf
+		subset = rest
+		while True:
+			if fits[subset | lowest]:
+				best = min(best, 1 + bars(rest ^ subset))
+			if not subset:
+				break
+			subset = (subset - 1) & rest
+		return best
+
+	return bars(full)
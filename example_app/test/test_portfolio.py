@@ -0,0 +1,55 @@
+# The portfolio race stops its losers, also those that have not started solving yet.
+import threading
+import time
+import unittest
+from unittest import mock
+
+from ortools.sat.python import cp_model
+
+from example_app.erpnextcutting_optimizer import optimizer_core, portfolio
+from example_app.erpnextcutting_optimizer.portfolio import run_portfolio
+
+TIME_LIMIT_SECONDS = 30
+STOCK = {"S": {"length": 6000}}
+# First-Fit-Decreasing cuts three parts per bar, which meets the lower bound.
+PARTS = [{"length": 2000, "demand": 9}]
+# Building the solver models takes this long, so the race is won before they solve.
+MODEL_DELAY_SECONDS = 0.5
+
+
+class TestPortfolioRace(unittest.TestCase):
+	def test_instant_win_stops_a_solver_that_has_not_started(self):
+		time_limits = []
+		solve = cp_model.CpSolver.solve
+
+		def recording_solve(solver, *args, **kwargs):
+			time_limits.append(solver.parameters.max_time_in_seconds)
+			return solve(solver, *args, **kwargs)
+
+		cutting_model = optimizer_core._cutting_model
+
+		def slow_cutting_model(*args, **kwargs):
+			time.sleep(MODEL_DELAY_SECONDS)
+			return cutting_model(*args, **kwargs)
+
+		solve_mip = portfolio._solve_mip
+
+		def slow_solve_mip(*args, **kwargs):
+			time.sleep(MODEL_DELAY_SECONDS)
+			return solve_mip(*args, **kwargs)
+
+		with (
+			mock.patch.object(cp_model.CpSolver, "solve", recording_solve),
+			mock.patch.object(optimizer_core, "_cutting_model", slow_cutting_model),
+			mock.patch.object(portfolio, "_solve_mip", slow_solve_mip),
+		):
+			solution = run_portfolio(STOCK, PARTS, 0, time_limit=TIME_LIMIT_SECONDS)
+			self.assertEqual(solution["portfolio"]["winner"], "greedy")
+
+			started = time.monotonic()
+			for thread in threading.enumerate():
+				if thread.name.startswith("optimizer-portfolio"):
+					thread.join(TIME_LIMIT_SECONDS)
+			self.assertLess(time.monotonic() - started, TIME_LIMIT_SECONDS / 3)
+		# The CP-SAT loser either skipped its solve or started it with no time left.
+		self.assertTrue(all(limit == 0 for limit in time_limits), time_limits)
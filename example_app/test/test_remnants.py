@@ -0,0 +1,34 @@
+# Remnants are offered in length buckets; their offcuts come from the actual remnant cut.
+import unittest
+
+from example_app.erpnextcutting_optimizer.optimizer_core import run_1d_optimizer
+from example_app.erpnextcutting_optimizer.remnants import REMNANT_BUCKET_MM, RemnantIndex, usable_offcuts
+
+SAW_KERF = 3
+# Not a multiple of the bucket size: offered as a 1200 mm remnant.
+REMNANT_LENGTH = 1234
+PARTS = [{"length": 1000, "demand": 1}]
+MIN_OFFCUT_LENGTH = 200
+
+
+class TestRemnantOffcuts(unittest.TestCase):
+	def test_offcut_of_a_remnant_comes_from_its_actual_length(self):
+		self.assertNotEqual(REMNANT_LENGTH % REMNANT_BUCKET_MM, 0)
+		index = RemnantIndex([("REM-1", REMNANT_LENGTH)])
+		stock_data = {"S": {"length": 6000}}
+		stock_data.update(index.as_stock_data("ITEM", min_length=1000, max_length=6000))
+		remnant_stock_id, remnant_stock = next(
+			(sid, info) for sid, info in stock_data.items() if info.get("remnant")
+		)
+		self.assertLess(remnant_stock["length"], REMNANT_LENGTH)
+
+		solution = run_1d_optimizer(stock_data, PARTS, SAW_KERF, engine="enumeration")
+		self.assertEqual(solution["total_stock_items_used"][remnant_stock_id], 1)
+		allocated = index.allocate(solution, stock_data)
+		self.assertEqual(allocated, [("REM-1", REMNANT_LENGTH, remnant_stock_id)])
+
+		bar_lengths = {remnant_stock_id: [REMNANT_LENGTH]}
+		offcuts = usable_offcuts(solution, SAW_KERF, MIN_OFFCUT_LENGTH, bar_lengths)
+		self.assertEqual(offcuts, [REMNANT_LENGTH - 1000 - SAW_KERF])
+		# Measured against the bucket, the same offcut would fall under the minimum.
+		self.assertEqual(usable_offcuts(solution, SAW_KERF, MIN_OFFCUT_LENGTH), [])